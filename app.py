@@ -1,44 +1,168 @@
-from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for
-import difflib
-import re
+from flask import (
+    Flask, Blueprint, render_template, request, jsonify, url_for, Response, stream_with_context, g,
+    current_app
+)
 import os
+import importlib.util
 import sqlite3
 import hashlib
+import gc
+import time
 import json
 from datetime import datetime
 from collections import Counter
+from functools import lru_cache
 import math
+import multiprocessing
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from werkzeug.utils import secure_filename
-import PyPDF2
-from docx import Document
-import openpyxl
-from PIL import Image
-import pytesseract
+from text_features import (
+    FEATURES_VERSION, preprocess_text, compute_text_features, features_from_tokens, features_to_row,
+    features_from_row, decode_column, migrate_feature_rows
+)
+import extractors
+from extraction_cache import ExtractionCache
+import minhash_index
+import winnowing
+import sequence_engines
+import tfidf_index
+import database
+import report_store
+import content_store
+import score_cache
+import clustering
+import metrics
+import grammar_pool
+import text_analysis
+from job_queue import JobQueue, JobError, TERMINAL_STATES, current_job_id
 
 # Avoid importing language_tool_python at module import time to prevent startup hangs
 LANGUAGE_TOOL_AVAILABLE = False  # Will be updated lazily inside check_grammar if enabled
 ENABLE_GRAMMAR_TOOL = os.getenv('ENABLE_GRAMMAR_TOOL', '0') in ('1', 'true', 'True', 'yes', 'YES')
+# LanguageTool instances are kept in a pool; texts longer than GRAMMAR_CHUNK_CHARS are split at
+# sentence boundaries and checked in parallel. Processes that find GRAMMAR_SERVER_URLS set
+# (comma-separated) connect to those servers instead of starting their own; job processes
+# never start their own, since os._exit and timeout kills would leave the JVMs running.
+GRAMMAR_POOL_SIZE = int(os.getenv('GRAMMAR_POOL_SIZE', str(grammar_pool.DEFAULT_POOL_SIZE)))
+GRAMMAR_CHUNK_CHARS = int(os.getenv('GRAMMAR_CHUNK_CHARS', str(grammar_pool.DEFAULT_CHUNK_CHARS)))
+GRAMMAR_HEALTH_INTERVAL = float(os.getenv('GRAMMAR_HEALTH_INTERVAL', '60'))
+GRAMMAR_SERVER_URLS = 'GRAMMAR_SERVER_URLS'
 
-try:
-    import textstat
-    TEXTSTAT_AVAILABLE = True
-except ImportError:
-    TEXTSTAT_AVAILABLE = False
+# textstat is imported on first use; only check that it is installed
+TEXTSTAT_AVAILABLE = importlib.util.find_spec('textstat') is not None
+if not TEXTSTAT_AVAILABLE:
     print("Warning: textstat not available. Readability analysis will be limited.")
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Routes are registered on this blueprint; create_app() builds the Flask app around it
+routes = Blueprint('main', __name__)
+UPLOAD_FOLDER = 'uploads'
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+
+# Corpus candidate search: 'lsh' pulls only MinHash/LSH candidates, 'tfidf' scores the whole
+# corpus with one sparse product and keeps documents above TFIDF_MIN_SCORE, 'full' scans every document
+CANDIDATE_SEARCH = os.getenv('CANDIDATE_SEARCH', 'lsh')
+TFIDF_MIN_SCORE = float(os.getenv('TFIDF_MIN_SCORE', '0.1'))
+# The TF-IDF matrix is persisted as memory-mapped snapshots; a process that has added
+# TFIDF_SNAPSHOT_MIN_ROWS documents on top of the newest one saves a new one
+TFIDF_INDEX_DIR = os.getenv('TFIDF_INDEX_DIR', 'tfidf_index')
+TFIDF_SNAPSHOT_MIN_ROWS = int(os.getenv('TFIDF_SNAPSHOT_MIN_ROWS', '256'))
+BATCH_SIMILARITY_THRESHOLD = float(os.getenv('BATCH_SIMILARITY_THRESHOLD', '0.5'))
+BATCH_JOB_TIMEOUT = int(os.getenv('BATCH_JOB_TIMEOUT', str(6 * 3600)))
+# Near-duplicate clustering links documents whose vocabulary Jaccard reaches CLUSTER_THRESHOLD
+CLUSTER_THRESHOLD = float(os.getenv('CLUSTER_THRESHOLD', '0.7'))
+CLUSTER_BATCH_SIZE = int(os.getenv('CLUSTER_BATCH_SIZE', str(clustering.DEFAULT_BATCH_SIZE)))
+CLUSTER_JOB_TIMEOUT = int(os.getenv('CLUSTER_JOB_TIMEOUT', str(6 * 3600)))
+LSH_THRESHOLD = float(os.getenv('LSH_THRESHOLD', '0.2'))
+LSH_RECALL_WEIGHT = float(os.getenv('LSH_RECALL_WEIGHT', '0.7'))  # closer to 1 = higher recall, slower
+LSH_NUM_PERM = int(os.getenv('LSH_NUM_PERM', str(minhash_index.DEFAULT_NUM_PERM)))
+LSH_BANDS, LSH_ROWS = minhash_index.optimal_lsh_params(LSH_THRESHOLD, LSH_NUM_PERM, LSH_RECALL_WEIGHT)
+# Documents stored without a signature (or with one of another size) are signed this many per transaction
+LSH_BACKFILL_BATCH_SIZE = int(os.getenv('LSH_BACKFILL_BATCH_SIZE', '200'))
+
+# Background jobs: supervising worker threads per process, each job runs in its own process
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_TIMEOUT = int(os.getenv('JOB_TIMEOUT', '600'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# Job processes running at once across all web workers; each uses one CPU
+JOB_MAX_RUNNING = int(os.getenv('JOB_MAX_RUNNING', str(os.cpu_count() or 1)))
+
+# A job compares an upload against the corpus in chunks of COMPARE_CHUNK_SIZE document ids, run by
+# a pool of COMPARE_WORKERS processes forked from the job process; by default the CPUs are split
+# between the JOB_MAX_RUNNING jobs that may run at once
+COMPARE_CHUNK_SIZE = int(os.getenv('COMPARE_CHUNK_SIZE', '64'))
+COMPARE_WORKERS = int(os.getenv('COMPARE_WORKERS', str(max(1, (os.cpu_count() or 1) // max(1, JOB_MAX_RUNNING)))))
+
+# Content-addressed cache of extracted text, keyed by file hash, type and extractor/OCR versions
+EXTRACTION_CACHE_DIR = os.getenv('EXTRACTION_CACHE_DIR', 'extraction_cache')
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv('EXTRACTION_CACHE_MAX_BYTES', str(1024 * 1024 * 1024)))
+extraction_cache = ExtractionCache(EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_BYTES)
+
+# Document text is stored compressed in documents.content; texts of CONTENT_BLOB_MIN_BYTES or more
+# go to a content-addressed blob directory, also compressed and decompressed in chunks on read
+CONTENT_BLOB_DIR = os.getenv('CONTENT_BLOB_DIR', 'content_blobs')
+CONTENT_BLOB_MIN_BYTES = int(os.getenv('CONTENT_BLOB_MIN_BYTES', str(content_store.DEFAULT_BLOB_MIN_BYTES)))
+contents = content_store.ContentStore(CONTENT_BLOB_DIR, CONTENT_BLOB_MIN_BYTES)
+# Rows pulled per query by corpus scans, so their memory stays flat as the corpus grows
+CORPUS_FETCH_SIZE = int(os.getenv('CORPUS_FETCH_SIZE', '256'))
+
+# Verbatim-overlap engine: 'auto' keeps difflib for small inputs and tiles long documents
+SEQUENCE_ENGINE = os.getenv('SEQUENCE_ENGINE', 'auto')
+
+# Memoized pairwise scores are keyed by this version; bump SCORING_VERSION when detect_plagiarism changes
+SCORING_VERSION = 2
+SCORE_VERSION = f"{SCORING_VERSION}.{FEATURES_VERSION}.{SEQUENCE_ENGINE}"
+SCORE_CACHE_MAX_BYTES = int(os.getenv('SCORE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+pair_score_cache = score_cache.ScoreCache(SCORE_CACHE_MAX_BYTES)
+
+HTTP_REQUESTS = metrics.REGISTRY.counter('http_requests_total', 'HTTP requests by endpoint, method and status.')
+HTTP_SECONDS = metrics.REGISTRY.histogram('http_request_duration_seconds', 'Time to produce a response, by endpoint.')
+EXTRACTED_BYTES = metrics.REGISTRY.counter('extracted_bytes_total', 'Bytes of uploaded files extracted, by file type.')
+EXTRACTION_CACHE_LOOKUPS = metrics.REGISTRY.counter('extraction_cache_lookups_total',
+                                                    'Extraction cache lookups, by result.')
+DOCUMENTS_COMPARED = metrics.REGISTRY.counter('documents_compared_total',
+                                              'Stored documents compared against an upload, by score source.')
+# Every serving process flushes its metrics into METRICS_DB each METRICS_FLUSH_INTERVAL seconds,
+# and /metrics renders the totals of all of them
+METRICS_DB = os.getenv('METRICS_DB', 'metrics.db')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', str(metrics.DEFAULT_FLUSH_INTERVAL)))
+metrics_store = metrics.SharedStore(METRICS_DB)
+
+# Per-stage timings are added to generated reports unless REPORT_TIMINGS=0
+REPORT_TIMINGS = os.getenv('REPORT_TIMINGS', '1') not in ('0', 'false', 'False', 'no', 'NO')
 
-ALLOWED_EXTENSIONS = {
-    'txt', 'pdf', 'docx', 'doc', 'xlsx', 'xls', 'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff'
-}
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+DATABASE = 'plagiarism_detector.db'
+REPORTS_PAGE_SIZE = int(os.getenv('REPORTS_PAGE_SIZE', '20'))
+
+# Every type with a registered extractor, including EXTRACTOR_PLUGINS
+ALLOWED_EXTENSIONS = extractors.supported_types()
 
 def init_db():
-    conn = sqlite3.connect('plagiarism_detector.db')
-    cursor = conn.cursor()
+    with database.transaction(DATABASE) as cursor:
+        _create_tables(cursor)
+        report_store.ensure_schema(cursor)
+        score_cache.prune_versions(cursor, SCORE_VERSION)
+        # A changed threshold, recall knob or signature size re-bands the stored signatures
+        minhash_index.sync_params(cursor, LSH_NUM_PERM, LSH_BANDS, LSH_ROWS)
+        # The one full scan for unsigned documents; queries then read only the pending list
+        minhash_index.queue_unindexed(cursor, LSH_NUM_PERM)
+    # Reports saved before compact storage are compressed one table per transaction
+    for table in report_store.SUMMARY_COLUMNS:
+        with database.transaction(DATABASE) as cursor:
+            report_store.migrate_payloads(cursor, table)
+    # Document texts stored as plain TEXT are encoded a batch per transaction
+    while True:
+        with database.transaction(DATABASE) as cursor:
+            if not content_store.migrate_contents(cursor, contents):
+                break
+    # Feature rows likewise, so tokens and term counts stop taking several times the text's size
+    while True:
+        with database.transaction(DATABASE) as cursor:
+            if not migrate_feature_rows(cursor):
+                break
+    backfill_signatures()
+
+def _create_tables(cursor):
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS documents (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -50,17 +174,7 @@ def init_db():
             file_size INTEGER
         )
     ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reports (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            report_name TEXT NOT NULL,
-            doc1_name TEXT NOT NULL,
-            doc2_name TEXT NOT NULL,
-            similarity_percentage REAL NOT NULL,
-            report_data TEXT NOT NULL,
-            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    cursor.execute(report_store.COMPARISON_TABLE.format(table='reports'))
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS single_file_reports (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -79,102 +193,253 @@ def init_db():
             created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    conn.commit()
-    conn.close()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_features (
+            document_id INTEGER PRIMARY KEY,
+            features_version INTEGER NOT NULL,
+            tokens TEXT NOT NULL,
+            vocabulary TEXT NOT NULL,
+            term_freq TEXT NOT NULL,
+            FOREIGN KEY (document_id) REFERENCES documents (id)
+        )
+    ''')
+    minhash_index.create_tables(cursor)
+    score_cache.create_tables(cursor)
+    clustering.create_tables(cursor)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def new_file_hashers():
+    # BLAKE2b is stored for new documents; MD5 is kept only to match rows saved before the switch
+    return hashlib.blake2b(digest_size=32), hashlib.md5()
+
 def get_file_hash(file_path):
+    hasher = new_file_hashers()[0]
     with open(file_path, 'rb') as f:
-        return hashlib.md5(f.read()).hexdigest()
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
 
-def extract_text_from_file(file_path, file_type):
+def save_upload(file, file_path):
+    """Streams an uploaded file to disk, hashing it on the way.
+
+    Returns (file_hash, legacy_md5, file_size).
+    """
+    hasher, legacy_hasher = new_file_hashers()
+    file_size = 0
+    with open(file_path, 'wb') as f:
+        for chunk in iter(lambda: file.stream.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+            legacy_hasher.update(chunk)
+            f.write(chunk)
+            file_size += len(chunk)
+    return hasher.hexdigest(), legacy_hasher.hexdigest(), file_size
+
+def find_document_by_hash(*file_hashes):
+    with database.cursor(DATABASE) as cursor:
+        placeholders = ','.join('?' * len(file_hashes))
+        cursor.execute(f'SELECT id FROM documents WHERE file_hash IN ({placeholders})', file_hashes)
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+def extraction_cache_key(file_hash, file_type):
+    ocr_version = extractors.get_tesseract_version() if file_type in extractors.OCR_TYPES else ''
+    return ExtractionCache.make_key(file_hash, file_type, extractors.EXTRACTOR_VERSION, ocr_version)
+
+def extract_document(file_path, file_type, file_hash=None):
+    """Consumes the extractor stream once, building the stored text and its features together."""
+    cache_key = extraction_cache_key(file_hash or get_file_hash(file_path), file_type)
+    content = extraction_cache.get(cache_key)
+    if content is not None:
+        EXTRACTION_CACHE_LOOKUPS.inc(result='hit')
+        with metrics.timed('preprocess'):
+            return content, compute_text_features(content)
+    EXTRACTION_CACHE_LOOKUPS.inc(result='miss')
+    parts = []
+    tokens = []
+    preprocess_seconds = 0.0
+    started = time.perf_counter()
     try:
-        if file_type == 'txt':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        elif file_type == 'pdf':
-            with open(file_path, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text()
-                return text
-        elif file_type in ['docx', 'doc']:
-            doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
-        elif file_type in ['xlsx', 'xls']:
-            workbook = openpyxl.load_workbook(file_path)
-            text = ""
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                for row in sheet.iter_rows():
-                    for cell in row:
-                        if cell.value:
-                            text += str(cell.value) + " "
-                    text += "\n"
-            return text
-        elif file_type in ['png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff']:
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
-            return text
-        else:
-            return "Error: Unsupported file type"
+        for chunk in extractors.bounded(extractors.iter_text_chunks(file_path, file_type)):
+            parts.append(chunk)
+            chunk_started = time.perf_counter()
+            tokens.extend(preprocess_text(chunk).split())
+            preprocess_seconds += time.perf_counter() - chunk_started
+    except ValueError:
+        return "Error: Unsupported file type", None
     except Exception as e:
-        return f"Error extracting text: {str(e)}"
+        return f"Error extracting text: {str(e)}", None
+    finally:
+        metrics.observe_stage('extract', time.perf_counter() - started - preprocess_seconds, file_type=file_type)
+        metrics.observe_stage('preprocess', preprocess_seconds)
+    EXTRACTED_BYTES.inc(os.path.getsize(file_path), file_type=file_type)
+    content = ''.join(parts)
+    extraction_cache.put(cache_key, content)
+    return content, features_from_tokens(tokens)
+
+def extract_text_from_file(file_path, file_type):
+    return extract_document(file_path, file_type)[0]
+
+def store_document_features(cursor, items):
+    """Writes [(doc_id, features)] with one batched statement."""
+    database.executemany_batched(cursor, '''
+        INSERT OR REPLACE INTO document_features
+            (document_id, features_version, tokens, vocabulary, term_freq)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((doc_id,) + features_to_row(features) for doc_id, features in items))
+
+def insert_document(cursor, filename, file_hash, file_type, content, file_size, features, signature=None):
+    """Inserts a document with its features and LSH buckets inside the caller's transaction."""
+    return insert_documents(cursor, [{
+        'filename': filename, 'file_hash': file_hash, 'file_type': file_type, 'content': content,
+        'file_size': file_size, 'features': features, 'signature': signature
+    }], skip_duplicates=False)[0]
 
-def save_document_to_db(filename, file_path, file_type, content):
-    conn = sqlite3.connect('plagiarism_detector.db')
-    cursor = conn.cursor()
-    file_hash = get_file_hash(file_path)
+def insert_documents(cursor, documents, skip_duplicates=True):
+    """Inserts documents, then writes all their features and LSH buckets in batched statements.
+
+    Each documents row is its own INSERT, for its id; a file hash already stored gives None
+    in the returned ids when skip_duplicates is set, and raises IntegrityError otherwise.
+    """
+    stored = []
+    for document in documents:
+        try:
+            cursor.execute('''
+                INSERT INTO documents (filename, file_hash, file_type, content, file_size)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (document['filename'], document['file_hash'], document['file_type'],
+                  contents.encode(document['content']), document['file_size']))
+        except sqlite3.IntegrityError:
+            if not skip_duplicates:
+                raise
+            stored.append((None, document))
+            continue
+        stored.append((cursor.lastrowid, document))
+    inserted = [(doc_id, document) for doc_id, document in stored if doc_id is not None]
+    store_document_features(cursor, ((doc_id, document['features']) for doc_id, document in inserted))
+    signed = [(doc_id, document.get('signature')
+               or minhash_index.compute_minhash(document['features']['tokens'], LSH_NUM_PERM))
+              for doc_id, document in inserted]
+    minhash_index.index_documents(cursor, signed, LSH_BANDS, LSH_ROWS)
+    return [doc_id for doc_id, _ in stored]
+
+def save_document_to_db(filename, file_path, file_type, content, features=None, file_hash=None):
+    file_hash = file_hash or get_file_hash(file_path)
     file_size = os.path.getsize(file_path)
+    features = features or compute_text_features(content)
     try:
-        cursor.execute('''
-            INSERT INTO documents (filename, file_hash, file_type, content, file_size)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (filename, file_hash, file_type, content, file_size))
-        doc_id = cursor.lastrowid
-        conn.commit()
-        return doc_id
+        with metrics.timed('sqlite', op='insert_document'), database.transaction(DATABASE) as cursor:
+            doc_id = insert_document(cursor, filename, file_hash, file_type, content, file_size, features)
     except sqlite3.IntegrityError:
-        cursor.execute('SELECT id FROM documents WHERE file_hash = ?', (file_hash,))
-        result = cursor.fetchone()
-        conn.close()
-        return result[0] if result else None
-    finally:
-        conn.close()
-
-def preprocess_text(text):
-    text = text.lower()
-    text = re.sub(r'[^\w\s]', ' ', text)
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
-
-def calculate_cosine_similarity(text1, text2):
-    text1 = preprocess_text(text1)
-    text2 = preprocess_text(text2)
-    words1 = set(text1.split())
-    words2 = set(text2.split())
-    all_words = words1.union(words2)
-    vector1 = [1 if word in words1 else 0 for word in all_words]
-    vector2 = [1 if word in words2 else 0 for word in all_words]
-    dot_product = sum(a * b for a, b in zip(vector1, vector2))
-    magnitude1 = math.sqrt(sum(a * a for a in vector1))
-    magnitude2 = math.sqrt(sum(b * b for b in vector2))
-    if magnitude1 == 0 or magnitude2 == 0:
+        return find_document_by_hash(file_hash)
+    if corpus_index is not None:
+        corpus_index.add_document(doc_id, features['term_freq'])
+    return doc_id
+
+def get_document_features(doc_id, content=None):
+    """Loads the stored features for a document, rebuilding them if missing or from an older version."""
+    with database.cursor(DATABASE) as cursor:
+        cursor.execute('''
+            SELECT features_version, tokens, vocabulary, term_freq
+            FROM document_features WHERE document_id = ?
+        ''', (doc_id,))
+        features = features_from_row(cursor.fetchone())
+        if features is not None:
+            return features
+        if content is None:
+            cursor.execute('SELECT content FROM documents WHERE id = ?', (doc_id,))
+            result = cursor.fetchone()
+            if not result:
+                return None
+            content = contents.decode(result[0])
+    features = compute_text_features(content)
+    with database.transaction(DATABASE) as cursor:
+        store_document_features(cursor, [(doc_id, features)])
+    return features
+
+def backfill_signatures(batch_size=LSH_BACKFILL_BATCH_SIZE):
+    """Signs and buckets stored documents that have no MinHash signature; returns how many were signed."""
+    signed = 0
+    while True:
+        with database.cursor(DATABASE) as cursor:
+            doc_ids = minhash_index.pending_documents(cursor, limit=batch_size)
+        if not doc_ids:
+            return signed
+        signatures = [(doc_id, minhash_index.compute_minhash(features['tokens'], LSH_NUM_PERM))
+                      for doc_id, _, _, features in iter_documents_with_features(doc_ids)]
+        with database.transaction(DATABASE) as cursor:
+            minhash_index.index_documents(cursor, signatures, LSH_BANDS, LSH_ROWS)
+            # Ids whose document is gone would otherwise be fetched again on every pass
+            minhash_index.drop_pending(cursor, set(doc_ids) - {doc_id for doc_id, _ in signatures})
+        signed += len(signatures)
+
+corpus_index = None
+
+def get_corpus_index():
+    """Returns the TF-IDF matrix: the newest snapshot in TFIDF_INDEX_DIR plus documents saved since.
+
+    The snapshot is memory-mapped, so every job process reading it shares the same pages, and
+    only documents above its last_doc_id are read from SQLite. Once TFIDF_SNAPSHOT_MIN_ROWS
+    of those have been added, a new snapshot is saved for the processes that come after.
+    """
+    global corpus_index
+    if not tfidf_index.SCIPY_AVAILABLE:
+        return None
+    if corpus_index is None:
+        corpus_index = tfidf_index.CorpusIndex.load(TFIDF_INDEX_DIR, FEATURES_VERSION) or tfidf_index.CorpusIndex()
+    stale_ids = []
+    with database.cursor(DATABASE) as cursor:
+        cursor.execute('''
+            SELECT d.id, f.features_version, f.term_freq
+            FROM documents d LEFT JOIN document_features f ON f.document_id = d.id
+            WHERE d.id > ? ORDER BY d.id
+        ''', (corpus_index.last_doc_id,))
+        for doc_id, features_version, term_freq in database.iter_rows(cursor, CORPUS_FETCH_SIZE):
+            if features_version == FEATURES_VERSION:
+                corpus_index.add_document(doc_id, Counter(json.loads(decode_column(term_freq))))
+            else:
+                stale_ids.append(doc_id)
+    # Rebuilding writes, so it waits until the read cursor is finished
+    for doc_id in stale_ids:
+        features = get_document_features(doc_id)
+        if features is not None:
+            corpus_index.add_document(doc_id, features['term_freq'])
+    if corpus_index.unsaved_rows >= TFIDF_SNAPSHOT_MIN_ROWS:
+        save_corpus_index(corpus_index)
+    return corpus_index
+
+def save_corpus_index(index):
+    if index is None or not index.unsaved_rows:
+        return
+    try:
+        index.save(TFIDF_INDEX_DIR, FEATURES_VERSION)
+    except OSError as e:
+        # Scoring works without a snapshot; the next process reads more rows from SQLite
+        print(f"Could not save the TF-IDF index snapshot: {e}")
+
+def calculate_cosine_similarity(text1, text2, features1=None, features2=None):
+    words1 = (features1 or compute_text_features(text1))['vocabulary']
+    words2 = (features2 or compute_text_features(text2))['vocabulary']
+    if not words1 or not words2:
         return 0
-    return dot_product / (magnitude1 * magnitude2)
+    # Binary term vectors: the dot product is the shared vocabulary size
+    dot_product = len(words1 & words2)
+    return dot_product / (math.sqrt(len(words1)) * math.sqrt(len(words2)))
 
-def calculate_sequence_similarity(text1, text2):
-    return difflib.SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
+def calculate_sequence_similarity(text1, text2, features1=None, features2=None):
+    return sequence_engines.sequence_similarity(text1, text2, features1, features2, engine=SEQUENCE_ENGINE)
 
-def detect_plagiarism(text1, text2, doc1_name="Document 1", doc2_name="Document 2"):
-    cosine_sim = calculate_cosine_similarity(text1, text2)
-    sequence_sim = calculate_sequence_similarity(text1, text2)
+def detect_plagiarism(text1, text2, doc1_name="Document 1", doc2_name="Document 2",
+                      features1=None, features2=None):
+    features1 = features1 or compute_text_features(text1)
+    features2 = features2 or compute_text_features(text2)
+    with metrics.timed('cosine'):
+        cosine_sim = calculate_cosine_similarity(text1, text2, features1, features2)
+    with metrics.timed('sequence'):
+        sequence_sim = calculate_sequence_similarity(text1, text2, features1, features2)
     similarity = (cosine_sim * 0.6) + (sequence_sim * 0.4)
     percentage = round(similarity * 100, 2)
     if percentage >= 80:
@@ -185,15 +450,17 @@ def detect_plagiarism(text1, text2, doc1_name="Document 1", doc2_name="Document
         status, color = "Low Plagiarism Risk", "info"
     else:
         status, color = "Original Content", "success"
+    with metrics.timed('similar_sentences'):
+        similar_sentences = find_similar_sentences(text1, text2)
     analysis = {
         'word_count_1': len(text1.split()),
         'word_count_2': len(text2.split()),
         'char_count_1': len(text1),
         'char_count_2': len(text2),
-        'common_words': find_common_words(text1, text2),
-        'unique_words_1': find_unique_words(text1, text2),
-        'unique_words_2': find_unique_words(text2, text1),
-        'similar_sentences': find_similar_sentences(text1, text2),
+        'common_words': find_common_words(text1, text2, features1, features2),
+        'unique_words_1': find_unique_words(text1, text2, features1, features2),
+        'unique_words_2': find_unique_words(text2, text1, features2, features1),
+        'similar_sentences': similar_sentences,
         'risk_level': get_risk_level(percentage),
         'recommendations': get_recommendations(percentage)
     }
@@ -208,31 +475,19 @@ def detect_plagiarism(text1, text2, doc1_name="Document 1", doc2_name="Document
         'analysis': analysis
     }
 
-def find_common_words(text1, text2):
-    words1 = set(preprocess_text(text1).split())
-    words2 = set(preprocess_text(text2).split())
+def find_common_words(text1, text2, features1=None, features2=None):
+    words1 = (features1 or compute_text_features(text1))['vocabulary']
+    words2 = (features2 or compute_text_features(text2))['vocabulary']
     return list(words1.intersection(words2))[:20]
 
-def find_unique_words(text1, text2):
-    words1 = set(preprocess_text(text1).split())
-    words2 = set(preprocess_text(text2).split())
+def find_unique_words(text1, text2, features1=None, features2=None):
+    words1 = (features1 or compute_text_features(text1))['vocabulary']
+    words2 = (features2 or compute_text_features(text2))['vocabulary']
     return list(words1 - words2)[:20]
 
 def find_similar_sentences(text1, text2):
-    sentences1 = [s.strip() for s in text1.split('.') if s.strip()]
-    sentences2 = [s.strip() for s in text2.split('.') if s.strip()]
-    similar_sentences = []
-    for s1 in sentences1:
-        for s2 in sentences2:
-            if len(s1) > 20 and len(s2) > 20:
-                similarity = difflib.SequenceMatcher(None, s1.lower(), s2.lower()).ratio()
-                if similarity > 0.5:
-                    similar_sentences.append({
-                        'sentence1': s1,
-                        'sentence2': s2,
-                        'similarity': round(similarity * 100, 2)
-                    })
-    return similar_sentences[:10]
+    # Winnowed fingerprints locate the copied passages; each match carries its character spans
+    return winnowing.find_similar_passages(text1, text2)
 
 def get_risk_level(percentage):
     if percentage >= 80:
@@ -270,56 +525,400 @@ def get_recommendations(percentage):
             "Always cite sources when using external material."
         ]
 
+def find_candidate_documents(features, exclude_id=None):
+    """Returns the ids of stored documents worth an exact comparison against the given features."""
+    with metrics.timed('candidates', method=CANDIDATE_SEARCH):
+        return _find_candidate_documents(features, exclude_id)
+
+def _find_candidate_documents(features, exclude_id=None):
+    index = get_corpus_index() if CANDIDATE_SEARCH == 'tfidf' else None
+    if index is not None:
+        return [doc_id for doc_id, score in index.score(features['term_freq'], exclude_id)
+                if score >= TFIDF_MIN_SCORE]
+    with database.cursor(DATABASE) as cursor:
+        if CANDIDATE_SEARCH != 'lsh':
+            cursor.execute('SELECT id FROM documents WHERE id != ?', (exclude_id or -1,))
+            return [row[0] for row in cursor.fetchall()]
+        signature = minhash_index.compute_minhash(features['tokens'], LSH_NUM_PERM)
+        candidates = minhash_index.query_candidates(
+            cursor, signature, LSH_BANDS, LSH_ROWS, LSH_THRESHOLD, exclude_id=exclude_id
+        )
+        # Documents not signed yet are compared in full rather than silently skipped
+        pending = minhash_index.pending_documents(cursor, exclude_id=exclude_id)
+        return [doc_id for doc_id, _ in candidates] + pending
+
+def load_documents(doc_ids):
+    with database.cursor(DATABASE) as cursor:
+        placeholders = ','.join('?' * len(doc_ids))
+        cursor.execute(f'SELECT id, filename, content FROM documents WHERE id IN ({placeholders})',
+                       list(doc_ids))
+        rows = cursor.fetchall()
+    return [(doc_id, filename, contents.decode(content)) for doc_id, filename, content in rows]
+
+def iter_documents_with_features(doc_ids):
+    """Yields (id, filename, content, features), fetching CORPUS_FETCH_SIZE encoded rows per query.
+
+    Contents are decoded one document at a time, so only one is held in full at once.
+    """
+    doc_ids = list(doc_ids)
+    for start in range(0, len(doc_ids), CORPUS_FETCH_SIZE):
+        batch = doc_ids[start:start + CORPUS_FETCH_SIZE]
+        with database.cursor(DATABASE) as cursor:
+            cursor.execute(f'''
+                SELECT d.id, d.filename, d.content, f.features_version, f.tokens, f.vocabulary, f.term_freq
+                FROM documents d LEFT JOIN document_features f ON f.document_id = d.id
+                WHERE d.id IN ({','.join('?' * len(batch))})
+            ''', batch)
+            rows = cursor.fetchall()
+        rows.reverse()
+        while rows:
+            row = rows.pop()
+            content = contents.decode(row[2])
+            yield row[0], row[1], content, features_from_row(row[3:]) or get_document_features(row[0], content)
+
+def load_filenames(doc_ids):
+    with database.cursor(DATABASE) as cursor:
+        placeholders = ','.join('?' * len(doc_ids))
+        cursor.execute(f'SELECT id, filename FROM documents WHERE id IN ({placeholders})', list(doc_ids))
+        return dict(cursor.fetchall())
+
+def compare_documents_chunk(content, features, filename, doc_ids, doc_id=None):
+    """Runs detect_plagiarism against one chunk of stored documents; executed in pool workers.
+
+    When the uploaded document is stored (doc_id given), pairs scored before are read from
+    document_pairs and only new pairs are computed and saved.
+    """
+    scored = {}
+    if doc_id is not None:
+        with metrics.timed('sqlite', op='fetch_pair_scores'), database.cursor(DATABASE) as cursor:
+            scored = score_cache.fetch_scores(cursor, doc_id, doc_ids, SCORE_VERSION)
+    computed = {}
+    missing_ids = [other_id for other_id in doc_ids if other_id not in scored]
+    with metrics.timed('sqlite', op='load_documents'):
+        names = load_filenames([other_id for other_id in doc_ids if other_id in scored]) if scored else {}
+        stored = iter_documents_with_features(missing_ids)
+    for other_id, other_name, other_content, other_features in stored:
+        names[other_id] = other_name
+        computed[other_id] = detect_plagiarism(
+            content, other_content, filename, other_name,
+            features1=features, features2=other_features
+        )
+    if doc_id is not None and computed:
+        with metrics.timed('sqlite', op='store_pair_scores'), database.transaction(DATABASE) as cursor:
+            score_cache.store_scores(cursor, doc_id, computed, SCORE_VERSION)
+    DOCUMENTS_COMPARED.inc(len(computed), source='computed')
+    DOCUMENTS_COMPARED.inc(len(scored), source='memoized')
+    scored.update(computed)
+    results = []
+    for other_id, result in scored.items():
+        if other_id not in names:
+            continue
+        other_name = names[other_id]
+        results.append({
+            'filename': other_name,
+            'doc_id': other_id,
+            'similarity_percentage': result['percentage'],
+            'similarity_score': result['similarity'],
+            'status': result['status'],
+            'color': result['color'],
+            'cosine_similarity': result['cosine_similarity'],
+            'sequence_similarity': result['sequence_similarity'],
+            'analysis': result['analysis']
+        })
+    return results
+
+_compare_task = None
+
+def _init_compare_worker(content, features, filename, doc_id):
+    """Pool initializer: the upload reaches each worker once rather than with every chunk."""
+    global _compare_task
+    metrics.discard_inherited()
+    _compare_task = (content, features, filename, doc_id)
+
+def _compare_chunk_in_worker(doc_ids):
+    content, features, filename, doc_id = _compare_task
+    with metrics.collect_timings() as timings:
+        results = compare_documents_chunk(content, features, filename, doc_ids, doc_id)
+    return results, metrics.REGISTRY.drain(), timings
+
+def _compare_pool_context():
+    # Forking the job process is cheap and it runs no other threads; elsewhere workers are spawned
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('spawn')
+
+def iter_corpus_comparisons(doc_id, content, features=None, filename="Uploaded Document"):
+    """Yields (completed, total, results) as each chunk of the corpus comparison finishes.
+
+    With COMPARE_WORKERS above one the chunks run in a process pool that lives for this
+    comparison only and are yielded as they complete. Close the generator (or exhaust it)
+    to shut the pool down before the process exits.
+    """
+    features = features or compute_text_features(content)
+    candidate_ids = find_candidate_documents(features, exclude_id=doc_id)
+    total = len(candidate_ids)
+    chunks = [candidate_ids[start:start + COMPARE_CHUNK_SIZE] for start in range(0, total, COMPARE_CHUNK_SIZE)]
+    completed = 0
+    if COMPARE_WORKERS <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            completed += len(chunk)
+            yield completed, total, compare_documents_chunk(content, features, filename, chunk, doc_id)
+        return
+    with ProcessPoolExecutor(max_workers=min(COMPARE_WORKERS, len(chunks)), mp_context=_compare_pool_context(),
+                             initializer=_init_compare_worker,
+                             initargs=(content, features, filename, doc_id)) as pool:
+        futures = {pool.submit(_compare_chunk_in_worker, chunk): len(chunk) for chunk in chunks}
+        try:
+            for future in as_completed(futures):
+                results, delta, timings = future.result()
+                metrics.REGISTRY.merge(delta)
+                metrics.add_timings(timings)
+                completed += futures[future]
+                yield completed, total, results
+        finally:
+            for future in futures:
+                future.cancel()
+
+def compare_against_corpus(doc_id, content, features=None, filename="Uploaded Document"):
+    results = []
+    for _, _, chunk_results in iter_corpus_comparisons(doc_id, content, features, filename):
+        results.extend(chunk_results)
+    results.sort(key=lambda r: r['similarity_percentage'], reverse=True)
+    return results
+
+def build_single_file_report(doc_id, filename, file_type, content, results, timings=None):
+    results = sorted(results, key=lambda r: r['similarity_percentage'], reverse=True)
+    percentages = [r['similarity_percentage'] for r in results]
+    highest = max(percentages) if percentages else 0
+    with metrics.timed('grammar'):
+        grammar_analysis = check_grammar(content)
+    grammar_score = max(0, 100 - grammar_analysis['total_issues'] * 5)
+    plagiarism_score = round(100 - highest, 2)
+    overall_score = round((grammar_score + plagiarism_score) / 2, 1)
+    report = {
+        'report_name': f"Comprehensive_Analysis_{filename}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+        'generated_at': datetime.now().isoformat(),
+        'document_analyzed': {
+            'filename': filename,
+            'doc_id': doc_id,
+            'word_count': len(content.split()),
+            'char_count': len(content),
+            'file_type': file_type
+        },
+        'overall_summary': {
+            'total_documents_compared': len(results),
+            'highest_similarity': highest,
+            'average_similarity': round(sum(percentages) / len(percentages), 2) if percentages else 0,
+            'overall_risk_level': get_risk_level(highest),
+            'high_risk_matches': len([p for p in percentages if p >= 60]),
+            'medium_risk_matches': len([p for p in percentages if 30 <= p < 60]),
+            'low_risk_matches': len([p for p in percentages if p < 30]),
+            'overall_writing_score': overall_score
+        },
+        'plagiarism_results': results,
+        'grammar_analysis': grammar_analysis,
+        'similar_sentences': [{
+            'sentence': match['sentence1'],
+            'similar_sentence': match['sentence2'],
+            'similarity': match['similarity'],
+            'source_file': r['filename']
+        } for r in results for match in r['analysis']['similar_sentences']],
+        'recommendations': get_recommendations(highest),
+        'comprehensive_analysis': {
+            'grammar_score': grammar_score,
+            'plagiarism_score': plagiarism_score,
+            'overall_score': overall_score,
+            'total_issues': grammar_analysis['total_issues']
+        }
+    }
+    if timings is not None:
+        report['timings'] = metrics.timings_report(timings)
+    return report
+
+def save_single_file_report(doc_id, report):
+    with metrics.timed('sqlite', op='save_report'), database.transaction(DATABASE) as cursor:
+        return report_store.insert_single_file_report(cursor, doc_id, report)
+
+def iter_similar_document_pairs(threshold):
+    index = get_corpus_index()
+    if index is not None:
+        yield from index.iter_similar_pairs(threshold)
+        return
+    with database.cursor(DATABASE) as cursor:
+        cursor.execute('SELECT id FROM documents ORDER BY id')
+        doc_ids = [row[0] for row in cursor.fetchall()]
+    # Only vocabularies are needed for binary cosine; tokens and term counts stay in the database
+    vocabularies = load_vocabularies(doc_ids)
+    doc_ids = [doc_id for doc_id in doc_ids if doc_id in vocabularies]
+    for i, doc_a in enumerate(doc_ids):
+        for doc_b in doc_ids[i + 1:]:
+            score = calculate_cosine_similarity(None, None, {'vocabulary': vocabularies[doc_a]},
+                                                {'vocabulary': vocabularies[doc_b]})
+            if score >= threshold:
+                yield doc_a, doc_b, score
+
+def run_batch_comparison(threshold=None, report_name=None):
+    """Compares every stored document against every other and saves the matches as a batch report."""
+    threshold = BATCH_SIMILARITY_THRESHOLD if threshold is None else threshold
+    report_name = report_name or f"Batch_Comparison_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    with database.cursor(DATABASE) as cursor:
+        cursor.execute('SELECT id, filename FROM documents')
+        filenames = dict(cursor.fetchall())
+    matches = [{
+        'doc1_id': doc_a,
+        'doc1_name': filenames.get(doc_a),
+        'doc2_id': doc_b,
+        'doc2_name': filenames.get(doc_b),
+        'similarity_percentage': round(score * 100, 2),
+        'risk_level': get_risk_level(score * 100)
+    } for doc_a, doc_b, score in iter_similar_document_pairs(threshold)]
+    matches.sort(key=lambda m: m['similarity_percentage'], reverse=True)
+    report = {
+        'report_name': report_name,
+        'generated_at': datetime.now().isoformat(),
+        'method': 'tfidf_cosine' if tfidf_index.SCIPY_AVAILABLE else 'binary_cosine',
+        'threshold': threshold,
+        'total_documents': len(filenames),
+        'matches': matches
+    }
+    with database.transaction(DATABASE) as cursor:
+        return report_store.insert_batch_report(cursor, report)
+
+def load_vocabularies(doc_ids):
+    """Returns {doc_id: vocabulary} from stored features, recomputing any that are stale."""
+    doc_ids = list(doc_ids)
+    vocabularies = {}
+    with database.cursor(DATABASE) as cursor:
+        for start in range(0, len(doc_ids), 500):
+            batch = doc_ids[start:start + 500]
+            cursor.execute(f'''
+                SELECT document_id, vocabulary FROM document_features
+                WHERE features_version = ? AND document_id IN ({','.join('?' * len(batch))})
+            ''', [FEATURES_VERSION] + batch)
+            vocabularies.update((doc_id, set(json.loads(decode_column(vocab)))) for doc_id, vocab in cursor.fetchall())
+    for doc_id in doc_ids:
+        if doc_id not in vocabularies:
+            features = get_document_features(doc_id)
+            if features is not None:
+                vocabularies[doc_id] = features['vocabulary']
+    return vocabularies
+
+def run_cluster_batch(threshold=None, report_name=None, progress=None):
+    """Groups near-duplicate documents and saves the clusters as a batch report.
+
+    Cluster state is kept per threshold, so each run only links documents added since the last
+    one. State is committed every CLUSTER_BATCH_SIZE documents, so an interrupted run resumes.
+    """
+    threshold = CLUSTER_THRESHOLD if threshold is None else threshold
+    report_name = report_name or f"Near_Duplicate_Clusters_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    config = clustering.config_key(threshold, LSH_NUM_PERM)
+    with database.cursor(DATABASE) as cursor:
+        union_find, last_doc_id = clustering.load_state(cursor, config)
+        cursor.execute('SELECT id FROM documents WHERE id > ? ORDER BY id', (last_doc_id,))
+        new_ids = [row[0] for row in cursor.fetchall()]
+    for start in range(0, len(new_ids), CLUSTER_BATCH_SIZE):
+        batch = new_ids[start:start + CLUSTER_BATCH_SIZE]
+        with database.transaction(DATABASE) as cursor:
+            changed = clustering.link_documents(cursor, config, union_find, batch, load_vocabularies,
+                                                LSH_BANDS, LSH_ROWS, threshold)
+            clustering.save_state(cursor, config, union_find, changed, batch[-1])
+        if progress:
+            progress('clustering', 0.9 * (start + len(batch)) / len(new_ids))
+    with database.cursor(DATABASE) as cursor:
+        edges = clustering.load_edges(cursor, config)
+        cursor.execute('SELECT id, filename FROM documents')
+        filenames = dict(cursor.fetchall())
+    clusters = [{
+        'cluster_id': number,
+        'representative_id': cluster['representative_id'],
+        'representative_name': filenames.get(cluster['representative_id']),
+        'size': cluster['size'],
+        'members': [{
+            'doc_id': doc_id,
+            'filename': filenames.get(doc_id),
+            'similarity_percentage': round(score * 100, 2),
+            'risk_level': get_risk_level(score * 100)
+        } for doc_id, score in cluster['members']]
+    } for number, cluster in enumerate(clustering.summarize_clusters(union_find, edges, load_vocabularies), 1)]
+    report = {
+        'report_name': report_name,
+        'generated_at': datetime.now().isoformat(),
+        'method': 'minhash_lsh_union_find',
+        'threshold': threshold,
+        'total_documents': len(filenames),
+        'new_documents': len(new_ids),
+        'clustered_documents': sum(c['size'] for c in clusters),
+        'clusters': clusters
+    }
+    with database.transaction(DATABASE) as cursor:
+        return report_store.insert_batch_report(cursor, report)
+
+grammar_tools = None
+
+def get_grammar_pool():
+    """Returns the process-wide LanguageTool pool, creating and warming it on first use."""
+    global grammar_tools, LANGUAGE_TOOL_AVAILABLE
+    if grammar_tools is None:
+        server_urls = [url.strip() for url in os.getenv(GRAMMAR_SERVER_URLS, '').split(',') if url.strip()]
+        if not server_urls and current_job_id() is not None:
+            raise RuntimeError(f"{GRAMMAR_SERVER_URLS} is not set; job processes do not start LanguageTool servers")
+        pool = grammar_pool.LanguageToolPool('en-US', GRAMMAR_POOL_SIZE, server_urls, GRAMMAR_CHUNK_CHARS)
+        try:
+            pool.start()
+        except Exception:
+            pool.close()
+            raise
+        pool.start_health_checks(GRAMMAR_HEALTH_INTERVAL)
+        grammar_tools = pool
+        LANGUAGE_TOOL_AVAILABLE = True
+    return grammar_tools
+
+def start_grammar_pool():
+    """Warms the pool at startup and shares its servers with job processes spawned later."""
+    if not ENABLE_GRAMMAR_TOOL:
+        return
+    try:
+        pool = get_grammar_pool()
+    except Exception as e:
+        print(f"LanguageTool unavailable, using basic grammar checks: {e}")
+        return
+    served = pool.served_urls()
+    if served and not os.getenv(GRAMMAR_SERVER_URLS):
+        os.environ[GRAMMAR_SERVER_URLS] = ','.join(served)
+
+@lru_cache(maxsize=65536)
+def dictionary_syllables(word):
+    """Hyphenation-dictionary syllable count from textstat, cached per word."""
+    import textstat
+    return max(1, textstat.syllable_count(word))
+
+@lru_cache(maxsize=65536)
+def dictionary_difficult_word(word):
+    """textstat's Gunning fog rule: three or more syllables and not on the Dale-Chall easy list."""
+    import textstat
+    return textstat.is_difficult_word(word, 3)
+
 def check_grammar(text):
     grammar_issues = []
     readability_scores = {}
+    # One tokenizer pass feeds the rules, readability formulas and text statistics
+    stats = text_analysis.profile(text, dictionary_syllables if TEXTSTAT_AVAILABLE else
+                                  text_analysis.estimate_word_syllables)
 
     if ENABLE_GRAMMAR_TOOL:
         try:
-            global LANGUAGE_TOOL_AVAILABLE
-            if not LANGUAGE_TOOL_AVAILABLE:
-                import importlib
-                language_tool_python = importlib.import_module('language_tool_python')
-                LANGUAGE_TOOL_AVAILABLE = True
-            tool = language_tool_python.LanguageTool('en-US')
-            matches = tool.check(text)
-            for match in matches:
-                issue = {
-                    'message': match.message,
-                    'context': match.context,
-                    'offset': match.offset,
-                    'length': match.length,
-                    'rule_id': match.ruleId,
-                    'replacements': match.replacements[:3] if match.replacements else []
-                }
-                grammar_issues.append(issue)
-            tool.close()
+            grammar_issues = get_grammar_pool().check(text)
         except Exception as e:
             print(f"LanguageTool error: {e}")
-            grammar_issues = basic_grammar_check(text)
+            grammar_issues = basic_grammar_check(text, stats)
     else:
-        grammar_issues = basic_grammar_check(text)
+        grammar_issues = basic_grammar_check(text, stats)
 
     if TEXTSTAT_AVAILABLE:
-        try:
-            readability_scores = {
-                'flesch_reading_ease': textstat.flesch_reading_ease(text),
-                'flesch_kincaid_grade': textstat.flesch_kincaid_grade(text),
-                'gunning_fog': textstat.gunning_fog(text),
-                'smog_index': textstat.smog_index(text),
-                'automated_readability_index': textstat.automated_readability_index(text)
-            }
-        except Exception as e:
-            print(f"Textstat error: {e}")
-            readability_scores = basic_readability_analysis(text)
+        readability_scores = text_analysis.readability_scores(stats, dictionary_difficult_word)
     else:
-        readability_scores = basic_readability_analysis(text)
-    text_stats = {
-        'word_count': len(text.split()),
-        'sentence_count': len([s for s in text.split('.') if s.strip()]),
-        'syllable_count': estimate_syllables(text),
-        'character_count': len(text)
-    }
+        readability_scores = basic_readability_analysis(text, stats)
+    text_stats = text_analysis.text_stats(stats)
     return {
         'grammar_issues': grammar_issues,
         'total_issues': len(grammar_issues),
@@ -327,62 +926,16 @@ def check_grammar(text):
         'text_stats': text_stats
     }
 
-def basic_grammar_check(text):
-    issues = []
-    sentences = text.split('.')
-    for i, sentence in enumerate(sentences):
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-        if '  ' in sentence:
-            issues.append({
-                'message': 'Double space detected',
-                'context': sentence,
-                'offset': 0,
-                'length': len(sentence),
-                'rule_id': 'DOUBLE_SPACE',
-                'replacements': [sentence.replace('  ', ' ')]
-            })
-        if i > 0 and sentence and sentence[0].islower():
-            issues.append({
-                'message': 'Sentence should start with capital letter',
-                'context': sentence,
-                'offset': 0,
-                'length': 1,
-                'rule_id': 'CAPITALIZATION',
-                'replacements': [sentence[0].upper() + sentence[1:]]
-            })
-        common_mistakes = {
-            'teh': 'the',
-            'adn': 'and',
-            'recieve': 'receive',
-            'seperate': 'separate',
-            'occured': 'occurred',
-            'definately': 'definitely',
-            'accomodate': 'accommodate',
-            'begining': 'beginning',
-            'neccessary': 'necessary',
-            'occassion': 'occasion'
-        }
-        for mistake, correction in common_mistakes.items():
-            if mistake in sentence.lower():
-                issues.append({
-                    'message': f'Possible misspelling: "{mistake}"',
-                    'context': sentence,
-                    'offset': 0,
-                    'length': len(sentence),
-                    'rule_id': 'MISSPELLING',
-                    'replacements': [sentence.replace(mistake, correction)]
-                })
-    return issues
+def basic_grammar_check(text, stats=None):
+    """Built-in rules from text_analysis: spacing, capitalization and common misspellings."""
+    return text_analysis.grammar_issues(stats or text_analysis.profile(text))
 
-def basic_readability_analysis(text):
-    words = text.split()
-    sentences = [s for s in text.split('.') if s.strip()]
-    if not words or not sentences:
+def basic_readability_analysis(text, stats=None):
+    stats = stats or text_analysis.profile(text)
+    if not stats.word_count or not stats.sentence_count:
         return {}
-    avg_words_per_sentence = len(words) / len(sentences)
-    avg_chars_per_word = len(text.replace(' ', '')) / len(words)
+    avg_words_per_sentence = stats.word_count / stats.sentence_count
+    avg_chars_per_word = stats.nonspace_chars / stats.word_count
     if avg_words_per_sentence <= 10 and avg_chars_per_word <= 4:
         reading_level = "Easy"
     elif avg_words_per_sentence <= 15 and avg_chars_per_word <= 5:
@@ -396,27 +949,393 @@ def basic_readability_analysis(text):
         'estimated_grade_level': max(1, min(12, int(avg_words_per_sentence / 2 + avg_chars_per_word)))
     }
 
-def estimate_syllables(text):
-    words = text.split()
-    total_syllables = 0
-    for word in words:
-        word = word.lower()
-        vowels = 'aeiouy'
-        syllable_count = 0
-        prev_was_vowel = False
-        for char in word:
-            if char in vowels:
-                if not prev_was_vowel:
-                    syllable_count += 1
-                prev_was_vowel = True
-            else:
-                prev_was_vowel = False
-        if word.endswith('e') and syllable_count > 1:
-            syllable_count -= 1
-        total_syllables += max(1, syllable_count)
-    return total_syllables
+def _extract_and_store_upload(payload, context):
+    file_path, filename, file_type = payload['file_path'], payload['filename'], payload['file_type']
+    finished = False
+    try:
+        context.set_progress('extracting', 0.05)
+        content, features = extract_document(file_path, file_type, payload.get('file_hash'))
+        if features is None:
+            finished = True
+            raise JobError(content)
+        context.set_progress('saving', 0.2)
+        doc_id = save_document_to_db(filename, file_path, file_type, content, features,
+                                     file_hash=payload.get('file_hash'))
+        finished = True
+    finally:
+        # Keep the upload around while a retry may still need it
+        if (finished or context.is_last_attempt) and os.path.exists(file_path):
+            os.remove(file_path)
+    return doc_id, content, features
+
+# Fields of each match sent in 'partial' job events; the saved report holds the full analysis
+PARTIAL_RESULT_KEYS = ('doc_id', 'filename', 'similarity_percentage', 'status', 'color')
+
+def run_analysis_job(payload, context):
+    """Job handler: extracts and stores an upload (unless already known), compares it and saves its report."""
+    with metrics.collect_timings() as timings:
+        doc_id = payload.get('doc_id')
+        if doc_id is None and payload.get('file_hash'):
+            # A retried attempt finds the upload already stored by the one before it
+            doc_id = find_document_by_hash(payload['file_hash'])
+        if doc_id is not None:
+            rows = load_documents([doc_id])
+            if not rows:
+                raise JobError(f"Document {doc_id} not found")
+            _, filename, content = rows[0]
+            file_type = payload['file_type']
+            features = get_document_features(doc_id, content)
+        else:
+            doc_id, content, features = _extract_and_store_upload(payload, context)
+            filename, file_type = payload['filename'], payload['file_type']
+        results = []
+        context.set_progress('comparing', 0.25)
+        with closing(iter_corpus_comparisons(doc_id, content, features, filename)) as comparisons:
+            for completed, total, chunk_results in comparisons:
+                results.extend(chunk_results)
+                # Subscribers of /jobs/<id>/events see each chunk's matches as it finishes
+                context.publish('partial', {
+                    'completed': completed,
+                    'total': total,
+                    'matches': [{key: result[key] for key in PARTIAL_RESULT_KEYS} for result in chunk_results]
+                })
+                context.set_progress('comparing', 0.25 + 0.65 * completed / total)
+        context.set_progress('reporting', 0.9)
+        report = build_single_file_report(doc_id, filename, file_type, content, results,
+                                          timings if REPORT_TIMINGS else None)
+        report_id = save_single_file_report(doc_id, report)
+        return {
+            'doc_id': doc_id,
+            'report_id': report_id,
+            'highest_similarity': report['overall_summary']['highest_similarity']
+        }
+
+def run_comparison_job(payload, context):
+    """Job handler: all-vs-all similarity of the whole corpus, saved as a batch report."""
+    context.set_progress('comparing', 0.1)
+    report_id = run_batch_comparison(payload.get('threshold'), payload.get('report_name'))
+    return {'report_id': report_id}
+
+def run_cluster_job(payload, context):
+    """Job handler: incremental near-duplicate clustering of the whole corpus."""
+    report_id = run_cluster_batch(payload.get('threshold'), payload.get('report_name'),
+                                  progress=context.set_progress)
+    return {'report_id': report_id}
+
+job_queue = None
+
+def get_job_queue():
+    global job_queue
+    if job_queue is None:
+        job_queue = JobQueue(DATABASE, {
+            'analyze_upload': run_analysis_job,
+            'compare_corpus': run_comparison_job,
+            'cluster_corpus': run_cluster_job
+        }, max_running=JOB_MAX_RUNNING)
+        if JOB_WORKERS > 0:
+            job_queue.start(JOB_WORKERS)
+    return job_queue
+
+# --- Single-File Analysis Routes ---
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@routes.route('/upload_single_file', methods=['POST'])
+def upload_single_file():
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'error': 'No file selected'}), 400
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Unsupported file type'}), 400
+    filename = secure_filename(file.filename)
+    file_type = filename.rsplit('.', 1)[1].lower()
+    # Prefix with a unique id so concurrent uploads of the same name do not collide
+    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{os.urandom(8).hex()}_{filename}")
+    file_hash, legacy_hash, _ = save_upload(file, file_path)
+    # Re-submitted files skip extraction and OCR and are compared using their stored content
+    existing_id = find_document_by_hash(file_hash, legacy_hash)
+    if existing_id is not None:
+        os.remove(file_path)
+        payload = {'doc_id': existing_id, 'file_type': file_type}
+    else:
+        payload = {'file_path': file_path, 'filename': filename, 'file_type': file_type, 'file_hash': file_hash}
+    job_id = get_job_queue().enqueue('analyze_upload', payload,
+                                     max_attempts=JOB_MAX_ATTEMPTS, timeout=JOB_TIMEOUT)
+    return jsonify({
+        'job_id': job_id,
+        'filename': filename,
+        'duplicate_of': existing_id,
+        'status_url': url_for('.job_status', job_id=job_id),
+        'events_url': url_for('.job_events', job_id=job_id)
+    }), 202
+
+# --- API Routes ---
+
+@routes.route('/api/check', methods=['POST'])
+def api_check():
+    """Scores two texts; repeated checks of the same pair are served from pair_score_cache."""
+    data = request.get_json(silent=True) or {}
+    text1, text2 = data.get('text1'), data.get('text2')
+    if not isinstance(text1, str) or not isinstance(text2, str) or not text1.strip() or not text2.strip():
+        return jsonify({'error': 'text1 and text2 are required'}), 400
+    key = pair_score_cache.make_key(text1, text2, SCORE_VERSION)
+    response = pair_score_cache.get(key)
+    if response is None:
+        result = detect_plagiarism(text1, text2)
+        response = {k: result[k] for k in ('similarity', 'percentage', 'status', 'color',
+                                           'cosine_similarity', 'sequence_similarity', 'details')}
+        pair_score_cache.put(key, response)
+    return jsonify(response)
+
+# --- Batch Routes ---
+
+@routes.route('/batch_compare', methods=['POST'])
+def batch_compare():
+    """Queues an all-vs-all comparison of the corpus; pairs at or above the threshold are reported."""
+    data = request.get_json(silent=True) or {}
+    threshold = data.get('threshold', BATCH_SIMILARITY_THRESHOLD)
+    if not isinstance(threshold, (int, float)) or not 0 < threshold <= 1:
+        return jsonify({'error': 'threshold must be between 0 and 1'}), 400
+    payload = {'threshold': threshold, 'report_name': data.get('report_name')}
+    job_id = get_job_queue().enqueue('compare_corpus', payload,
+                                     max_attempts=JOB_MAX_ATTEMPTS, timeout=BATCH_JOB_TIMEOUT)
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('.job_status', job_id=job_id),
+        'events_url': url_for('.job_events', job_id=job_id)
+    }), 202
+
+@routes.route('/batch_cluster', methods=['POST'])
+def batch_cluster():
+    """Queues a near-duplicate clustering run; only documents added since the last run are linked."""
+    data = request.get_json(silent=True) or {}
+    threshold = data.get('threshold', CLUSTER_THRESHOLD)
+    if not isinstance(threshold, (int, float)) or not 0 < threshold <= 1:
+        return jsonify({'error': 'threshold must be between 0 and 1'}), 400
+    payload = {'threshold': threshold, 'report_name': data.get('report_name')}
+    job_id = get_job_queue().enqueue('cluster_corpus', payload,
+                                     max_attempts=JOB_MAX_ATTEMPTS, timeout=CLUSTER_JOB_TIMEOUT)
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('.job_status', job_id=job_id),
+        'events_url': url_for('.job_events', job_id=job_id)
+    }), 202
+
+# --- Job Routes ---
+
+@routes.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@routes.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Pushes job state changes as Server-Sent Events until the job reaches a terminal state.
+
+    Events the job publishes, such as the 'partial' matches of an upload analysis, are sent
+    as they arrive and always before the job's final state.
+    """
+    queue = get_job_queue()
+    if queue.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        last_update = None
+        last_event = 0
+        while True:
+            job = queue.get(job_id)
+            for last_event, event, data in queue.events(job_id, after=last_event):
+                yield sse_event(event, data)
+            if job['updated_at'] != last_update:
+                last_update = job['updated_at']
+                yield sse_event('job', job)
+            if job['state'] in TERMINAL_STATES:
+                return
+            time.sleep(0.5)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@routes.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+# --- Metrics ---
+
+def collect_cache_metrics():
+    return [('extraction_cache_size_bytes', 'Bytes held by the on-disk extraction cache.', 'gauge',
+             [({}, extraction_cache.stats()['size_bytes'])])]
+
+def collect_process_metrics():
+    """Values held in this process's memory; the metrics store adds them up across processes."""
+    scores = pair_score_cache.stats()
+    return [
+        ('score_cache_lookups_total', '/api/check score cache lookups, by result.', 'counter',
+         [({'result': 'hit'}, scores['hits']), ({'result': 'miss'}, scores['misses'])]),
+        ('score_cache_evictions_total', 'Entries evicted from the /api/check score cache.', 'counter',
+         [({}, scores['evictions'])]),
+        ('score_cache_size_bytes', 'Approximate size of the /api/check score caches of all processes.', 'gauge',
+         [({}, scores['size_bytes'])]),
+        ('grammar_tool_restarts_total', 'LanguageTool instances restarted after failing a check.', 'counter',
+         [({}, grammar_tools.restarts if grammar_tools is not None else None)])
+    ]
+
+def collect_job_metrics():
+    try:
+        with database.cursor(DATABASE) as cursor:
+            cursor.execute('SELECT job_type, state, COUNT(*) FROM jobs GROUP BY job_type, state')
+            rows = cursor.fetchall()
+    except sqlite3.OperationalError:
+        return []
+    return [('jobs', 'Jobs in the queue table, by type and state.', 'gauge',
+             [({'job_type': job_type, 'state': state}, count) for job_type, state, count in rows])]
+
+metrics.REGISTRY.register_collector(collect_cache_metrics)
+metrics.REGISTRY.register_collector(collect_job_metrics)
+metrics.REGISTRY.register_collector(collect_process_metrics, per_process=True)
+
+@routes.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@routes.after_app_request
+def record_request_metrics(response):
+    # The URL rule, not the path, keeps label cardinality bounded
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    started = g.get('request_started')
+    if started is not None:
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    return response
+
+@routes.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of counters, stage histograms and cache statistics, summed over all processes."""
+    return Response(metrics_store.render(metrics.REGISTRY), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# --- Report Routes ---
+
+# Column order matches the row indexes used by reports.html and report_detail.html
+SINGLE_FILE_LIST_COLUMNS = ('id', 'report_name', 'created_date', 'filename', 'highest_similarity')
+COMPARISON_LIST_COLUMNS = ('id', 'report_name', 'similarity_percentage', 'created_date', 'doc1_name', 'doc2_name')
+COMPARISON_DETAIL_COLUMNS = ('id', 'report_name', 'doc1_name', 'similarity_percentage', 'doc2_name',
+                             'risk_level', 'created_date')
+
+@routes.route('/reports')
+def reports():
+    """Lists report summaries newest first; ?single_before= and ?comparison_before= page back in time."""
+    limit = min(max(request.args.get('limit', REPORTS_PAGE_SIZE, type=int), 1), 100)
+    with database.cursor(DATABASE) as cursor:
+        single_file_reports, single_next = report_store.list_page(
+            cursor, 'single_file_reports', SINGLE_FILE_LIST_COLUMNS, request.args.get('single_before'), limit)
+        comparison_reports, comparison_next = report_store.list_page(
+            cursor, 'reports', COMPARISON_LIST_COLUMNS, request.args.get('comparison_before'), limit)
+    return render_template('reports.html', single_file_reports=single_file_reports,
+                           comparison_reports=comparison_reports, single_next=single_next,
+                           comparison_next=comparison_next, limit=limit)
+
+@routes.route('/report/<int:report_id>')
+def view_report(report_id):
+    if request.args.get('kind') == 'single':
+        return comprehensive_report(report_id)
+    with database.cursor(DATABASE) as cursor:
+        cursor.execute(f"SELECT {', '.join(COMPARISON_DETAIL_COLUMNS)} FROM reports WHERE id = ?", (report_id,))
+        report = cursor.fetchone()
+        if not report:
+            return jsonify({'error': 'Report not found'}), 404
+        report_data = report_store.load_report(cursor, 'reports', report_id)
+    return render_template('report_detail.html', report=report, report_data=report_data)
+
+@routes.route('/comprehensive_report/<int:report_id>')
+def comprehensive_report(report_id):
+    with database.cursor(DATABASE) as cursor:
+        report_data = report_store.load_report(cursor, 'single_file_reports', report_id)
+    if report_data is None:
+        return jsonify({'error': 'Report not found'}), 404
+    return render_template('comprehensive_report.html', report_data=report_data, report_id=report_id)
+
+@routes.route('/download_report/<int:report_id>')
+def download_report(report_id):
+    """Sends a stored report as a JSON attachment; ?kind=single or ?kind=batch selects the table."""
+    table = {'single': 'single_file_reports', 'batch': 'batch_reports'}.get(request.args.get('kind'), 'reports')
+    with database.cursor(DATABASE) as cursor:
+        report_data = report_store.load_report(cursor, table, report_id)
+    if report_data is None:
+        return jsonify({'error': 'Report not found'}), 404
+    filename = secure_filename(f"{report_data.get('report_name') or f'report_{report_id}'}.json")
+    return Response(json.dumps(report_data, indent=2), mimetype='application/json',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 # ... (the remainder of the code consists of all routes, single uploads, report generation, batch processing, and the Flask run block, implemented and indented as per the above conventions from your original script.) ...
 
+# --- Pre-fork Serving ---
+
+def warm_shared_state():
+    """Runs in a pre-fork server's master, before workers are forked and on every reload.
+
+    Migrations have already run in create_app() as the app was preloaded. With
+    CANDIDATE_SEARCH=tfidf the TF-IDF snapshot is brought up to date, so the job processes
+    that score uploads map it instead of reading the corpus from SQLite; the master keeps
+    no copy. Finally, objects built so far are moved out of the garbage collector's view:
+    its passes write to every object header they visit, which would copy those pages into
+    each worker.
+    """
+    global corpus_index
+    if CANDIDATE_SEARCH == 'tfidf':
+        save_corpus_index(get_corpus_index())
+        corpus_index = None
+    gc.collect()
+    gc.freeze()
+
+def after_fork():
+    """Runs first in each forked worker: drops state that must not be shared with the master."""
+    global grammar_tools, job_queue
+    # The queue's threads do not survive a fork; workers start their own on first use
+    job_queue = None
+    # The master's pool owns the LanguageTool servers; workers connect through GRAMMAR_SERVER_URLS
+    grammar_tools = None
+    metrics_store.after_fork(metrics.REGISTRY)
+    metrics_store.start_flusher(metrics.REGISTRY, METRICS_FLUSH_INTERVAL)
+
+def before_exit():
+    """Runs in the master and in each worker as it exits: hands its last metrics to the shared store."""
+    try:
+        metrics_store.close(metrics.REGISTRY)
+    except Exception as e:
+        print(f"Metrics flush failed: {e}")
+
+# --- App Factory ---
+
+def create_app(config=None):
+    """Builds the Flask app and runs the database migrations.
+
+    The upload folder and the tables are created here rather than when the module is
+    imported. Under gunicorn's preload_app this runs once in the master, before forking.
+    """
+    flask_app = Flask(__name__)
+    flask_app.secret_key = 'your-secret-key-here'
+    flask_app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    flask_app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+    flask_app.config.update(config or {})
+    os.makedirs(flask_app.config['UPLOAD_FOLDER'], exist_ok=True)
+    init_db()
+    flask_app.register_blueprint(routes)
+    return flask_app
+
+def __getattr__(name):
+    # `from app import app` and `flask --app app:app` still work; the app is built on first access
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Development server; production runs under gunicorn -c gunicorn.conf.py
+    start_grammar_pool()
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
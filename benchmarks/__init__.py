@@ -0,0 +1,4 @@
+"""Reproducible performance benchmarks for the detection pipeline.
+
+Run with ``python -m benchmarks``; see ``python -m benchmarks --help``.
+"""
@@ -0,0 +1,64 @@
+"""Command-line entry point for the benchmark suite.
+
+Usage:
+    python -m benchmarks [--seed N] [--doc-sizes 200,1000,5000] [--corpus-sizes 100,1000]
+                         [--repeat N] [--stages pairs,grammar,extraction,corpus]
+                         [--output results.json] [--compare baseline.json]
+"""
+import sys
+import json
+import argparse
+
+from benchmarks import harness
+
+def _int_list(value):
+    return [int(part) for part in value.split(',') if part]
+
+def print_summary(results, out):
+    print(f"{'stage':<32} {'params':<48} {'p50 ms':>10} {'p99 ms':>10} {'units/s':>14} {'peak KB':>10}", file=out)
+    for r in results['results']:
+        params = ' '.join(f"{k}={v}" for k, v in r['params'].items())
+        print(f"{r['stage']:<32} {params:<48} {r['latency_ms']['p50']:>10.2f} {r['latency_ms']['p99']:>10.2f} "
+              f"{(r['units_per_second'] or 0):>14.1f} {r['peak_memory_bytes'] / 1024:>10.1f}", file=out)
+
+def print_comparison(rows, out):
+    print(f"\n{'stage':<32} {'params':<48} {'base p50':>10} {'p50':>10} {'p50 %':>8} {'thru %':>8}", file=out)
+    for stage, params, before, now, p50_change, rate_change in rows:
+        params = ' '.join(f"{k}={v}" for k, v in params.items())
+        print(f"{stage:<32} {params:<48} {before:>10.2f} {now:>10.2f} "
+              f"{p50_change if p50_change is not None else '-':>8} "
+              f"{rate_change if rate_change is not None else '-':>8}", file=out)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Benchmark the plagiarism detection pipeline on a seeded synthetic corpus.')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the synthetic corpus')
+    parser.add_argument('--doc-sizes', type=_int_list, default=[200, 1000, 5000], help='Words per document')
+    parser.add_argument('--corpus-sizes', type=_int_list, default=[100, 1000], help='Documents per corpus')
+    parser.add_argument('--repeat', type=int, default=5, help='Inputs measured per stage and size')
+    parser.add_argument('--rate', type=float, default=0.3, help='Fraction of sentences plagiarized in pairs')
+    parser.add_argument('--stages', default='pairs,grammar,extraction,corpus',
+                        help='Comma-separated stages to run')
+    parser.add_argument('--workdir', default=None, help='Keep databases and fixtures here instead of a temp dir')
+    parser.add_argument('--output', default=None, help='Write JSON results to this file')
+    parser.add_argument('--compare', default=None, help='Baseline JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    results = harness.run(seed=args.seed, doc_sizes=args.doc_sizes, corpus_sizes=args.corpus_sizes,
+                          repeat=args.repeat, rate=args.rate, stages=args.stages.split(','),
+                          workdir=args.workdir, log=lambda message: print(f"  {message}", file=sys.stderr))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    print_summary(results, sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print_comparison(harness.compare(baseline, results), sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
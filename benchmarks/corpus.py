@@ -0,0 +1,110 @@
+"""Seeded generator of synthetic documents with controlled size and plagiarism.
+
+The same seed always yields the same vocabulary, documents and pairs, so timings
+from different versions of the code are measured on identical inputs.
+"""
+import random
+
+PLAGIARISM_MODES = ('verbatim', 'paraphrase', 'shuffled')
+
+_ONSETS = ('b', 'c', 'd', 'f', 'g', 'h', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'w', 'st', 'tr', 'pl', 'gr', 'ch')
+_VOWELS = ('a', 'e', 'i', 'o', 'u', 'ea', 'io', 'ou')
+_CODAS = ('', '', 'n', 'r', 's', 't', 'l', 'nd', 'st', 'ck')
+_FUNCTION_WORDS = ('the', 'a', 'of', 'and', 'to', 'in', 'is', 'that', 'for', 'with', 'as', 'on', 'by', 'this')
+
+class SyntheticCorpus:
+    def __init__(self, seed=42, vocabulary_size=5000):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        words = set()
+        while len(words) < vocabulary_size:
+            words.add(''.join(self.rng.choice(_ONSETS) + self.rng.choice(_VOWELS) + self.rng.choice(_CODAS)
+                              for _ in range(self.rng.randint(1, 3))))
+        self.vocabulary = sorted(words)
+        # Fixed synonym table used by paraphrasing, so rewritten words are consistent within a run
+        shuffled = list(self.vocabulary)
+        self.rng.shuffle(shuffled)
+        self.synonyms = dict(zip(self.vocabulary, shuffled))
+
+    def sentence(self, min_words=6, max_words=22):
+        words = []
+        for _ in range(self.rng.randint(min_words, max_words)):
+            pool = _FUNCTION_WORDS if self.rng.random() < 0.3 else self.vocabulary
+            words.append(self.rng.choice(pool))
+        words[0] = words[0].capitalize()
+        return ' '.join(words) + self.rng.choice(('.', '.', '.', '?', '!'))
+
+    def sentences(self, word_count):
+        result, total = [], 0
+        while total < word_count:
+            sentence = self.sentence()
+            result.append(sentence)
+            total += len(sentence.split())
+        return result
+
+    def document(self, word_count, sentences_per_paragraph=5):
+        sentences = self.sentences(word_count)
+        paragraphs = [' '.join(sentences[i:i + sentences_per_paragraph])
+                      for i in range(0, len(sentences), sentences_per_paragraph)]
+        return '\n\n'.join(paragraphs)
+
+    def paraphrase(self, sentence, rate=0.4):
+        """Swaps roughly rate of the content words for their synonyms and drops some function words."""
+        words = []
+        for word in sentence.rstrip('.?!').split():
+            lower = word.lower()
+            if lower in _FUNCTION_WORDS and self.rng.random() < rate / 2:
+                continue
+            if lower in self.synonyms and self.rng.random() < rate:
+                word = self.synonyms[lower]
+            words.append(word)
+        if not words:
+            return sentence
+        words[0] = words[0].capitalize()
+        return ' '.join(words) + sentence[-1]
+
+    def plagiarized(self, source, rate, mode='verbatim'):
+        """Builds a document of the source's length where about rate of the sentences derive from source."""
+        if mode not in PLAGIARISM_MODES:
+            raise ValueError(f"Unknown plagiarism mode: {mode}")
+        source_sentences = [s for paragraph in source.split('\n\n') for s in _split_sentences(paragraph)]
+        copied = [s for s in source_sentences if self.rng.random() < rate]
+        if mode == 'paraphrase':
+            copied = [self.paraphrase(s) for s in copied]
+        fresh_words = max(0, len(source.split()) - sum(len(s.split()) for s in copied))
+        fresh = self.sentences(fresh_words) if fresh_words else []
+        if mode == 'shuffled':
+            self.rng.shuffle(copied)
+            sentences = copied + fresh
+            self.rng.shuffle(sentences)
+        else:
+            # Keep copied passages in source order, interleaved with original writing
+            sentences = list(fresh)
+            for sentence in copied:
+                sentences.insert(self.rng.randint(0, len(sentences)), sentence)
+        return '\n\n'.join(' '.join(sentences[i:i + 5]) for i in range(0, len(sentences), 5))
+
+    def pair(self, word_count, rate=0.3, mode='verbatim'):
+        source = self.document(word_count)
+        return source, self.plagiarized(source, rate, mode)
+
+    def corpus(self, size, word_count=500, duplicate_rate=0.1, plagiarism_rate=0.5):
+        """Returns size documents, about duplicate_rate of which plagiarize an earlier one."""
+        documents = []
+        for _ in range(size):
+            if documents and self.rng.random() < duplicate_rate:
+                documents.append(self.plagiarized(self.rng.choice(documents), plagiarism_rate,
+                                                  self.rng.choice(PLAGIARISM_MODES)))
+            else:
+                documents.append(self.document(word_count))
+        return documents
+
+def _split_sentences(paragraph):
+    sentences, start = [], 0
+    for i, char in enumerate(paragraph):
+        if char in '.?!' and (i + 1 == len(paragraph) or paragraph[i + 1] == ' '):
+            sentences.append(paragraph[start:i + 1].strip())
+            start = i + 1
+    if paragraph[start:].strip():
+        sentences.append(paragraph[start:].strip())
+    return sentences
@@ -0,0 +1,87 @@
+"""Writes synthetic documents as TXT, DOCX, XLSX and PDF files for extraction benchmarks."""
+import os
+
+FIXTURE_TYPES = ('txt', 'docx', 'xlsx', 'pdf')
+
+PDF_LINE_CHARS = 90
+PDF_LINES_PER_PAGE = 50
+
+def write_txt(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def write_docx(path, text):
+    from docx import Document
+    document = Document()
+    for paragraph in text.split('\n\n'):
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+def write_xlsx(path, text, columns=8):
+    from openpyxl import Workbook
+    workbook = Workbook()
+    sheet = workbook.active
+    for paragraph in text.split('\n\n'):
+        words = paragraph.split()
+        for start in range(0, len(words), columns):
+            sheet.append(words[start:start + columns])
+    workbook.save(path)
+
+def _wrap(text, width):
+    lines = []
+    for paragraph in text.split('\n\n'):
+        line = ''
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        lines.append('')
+    return lines
+
+def _pdf_escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def write_pdf(path, text):
+    """Writes a minimal text-only PDF (Helvetica, one content stream per page) without extra dependencies."""
+    lines = _wrap(text, PDF_LINE_CHARS)
+    pages = [lines[i:i + PDF_LINES_PER_PAGE] for i in range(0, len(lines), PDF_LINES_PER_PAGE)] or [[]]
+    objects = [None, None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for page_lines in pages:
+        content = 'BT /F1 10 Tf 12 TL 50 800 Td\n' + ''.join(
+            f"({_pdf_escape(line)}) '\n" for line in page_lines) + 'ET'
+        stream = content.encode('latin-1', 'replace')
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        content_id = len(objects)
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % content_id)
+        page_ids.append(len(objects))
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids).encode('ascii')
+    objects[1] = b'<< /Type /Pages /Kids [' + kids + b'] /Count %d >>' % len(page_ids)
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+        xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b'%010d 00000 n \n' % offset)
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+
+WRITERS = {
+    'txt': write_txt,
+    'docx': write_docx,
+    'xlsx': write_xlsx,
+    'pdf': write_pdf
+}
+
+def write_fixture(directory, name, file_type, text):
+    path = os.path.join(directory, f"{name}.{file_type}")
+    WRITERS[file_type](path, text)
+    return path
@@ -0,0 +1,241 @@
+"""Timing harness: runs each pipeline stage over generated inputs and records latency,
+throughput and peak memory in a JSON-serializable result list."""
+import os
+import sys
+import json
+import time
+import shutil
+import itertools
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime
+
+from benchmarks.corpus import SyntheticCorpus, PLAGIARISM_MODES
+from benchmarks.fixtures import FIXTURE_TYPES, write_fixture
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FORMAT = 1
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def measure(stage, fn, inputs, params=None, units='items', unit_counts=None, setup=None, warmup=1):
+    """Calls fn(item) for every input and summarizes the timings.
+
+    unit_counts gives the work per input (words, bytes, documents) for throughput. setup runs
+    untimed before every call. Peak memory is traced on one extra call with the largest input,
+    so tracing overhead never touches the latencies.
+    """
+    inputs = list(inputs)
+    unit_counts = list(unit_counts) if unit_counts is not None else [1] * len(inputs)
+    for item in inputs[:warmup]:
+        if setup:
+            setup()
+        fn(item)
+    latencies = []
+    for item in inputs:
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - started)
+    largest = inputs[max(range(len(inputs)), key=lambda i: unit_counts[i])] if inputs else None
+    peak = 0
+    if inputs:
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            fn(largest)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    total = sum(latencies)
+    ordered = sorted(latencies)
+    return {
+        'stage': stage,
+        'params': params or {},
+        'count': len(latencies),
+        'total_seconds': round(total, 6),
+        'ops_per_second': round(len(latencies) / total, 3) if total else None,
+        'units': units,
+        'units_per_second': round(sum(unit_counts) / total, 3) if total else None,
+        'latency_ms': {
+            'mean': round(total / len(latencies) * 1000, 3) if latencies else 0.0,
+            'p50': round(percentile(ordered, 0.50) * 1000, 3),
+            'p90': round(percentile(ordered, 0.90) * 1000, 3),
+            'p99': round(percentile(ordered, 0.99) * 1000, 3),
+            'max': round(ordered[-1] * 1000, 3) if ordered else 0.0
+        },
+        'peak_memory_bytes': peak
+    }
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def _import_app(workdir):
+    """Imports app with its database, uploads and cache directories inside workdir."""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+    import app
+    return app
+
+def bench_pairs(app, corpus, doc_sizes, repeat, rate, results, log):
+    for words in doc_sizes:
+        for mode in PLAGIARISM_MODES:
+            pairs = [corpus.pair(words, rate, mode) for _ in range(repeat)]
+            params = {'words': words, 'mode': mode, 'rate': rate}
+            counts = [len(a.split()) + len(b.split()) for a, b in pairs]
+            log(f"detect_plagiarism {params}")
+            results.append(measure('detect_plagiarism', lambda p: app.detect_plagiarism(*p), pairs,
+                                   params, 'words', counts))
+            log(f"find_similar_sentences {params}")
+            results.append(measure('find_similar_sentences', lambda p: app.find_similar_sentences(*p), pairs,
+                                   params, 'words', counts))
+
+def bench_grammar(app, corpus, doc_sizes, repeat, results, log):
+    for words in doc_sizes:
+        documents = [corpus.document(words) for _ in range(repeat)]
+        log(f"check_grammar words={words}")
+        results.append(measure('check_grammar', app.check_grammar, documents, {'words': words}, 'words',
+                               [len(d.split()) for d in documents]))
+
+def bench_extraction(app, corpus, doc_sizes, repeat, workdir, results, log):
+    fixture_dir = os.path.join(workdir, 'fixtures')
+    os.makedirs(fixture_dir, exist_ok=True)
+
+    def clear_cache():
+        import database
+        # The cache's size database is removed with the directory, so drop its pooled connection too
+        database.close_connections()
+        shutil.rmtree(app.extraction_cache.cache_dir, ignore_errors=True)
+
+    for words in doc_sizes:
+        for file_type in FIXTURE_TYPES:
+            paths = [write_fixture(fixture_dir, f"doc_{words}_{i}", file_type, corpus.document(words))
+                     for i in range(repeat)]
+            sizes = [os.path.getsize(path) for path in paths]
+            params = {'words': words, 'file_type': file_type}
+            log(f"extract_text_from_file {params}")
+            results.append(measure('extract_text_from_file', lambda p: app.extract_text_from_file(p, file_type),
+                                   paths, params, 'bytes', sizes, setup=clear_cache))
+            results.append(measure('extract_text_from_file_cached',
+                                   lambda p: app.extract_text_from_file(p, file_type),
+                                   paths, params, 'bytes', sizes))
+
+def bench_corpus(app, corpus, corpus_sizes, words, queries, results, log):
+    import database
+    for size in corpus_sizes:
+        database.close_connections()
+        app.DATABASE = f"bench_corpus_{size}.db"
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(app.DATABASE + suffix):
+                os.remove(app.DATABASE + suffix)
+        app.corpus_index = None
+        app.init_db()
+        documents = corpus.corpus(size, words)
+        params = {'corpus_size': size, 'words': words}
+        counter = itertools.count()
+
+        def insert(text):
+            number = next(counter)
+            features = app.compute_text_features(text)
+            with database.transaction(app.DATABASE) as cursor:
+                return app.insert_document(cursor, f"doc_{number}.txt", f"bench-{size}-{number}",
+                                           'txt', text, len(text), features)
+
+        def forget_scores():
+            # Memoized pair scores would turn every repeat into a lookup
+            app.pair_score_cache.clear()
+            with database.transaction(app.DATABASE) as cursor:
+                cursor.execute('DELETE FROM document_pairs')
+
+        log(f"insert_document {params}")
+        results.append(measure('insert_document', insert, documents, params, 'documents', warmup=0))
+        with database.cursor(app.DATABASE) as cursor:
+            cursor.execute('SELECT id FROM documents ORDER BY id LIMIT ?', (queries,))
+            stored = [(doc_id, content) for doc_id, _, content in app.load_documents([row[0] for row in cursor])]
+        log(f"compare_against_corpus {params}")
+        results.append(measure('compare_against_corpus',
+                               lambda row: app.compare_against_corpus(row[0], row[1]), stored, params,
+                               'documents', [size] * len(stored), setup=forget_scores))
+        log(f"run_cluster_batch {params}")
+        results.append(measure('run_cluster_batch', lambda _: app.run_cluster_batch(), [None], params,
+                               'documents', [size], warmup=0))
+
+def run(seed=42, doc_sizes=(200, 1000, 5000), corpus_sizes=(100, 1000), repeat=5, rate=0.3,
+        stages=None, workdir=None, log=None):
+    """Runs the selected stages and returns {'meta': ..., 'results': [...]}."""
+    log = log or (lambda message: None)
+    stages = set(stages or ('pairs', 'grammar', 'extraction', 'corpus'))
+    own_workdir = workdir is None
+    workdir = os.path.abspath(workdir or tempfile.mkdtemp(prefix='plagiarism-bench-'))
+    previous_cwd = os.getcwd()
+    started = time.perf_counter()
+    results = []
+    try:
+        app = _import_app(workdir)
+        corpus = SyntheticCorpus(seed)
+        if 'pairs' in stages:
+            bench_pairs(app, corpus, doc_sizes, repeat, rate, results, log)
+        if 'grammar' in stages:
+            bench_grammar(app, corpus, doc_sizes, repeat, results, log)
+        if 'extraction' in stages:
+            bench_extraction(app, corpus, doc_sizes, repeat, workdir, results, log)
+        if 'corpus' in stages:
+            bench_corpus(app, corpus, corpus_sizes, min(doc_sizes), repeat, results, log)
+    finally:
+        os.chdir(previous_cwd)
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'meta': {
+            'format': RESULTS_FORMAT,
+            'generated_at': datetime.now().isoformat(),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': seed,
+            'doc_sizes': list(doc_sizes),
+            'corpus_sizes': list(corpus_sizes),
+            'repeat': repeat,
+            'plagiarism_rate': rate,
+            'stages': sorted(stages),
+            'elapsed_seconds': round(time.perf_counter() - started, 3)
+        },
+        'results': results
+    }
+
+def _result_key(result):
+    return result['stage'], json.dumps(result['params'], sort_keys=True)
+
+def compare(baseline, current):
+    """Returns rows of (stage, params, baseline p50, current p50, p50 change %, throughput change %)."""
+    previous = {_result_key(r): r for r in baseline['results']}
+    rows = []
+    for result in current['results']:
+        before = previous.get(_result_key(result))
+        if before is None:
+            continue
+        p50_before, p50_now = before['latency_ms']['p50'], result['latency_ms']['p50']
+        rate_before, rate_now = before['units_per_second'], result['units_per_second']
+        rows.append((
+            result['stage'], result['params'], p50_before, p50_now,
+            round((p50_now - p50_before) / p50_before * 100, 1) if p50_before else None,
+            round((rate_now - rate_before) / rate_before * 100, 1) if rate_before and rate_now else None
+        ))
+    return rows
@@ -0,0 +1,87 @@
+"""Import-time budget for app.py.
+
+Imports a module in a fresh interpreter with -X importtime inside an empty directory and
+fails when the import is slower than the budget, loads a parsing library eagerly, or
+creates files. Exits non-zero on failure so it can gate CI:
+
+    python -m benchmarks.import_time [--budget-ms 1000] [--module app] [--repeat 3]
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks.harness import REPO_ROOT
+
+DEFAULT_BUDGET_MS = 1000
+# Loaded on first use only; importing app must not pull these in
+LAZY_MODULES = ('PyPDF2', 'docx', 'openpyxl', 'PIL', 'pytesseract', 'textstat', 'language_tool_python',
+                'numpy', 'scipy')
+
+def parse_importtime(stderr):
+    """Returns [(module, self_us, cumulative_us)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def measure_import(module='app'):
+    """Imports module once in a clean interpreter and working directory."""
+    workdir = tempfile.mkdtemp(prefix='plagiarism-import-')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.getenv('PYTHONPATH')])))
+    try:
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=workdir,
+                                   env=env, capture_output=True, text=True, timeout=300)
+        created = sorted(os.listdir(workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    rows = parse_importtime(completed.stderr)
+    total = next((cumulative for name, _, cumulative in reversed(rows) if name == module), 0)
+    return {
+        'module': module,
+        'total_ms': round(total / 1000, 1),
+        'loaded': {name.split('.')[0] for name, _, _ in rows},
+        'slowest': [(name, round(cumulative / 1000, 1))
+                    for name, _, cumulative in sorted(rows, key=lambda row: -row[2]) if name != module][:10],
+        'created': created
+    }
+
+def check(module='app', budget_ms=DEFAULT_BUDGET_MS, repeat=3):
+    """Returns (fastest measurement, [problems]); the fastest run keeps disk-cache noise out of the budget."""
+    result = min((measure_import(module) for _ in range(max(1, repeat))), key=lambda r: r['total_ms'])
+    problems = []
+    if result['total_ms'] > budget_ms:
+        problems.append(f"import {module} took {result['total_ms']} ms, budget is {budget_ms} ms")
+    eager = sorted(set(LAZY_MODULES) & result['loaded'])
+    if eager:
+        problems.append(f"import {module} loaded {', '.join(eager)}; import them on first use instead")
+    if result['created']:
+        problems.append(f"import {module} created {', '.join(result['created'])}; create them in create_app()")
+    return result, problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.import_time',
+                                     description='Fail when importing the app exceeds its cold-start budget.')
+    parser.add_argument('--module', default='app', help='Module to import')
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('IMPORT_BUDGET_MS', DEFAULT_BUDGET_MS)),
+                        help='Maximum cumulative import time')
+    parser.add_argument('--repeat', type=int, default=3, help='Imports to run; the fastest is checked')
+    args = parser.parse_args(argv)
+
+    result, problems = check(args.module, args.budget_ms, args.repeat)
+    print(f"import {result['module']}: {result['total_ms']} ms (budget {args.budget_ms:g} ms)")
+    for name, cumulative_ms in result['slowest']:
+        print(f"  {name:<40} {cumulative_ms:>10.1f} ms")
+    for problem in problems:
+        print(f"FAIL: {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
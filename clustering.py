@@ -0,0 +1,166 @@
+import minhash_index
+
+DEFAULT_BATCH_SIZE = 500
+
+class UnionFind:
+    """Disjoint sets over document ids with path halving and union by size."""
+
+    def __init__(self, parents=None):
+        self.parent = {}
+        self.size = {}
+        for doc_id, root in (parents or {}).items():
+            self.parent[doc_id] = root
+            self.parent.setdefault(root, root)
+        for doc_id in self.parent:
+            root = self.find(doc_id)
+            self.size[root] = self.size.get(root, 0) + 1
+
+    def add(self, doc_id):
+        if doc_id not in self.parent:
+            self.parent[doc_id] = doc_id
+            self.size[doc_id] = 1
+
+    def find(self, doc_id):
+        parent = self.parent
+        while parent[doc_id] != doc_id:
+            parent[doc_id] = parent[parent[doc_id]]
+            doc_id = parent[doc_id]
+        return doc_id
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size.get(root_a, 1) < self.size.get(root_b, 1):
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] = self.size.get(root_a, 1) + self.size.pop(root_b, 1)
+        return root_a
+
+    def groups(self):
+        groups = {}
+        for doc_id in self.parent:
+            groups.setdefault(self.find(doc_id), []).append(doc_id)
+        return groups
+
+def jaccard(vocabulary1, vocabulary2):
+    if not vocabulary1 or not vocabulary2:
+        return 0.0
+    return len(vocabulary1 & vocabulary2) / len(vocabulary1 | vocabulary2)
+
+def config_key(threshold, num_perm):
+    """Clusters from different thresholds or signature sizes are kept apart."""
+    return f"jaccard>={threshold:g}:perm={num_perm}"
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS clustering_runs (
+            config TEXT PRIMARY KEY,
+            last_doc_id INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_clusters (
+            config TEXT NOT NULL,
+            document_id INTEGER NOT NULL,
+            root_id INTEGER NOT NULL,
+            PRIMARY KEY (config, document_id),
+            FOREIGN KEY (document_id) REFERENCES documents (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cluster_edges (
+            config TEXT NOT NULL,
+            doc_id_a INTEGER NOT NULL,
+            doc_id_b INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (config, doc_id_a, doc_id_b)
+        )
+    ''')
+
+def load_state(cursor, config):
+    """Returns (union_find, last_doc_id) as saved by the previous run for this config."""
+    cursor.execute('SELECT last_doc_id FROM clustering_runs WHERE config = ?', (config,))
+    row = cursor.fetchone()
+    cursor.execute('SELECT document_id, root_id FROM document_clusters WHERE config = ?', (config,))
+    return UnionFind(dict(cursor.fetchall())), (row[0] if row else 0)
+
+def save_state(cursor, config, union_find, doc_ids, last_doc_id):
+    """Records the current roots of doc_ids and the id the next run starts after."""
+    cursor.executemany('''
+        INSERT OR REPLACE INTO document_clusters (config, document_id, root_id) VALUES (?, ?, ?)
+    ''', [(config, doc_id, union_find.find(doc_id)) for doc_id in doc_ids])
+    cursor.execute('''
+        INSERT OR REPLACE INTO clustering_runs (config, last_doc_id, updated_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+    ''', (config, last_doc_id))
+
+def link_documents(cursor, config, union_find, doc_ids, vocabularies, bands, rows, threshold):
+    """Unions each new document with LSH candidates whose exact vocabulary Jaccard reaches threshold.
+
+    vocabularies(ids) returns {doc_id: vocabulary} and is only called for candidates. Returns the
+    ids whose root may have changed, which the caller passes to save_state.
+    """
+    changed = set()
+    for doc_id in doc_ids:
+        union_find.add(doc_id)
+        changed.add(doc_id)
+        cursor.execute('SELECT signature FROM document_minhash WHERE document_id = ?', (doc_id,))
+        row = cursor.fetchone()
+        if row is None:
+            continue
+        signature = minhash_index.signature_from_blob(row[0])
+        # The estimate only prunes; a little slack keeps pairs near the threshold for the exact check
+        candidates = minhash_index.query_candidates(
+            cursor, signature, bands, rows, threshold * 0.8, exclude_id=doc_id
+        )
+        if not candidates:
+            continue
+        candidate_vocabularies = vocabularies([doc_id] + [other_id for other_id, _ in candidates])
+        vocabulary = candidate_vocabularies.get(doc_id)
+        edges = []
+        for other_id, _ in candidates:
+            score = jaccard(vocabulary, candidate_vocabularies.get(other_id))
+            if score < threshold:
+                continue
+            union_find.add(other_id)
+            changed.add(other_id)
+            union_find.union(doc_id, other_id)
+            edges.append((config, min(doc_id, other_id), max(doc_id, other_id), score))
+        cursor.executemany('''
+            INSERT OR REPLACE INTO cluster_edges (config, doc_id_a, doc_id_b, score) VALUES (?, ?, ?, ?)
+        ''', edges)
+    # Roots of every member of a merged set may have moved
+    roots = {union_find.find(doc_id) for doc_id in changed}
+    groups = union_find.groups()
+    return {member for root in roots for member in groups[root]}
+
+def load_edges(cursor, config):
+    cursor.execute('SELECT doc_id_a, doc_id_b, score FROM cluster_edges WHERE config = ?', (config,))
+    return cursor.fetchall()
+
+def summarize_clusters(union_find, edges, vocabularies, min_size=2):
+    """Builds [{representative_id, size, members: [(doc_id, score)]}] for clusters of min_size or more.
+
+    The representative is the member with the highest total edge score (lowest id on ties), and
+    each member is scored by exact Jaccard against it.
+    """
+    weights = {}
+    for doc_id_a, doc_id_b, score in edges:
+        weights[doc_id_a] = weights.get(doc_id_a, 0.0) + score
+        weights[doc_id_b] = weights.get(doc_id_b, 0.0) + score
+    clusters = []
+    for members in union_find.groups().values():
+        if len(members) < min_size:
+            continue
+        representative = min(members, key=lambda doc_id: (-weights.get(doc_id, 0.0), doc_id))
+        member_vocabularies = vocabularies(members)
+        rep_vocabulary = member_vocabularies.get(representative)
+        scored = [(doc_id, 1.0 if doc_id == representative
+                   else jaccard(rep_vocabulary, member_vocabularies.get(doc_id)))
+                  for doc_id in members]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        clusters.append({'representative_id': representative, 'size': len(members), 'members': scored})
+    clusters.sort(key=lambda c: (-c['size'], c['representative_id']))
+    return clusters
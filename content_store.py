@@ -0,0 +1,83 @@
+import os
+import zlib
+import codecs
+import hashlib
+import tempfile
+
+# Stored value markers; rows written before compact storage hold plain TEXT
+FORMAT_COMPRESSED = b'C1'
+# B1 blobs are plain UTF-8 files and still read; new blobs are B2, zlib-compressed
+FORMAT_BLOB = b'B1'
+FORMAT_COMPRESSED_BLOB = b'B2'
+COMPRESSION_LEVEL = 6
+DEFAULT_BLOB_MIN_BYTES = 1024 * 1024
+MIGRATION_BATCH_SIZE = 200
+READ_CHUNK_SIZE = 256 * 1024
+
+class ContentStore:
+    """Encodes document text for the documents.content column.
+
+    Text is stored zlib-compressed inline. Text of blob_min_bytes or more (UTF-8) is
+    written once, compressed, to a content-addressed file and the row keeps only its
+    digest. Blobs are decompressed and decoded a chunk at a time rather than read whole.
+    """
+
+    def __init__(self, blob_dir, blob_min_bytes=DEFAULT_BLOB_MIN_BYTES):
+        self.blob_dir = blob_dir
+        self.blob_min_bytes = blob_min_bytes
+
+    def _path(self, digest, compressed=True):
+        # Compressed blobs get their own name, so they never collide with a B1 file of the same text
+        return os.path.join(self.blob_dir, digest[:2], digest + '.z' if compressed else digest)
+
+    def _write_blob(self, data):
+        digest = hashlib.blake2b(data, digest_size=32).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so concurrent readers never see a partial blob
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            compressor = zlib.compressobj(COMPRESSION_LEVEL)
+            with os.fdopen(fd, 'wb') as f:
+                for start in range(0, len(data), READ_CHUNK_SIZE):
+                    f.write(compressor.compress(data[start:start + READ_CHUNK_SIZE]))
+                f.write(compressor.flush())
+            os.replace(tmp_path, path)
+        return digest
+
+    def encode(self, text):
+        data = text.encode('utf-8')
+        if self.blob_min_bytes and len(data) >= self.blob_min_bytes:
+            return FORMAT_COMPRESSED_BLOB + self._write_blob(data).encode('ascii')
+        return FORMAT_COMPRESSED + zlib.compress(data, COMPRESSION_LEVEL)
+
+    def decode(self, value):
+        if isinstance(value, str):
+            return value
+        if value.startswith(FORMAT_COMPRESSED):
+            return zlib.decompress(value[len(FORMAT_COMPRESSED):]).decode('utf-8')
+        if value.startswith(FORMAT_COMPRESSED_BLOB):
+            return self.read_blob(value[len(FORMAT_COMPRESSED_BLOB):].decode('ascii'))
+        if value.startswith(FORMAT_BLOB):
+            return self.read_blob(value[len(FORMAT_BLOB):].decode('ascii'), compressed=False)
+        return value.decode('utf-8')
+
+    def read_blob(self, digest, compressed=True):
+        decompressor = zlib.decompressobj() if compressed else None
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        parts = []
+        with open(self._path(digest, compressed), 'rb') as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+                parts.append(decoder.decode(decompressor.decompress(chunk) if decompressor else chunk))
+        parts.append(decoder.decode(decompressor.flush() if decompressor else b'', final=True))
+        return ''.join(parts)
+
+def migrate_contents(cursor, store, batch_size=MIGRATION_BATCH_SIZE):
+    """Encodes one batch of legacy TEXT contents; returns the number of rows rewritten."""
+    cursor.execute('''
+        SELECT id, content FROM documents WHERE typeof(content) = 'text' ORDER BY id LIMIT ?
+    ''', (batch_size,))
+    rows = cursor.fetchall()
+    cursor.executemany('UPDATE documents SET content = ? WHERE id = ?',
+                       [(store.encode(content), doc_id) for doc_id, content in rows])
+    return len(rows)
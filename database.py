@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+BUSY_TIMEOUT_MS = 30000
+STATEMENT_CACHE_SIZE = 256
+DEFAULT_BATCH_SIZE = 500
+
+# Applied to every new connection; WAL lets readers proceed while one writer commits
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA foreign_keys=ON'
+)
+
+_local = threading.local()
+
+def _connections():
+    # Connections must not cross a fork, so each process starts with its own set
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.connections = {}
+    return _local.connections
+
+def get_connection(db_path, row_factory=None):
+    """Returns this thread's reusable connection to db_path, opening and tuning it on first use.
+
+    Connections run in autocommit mode; group writes with transaction().
+    """
+    connections = _connections()
+    key = (os.path.abspath(db_path), row_factory)
+    conn = connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        conn.row_factory = row_factory
+        connections[key] = conn
+    return conn
+
+def close_connections():
+    for conn in _connections().values():
+        conn.close()
+    _local.connections = {}
+
+@contextmanager
+def transaction(db_path, row_factory=None, immediate=False):
+    """Yields a cursor inside BEGIN/COMMIT, rolling back if the block raises.
+
+    immediate=True takes the write lock up front, for read-then-write sequences.
+    """
+    conn = get_connection(db_path, row_factory)
+    if conn.in_transaction:
+        # Nested use joins the outer transaction
+        yield conn.cursor()
+        return
+    conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+@contextmanager
+def cursor(db_path, row_factory=None):
+    """Yields a cursor for reads outside an explicit transaction."""
+    cur = get_connection(db_path, row_factory).cursor()
+    try:
+        yield cur
+    finally:
+        cur.close()
+
+def iter_rows(cur, batch_size=DEFAULT_BATCH_SIZE):
+    """Yields the rows of an executed query, fetching batch_size at a time.
+
+    Write through another cursor only after the loop ends; this connection is shared.
+    """
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+def executemany_batched(cur, sql, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """Runs one prepared statement over rows in fixed-size batches; returns the row count.
+
+    rows may be a generator, so a large write never builds its whole parameter list at once.
+    """
+    batch, count = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            cur.executemany(sql, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        cur.executemany(sql, batch)
+        count += len(batch)
+    return count
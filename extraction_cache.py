@@ -0,0 +1,152 @@
+import os
+import zlib
+import hashlib
+import tempfile
+import threading
+
+import database
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+COMPRESSION_LEVEL = 6
+# Evictions free space down to this share of max_bytes, so the next puts do not walk again at once
+EVICT_LOW_WATER = 0.9
+# Holds the running total of entry bytes, shared by every process using the directory
+SIZE_DB = 'size.db'
+
+def _create_size_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_size (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total INTEGER NOT NULL
+        )
+    ''')
+
+class ExtractionCache:
+    """On-disk, content-addressed cache of extracted text.
+
+    Entries are zlib-compressed files named by a digest of the cache key. Reads
+    touch the file's mtime, so evicting the oldest mtimes first gives LRU order
+    that holds across processes sharing the directory. The total size is kept in a
+    small SQLite file next to the entries, so only an eviction walks the directory.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None
+        self._size_db = os.path.join(cache_dir, SIZE_DB)
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.z')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                text = zlib.decompress(f.read()).decode('utf-8')
+            os.utime(path)
+        except (OSError, zlib.error, UnicodeDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key, text):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        # Write then rename so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        total = self._add_size(len(data) - replaced)
+        # Only a directory without a recorded size yet is walked to find it
+        if total is None or total > self.max_bytes:
+            self.evict()
+
+    def _add_size(self, delta):
+        """Adds delta to the shared total and returns it; None if no total was recorded yet."""
+        with database.transaction(self._size_db, immediate=True) as cursor:
+            _create_size_table(cursor)
+            row = cursor.execute('SELECT total FROM cache_size WHERE id = 1').fetchone()
+            if row is None:
+                return None
+            total = row[0] + delta
+            cursor.execute('UPDATE cache_size SET total = ? WHERE id = 1', (total,))
+        with self._lock:
+            self._size = total
+        return total
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.z'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Deletes least recently used entries until the cache is back under its low-water mark."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_LOW_WATER if total > self.max_bytes else self.max_bytes
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with database.transaction(self._size_db) as cursor:
+            _create_size_table(cursor)
+            cursor.execute('INSERT OR REPLACE INTO cache_size (id, total) VALUES (1, ?)', (total,))
+        with self._lock:
+            self._size = total
+            self.evictions += evicted
+
+    def _recorded_size(self):
+        """The shared total, which includes puts made by other processes."""
+        if not os.path.exists(self._size_db):
+            return None
+        with database.transaction(self._size_db) as cursor:
+            _create_size_table(cursor)
+            row = cursor.execute('SELECT total FROM cache_size WHERE id = 1').fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        size = self._recorded_size()
+        with self._lock:
+            if size is not None:
+                self._size = size
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'size_bytes': self._size
+            }
@@ -0,0 +1,157 @@
+"""Text extractors registered per file type.
+
+Parsing libraries are imported inside each extractor, and plugins registered as
+'module:function' paths are imported on first use, so importing this module
+stays cheap for processes that never extract a file.
+"""
+import os
+import importlib
+
+import ocr
+
+# Bump when extractor output changes so cached extractions are not reused
+EXTRACTOR_VERSION = 2
+
+# PDF pages without a text layer are OCRed from their embedded images
+OCR_PDF_FALLBACK = os.getenv('OCR_PDF_FALLBACK', '1') not in ('0', 'false', 'False', 'no', 'NO')
+
+# Extraction stops once this many characters have been produced
+MAX_EXTRACTED_CHARS = int(os.getenv('MAX_EXTRACTED_CHARS', str(5 * 1024 * 1024)))
+TEXT_READ_SIZE = 64 * 1024
+
+IMAGE_TYPES = ('png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff')
+# Types whose extracted text can depend on the Tesseract version
+OCR_TYPES = ('pdf',) + IMAGE_TYPES
+
+def iter_txt(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        pending = ''
+        for block in iter(lambda: f.read(TEXT_READ_SIZE), ''):
+            block = pending + block
+            # Cut at the last whitespace so no word is split across chunks
+            cut = max(block.rfind(' '), block.rfind('\n'))
+            if cut < 0:
+                pending = block
+                continue
+            yield block[:cut + 1]
+            pending = block[cut + 1:]
+        if pending:
+            yield pending
+
+def _pdf_pages(reader):
+    fallback = OCR_PDF_FALLBACK and get_tesseract_version() != 'unavailable'
+    for number, page in enumerate(reader.pages, 1):
+        text = page.extract_text() or ''
+        if text.strip() or not fallback:
+            yield text + '\n'
+            continue
+        # No text layer: a scanned page, so OCR the images embedded in it
+        try:
+            frames = ocr.pdf_page_images(page)
+        except Exception as e:
+            print(f"Could not decode images on PDF page {number}: {e}")
+            frames = []
+        yield frames if frames else '\n'
+
+def iter_pdf(file_path):
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for text in ocr.recognize_pages(_pdf_pages(reader)):
+            yield text if text.endswith('\n') else text + '\n'
+
+def iter_docx(file_path):
+    from docx import Document
+    doc = Document(file_path)
+    for paragraph in doc.paragraphs:
+        yield paragraph.text + '\n'
+
+def iter_xlsx(file_path):
+    import openpyxl
+    # read_only streams rows from the archive instead of building the whole workbook with styles
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            for row in sheet.iter_rows(values_only=True):
+                yield ' '.join(str(value) for value in row if value) + '\n'
+    finally:
+        workbook.close()
+
+def _image_pages(image):
+    for frame in ocr.image_frames(image):
+        yield [ocr.prepare(frame)]
+
+def iter_image(file_path):
+    """OCRs every frame of the image, so multi-page TIFFs and GIFs are read in full."""
+    from PIL import Image
+    with Image.open(file_path) as image:
+        for text in ocr.recognize_pages(_image_pages(image)):
+            yield text if text.endswith('\n') else text + '\n'
+
+_tesseract_version = None
+
+def get_tesseract_version():
+    global _tesseract_version
+    if _tesseract_version is None:
+        try:
+            import pytesseract
+            _tesseract_version = str(pytesseract.get_tesseract_version())
+        except Exception:
+            _tesseract_version = 'unavailable'
+    return _tesseract_version
+
+# --- Registry ---
+
+# file type -> extractor(file_path) yielding text chunks, or a 'module:function' path imported on first use
+EXTRACTORS = {}
+
+def register(file_types, extractor):
+    """Registers an extractor for one file type or a sequence of them; later registrations win."""
+    if isinstance(file_types, str):
+        file_types = (file_types,)
+    for file_type in file_types:
+        EXTRACTORS[file_type.lower()] = extractor
+
+def get_extractor(file_type):
+    extractor = EXTRACTORS.get(file_type)
+    if extractor is None:
+        raise ValueError('Unsupported file type')
+    if isinstance(extractor, str):
+        module_name, _, name = extractor.partition(':')
+        extractor = getattr(importlib.import_module(module_name), name)
+        EXTRACTORS[file_type] = extractor
+    return extractor
+
+def supported_types():
+    return set(EXTRACTORS)
+
+def iter_text_chunks(file_path, file_type):
+    """Yields extracted text one page, paragraph, row or block at a time."""
+    return get_extractor(file_type)(file_path)
+
+register('txt', iter_txt)
+register('pdf', iter_pdf)
+register(('docx', 'doc'), iter_docx)
+register(('xlsx', 'xls'), iter_xlsx)
+register(IMAGE_TYPES, iter_image)
+
+# EXTRACTOR_PLUGINS="odt=odf_plugin:iter_odt,rtf=rtf_plugin:iter_rtf" adds or overrides types without code changes
+for _entry in os.getenv('EXTRACTOR_PLUGINS', '').split(','):
+    if '=' in _entry:
+        _file_type, _path = _entry.split('=', 1)
+        register(_file_type.strip(), _path.strip())
+
+def bounded(chunks, max_chars=MAX_EXTRACTED_CHARS):
+    """Passes chunks through until max_chars is reached, then stops the underlying parser."""
+    remaining = max_chars
+    try:
+        for chunk in chunks:
+            if len(chunk) >= remaining:
+                yield chunk[:remaining]
+                return
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
@@ -2,7 +2,7 @@ import sqlite3
 import os
 from flask import Flask, render_template, request, url_for, redirect, flash, session, g
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import timedelta
+import database
 
 # --- Configuration ---
 
@@ -19,19 +19,16 @@ DATABASE = os.path.join(BASE_DIR, 'user.db')
 # --- Database Functions ---
 
 def get_db_connection():
-    """Establishes and returns a SQLite database connection."""
+    """Returns this thread's pooled SQLite connection (WAL mode, autocommit)."""
     if not os.path.exists(DATABASE):
         raise FileNotFoundError(f"Database file not found at: {DATABASE}. Connection aborted.")
     if 'db' not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
+        g.db = database.get_connection(DATABASE, row_factory=sqlite3.Row)
     return g.db
 
 def close_db_connection(e=None):
-    """Closes the database connection if it was opened."""
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
+    """Releases the request's connection; the pooled connection stays open for reuse."""
+    g.pop('db', None)
 
 app.teardown_appcontext(close_db_connection)
 
@@ -171,4 +168,5 @@ def logout():
     return redirect(url_for('login'))
 
 if __name__ == '__main__':
+    # Development server; production runs under gunicorn -c gunicorn.conf.py flask_login_app:app
     app.run(debug=True)
@@ -0,0 +1,190 @@
+"""Long-lived pool of LanguageTool checkers with sentence-aligned parallel chunking.
+
+Each local LanguageTool instance runs its own server (a JVM), so instances are
+created once, warmed with a short check, health-checked in the background and
+replaced when they fail. Processes that should not start servers of their own
+(spawned job processes) connect to already running ones through server_urls.
+"""
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import winnowing
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_CHUNK_CHARS = 4000
+DEFAULT_ACQUIRE_TIMEOUT = 120
+WARMUP_TEXT = 'This is a short sentence to warm up the checker.'
+MAX_REPLACEMENTS = 3
+
+def sentence_chunks(text, max_chars=DEFAULT_CHUNK_CHARS):
+    """Returns [(offset, chunk)] covering text, cut only between sentences.
+
+    Chunks grow sentence by sentence up to max_chars; a single longer sentence
+    becomes a chunk of its own. Offsets index into the original text.
+    """
+    chunks = []
+    chunk_start = chunk_end = None
+    for start, end in winnowing.sentence_spans(text):
+        if chunk_start is None:
+            chunk_start, chunk_end = start, end
+        elif end - chunk_start > max_chars:
+            chunks.append((chunk_start, text[chunk_start:chunk_end]))
+            chunk_start, chunk_end = start, end
+        else:
+            chunk_end = end
+    if chunk_start is not None:
+        chunks.append((chunk_start, text[chunk_start:chunk_end]))
+    return chunks
+
+def match_to_issue(match, offset=0):
+    return {
+        'message': match.message,
+        'context': match.context,
+        'offset': match.offset + offset,
+        'length': match.length,
+        'rule_id': match.ruleId,
+        'replacements': match.replacements[:MAX_REPLACEMENTS] if match.replacements else []
+    }
+
+def _server_url(tool):
+    """Base URL of a tool's LanguageTool server, in the form remote_server= expects."""
+    url = getattr(tool, '_url', None)
+    if not url:
+        return None
+    return url[:-len('v2/')] if url.endswith('v2/') else url
+
+class LanguageToolPool:
+    def __init__(self, language='en-US', size=DEFAULT_POOL_SIZE, server_urls=None,
+                 chunk_chars=DEFAULT_CHUNK_CHARS, acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT, factory=None):
+        self.language = language
+        self.server_urls = [url for url in (server_urls or []) if url]
+        self.size = max(size, len(self.server_urls), 1)
+        self.chunk_chars = chunk_chars
+        self.acquire_timeout = acquire_timeout
+        self.factory = factory or self._language_tool
+        self.restarts = 0
+        self._idle = queue.Queue()
+        self._tools = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self._stop = threading.Event()
+        self._health_thread = None
+        self._executor = None
+
+    def _language_tool(self, url):
+        import language_tool_python
+        if url:
+            return language_tool_python.LanguageTool(self.language, remote_server=url)
+        return language_tool_python.LanguageTool(self.language)
+
+    def _create(self, slot):
+        url = self.server_urls[slot % len(self.server_urls)] if self.server_urls else None
+        tool = self.factory(url)
+        # The first check loads rule data; do it now rather than in a user's request
+        tool.check(WARMUP_TEXT)
+        self._tools[slot] = tool
+        return slot, tool
+
+    def start(self):
+        """Creates and warms every instance; safe to call repeatedly."""
+        with self._lock:
+            if self._started:
+                return
+            for slot in range(self.size):
+                self._idle.put(self._create(slot))
+            self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='grammar')
+            self._started = True
+
+    def _replace(self, slot, tool):
+        try:
+            tool.close()
+        except Exception:
+            pass
+        self.restarts += 1
+        return self._create(slot)
+
+    @contextmanager
+    def acquire(self):
+        """Checks out an instance; one that raises while in use is restarted before it is returned."""
+        self.start()
+        slot, tool = self._idle.get(timeout=self.acquire_timeout)
+        healthy = True
+        try:
+            yield tool
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            if not healthy:
+                try:
+                    slot, tool = self._replace(slot, tool)
+                except Exception as e:
+                    # Keep the slot; the next health check retries the restart
+                    print(f"LanguageTool restart failed: {e}")
+            self._idle.put((slot, tool))
+
+    def health_check(self):
+        """Runs a tiny check on every idle instance and restarts the ones that fail; returns the restart count."""
+        restarted = 0
+        for _ in range(self._idle.qsize()):
+            try:
+                slot, tool = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                tool.check(WARMUP_TEXT)
+            except Exception:
+                try:
+                    slot, tool = self._replace(slot, tool)
+                    restarted += 1
+                except Exception as e:
+                    print(f"LanguageTool restart failed: {e}")
+            self._idle.put((slot, tool))
+        return restarted
+
+    def start_health_checks(self, interval):
+        if self._health_thread is not None or interval <= 0:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                self.health_check()
+
+        self._health_thread = threading.Thread(target=loop, name='grammar-health', daemon=True)
+        self._health_thread.start()
+
+    def served_urls(self):
+        """URLs of the servers behind this pool, for handing to other processes."""
+        return [url for url in (_server_url(tool) for tool in self._tools.values()) if url]
+
+    def _check_chunk(self, offset, chunk):
+        with self.acquire() as tool:
+            matches = tool.check(chunk)
+        return [match_to_issue(match, offset) for match in matches]
+
+    def check(self, text):
+        """Checks text in sentence-aligned chunks across the pool; issue offsets refer to text."""
+        self.start()
+        chunks = sentence_chunks(text, self.chunk_chars)
+        if len(chunks) <= 1:
+            return [issue for offset, chunk in chunks for issue in self._check_chunk(offset, chunk)]
+        issues = []
+        for chunk_issues in self._executor.map(lambda item: self._check_chunk(*item), chunks):
+            issues.extend(chunk_issues)
+        return issues
+
+    def close(self):
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        with self._lock:
+            for tool in self._tools.values():
+                try:
+                    tool.close()
+                except Exception:
+                    pass
+            self._tools = {}
+            self._idle = queue.Queue()
+            self._started = False
@@ -0,0 +1,72 @@
+"""Production server configuration: a pre-fork gunicorn master with recycled workers.
+
+    gunicorn -c gunicorn.conf.py                      # the plagiarism detector (app:create_app())
+    gunicorn -c gunicorn.conf.py flask_login_app:app  # the login app
+
+The app is imported once in the master (preload_app), which runs the migrations,
+brings the on-disk TF-IDF snapshot that job processes map up to date and forks the
+workers. Signals to the master:
+
+    HUP   graceful reload: re-read this file, refresh the index snapshot, start new
+          workers and let the old ones finish their requests
+    TERM  graceful shutdown, waiting up to graceful_timeout for running requests
+    USR2  start a new master from new code next to the old one (send the old one TERM
+          once the new one is serving)
+"""
+import os
+import sys
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+wsgi_app = 'app:create_app()'
+preload_app = True
+
+workers = int(os.getenv('WEB_WORKERS', str(os.cpu_count() or 1)))
+# Threaded workers, so a long upload analysis or report stream does not hold a whole process
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '4'))
+
+# Workers are recycled after a jittered number of requests, so memory a worker has
+# copied or leaked is returned and workers do not all restart at once
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', str(max(1, max_requests // 10))))
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '60'))
+keepalive = 5
+
+accesslog = os.getenv('WEB_ACCESS_LOG', '-')
+
+def _preloaded_app():
+    """The detector module when it is the preloaded app; None when serving the login app."""
+    return sys.modules.get('app')
+
+def when_ready(server):
+    app = _preloaded_app()
+    if app is None:
+        return
+    # Starts LanguageTool servers here once; workers connect to them through GRAMMAR_SERVER_URLS
+    app.start_grammar_pool()
+    app.warm_shared_state()
+    # Metrics the master records, such as LanguageTool restarts, reach /metrics through the shared store
+    app.metrics_store.start_flusher(app.metrics.REGISTRY, app.METRICS_FLUSH_INTERVAL)
+    server.log.info("Shared state loaded in master %s", os.getpid())
+
+def on_reload(server):
+    app = _preloaded_app()
+    if app is not None:
+        # Jobs started from now on map a snapshot holding every document saved so far
+        app.warm_shared_state()
+
+def post_fork(server, worker):
+    app = _preloaded_app()
+    if app is not None:
+        app.after_fork()
+
+def worker_exit(server, worker):
+    app = _preloaded_app()
+    if app is not None:
+        app.before_exit()
+
+def on_exit(server):
+    app = _preloaded_app()
+    if app is not None:
+        app.before_exit()
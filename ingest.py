@@ -0,0 +1,219 @@
+"""Bulk-load past submissions into the documents corpus.
+
+Usage:
+    python ingest.py PATH [PATH ...] [--workers N] [--batch-size N]
+
+PATH may be a directory tree or a .zip archive. Files are hashed and extracted
+in parallel worker processes, deduplicated by hash and written in batched
+transactions. Every processed file is recorded in ingested_files, so an
+interrupted run picks up where it stopped when started again.
+"""
+import os
+import sys
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import app
+import database
+import minhash_index
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingested_files (
+            source_key TEXT PRIMARY KEY,
+            file_hash TEXT,
+            document_id INTEGER,
+            status TEXT NOT NULL,
+            error TEXT,
+            ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def file_type_of(name):
+    return name.rsplit('.', 1)[1].lower() if app.allowed_file(name) else None
+
+def iter_tasks(source):
+    """Yields (source_key, path, zip_member, file_type) for every supported file under source."""
+    source = os.path.abspath(source)
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                file_type = file_type_of(info.filename)
+                if not info.is_dir() and file_type:
+                    yield f"{source}!{info.filename}", source, info.filename, file_type
+        return
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            file_type = file_type_of(name)
+            if file_type:
+                path = os.path.join(root, name)
+                yield path, path, None, file_type
+
+# --- Worker Side ---
+
+_open_archives = {}
+
+def _materialize(path, member, file_type):
+    """Copies a ZIP member to a temporary file; archives stay open for the worker's lifetime."""
+    archive = _open_archives.get(path)
+    if archive is None:
+        archive = _open_archives[path] = zipfile.ZipFile(path)
+    fd, tmp_path = tempfile.mkstemp(suffix='.' + file_type)
+    with os.fdopen(fd, 'wb') as dst, archive.open(member) as src:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+    return tmp_path
+
+def _hash_file(file_path):
+    hasher, legacy_hasher = app.new_file_hashers()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(app.HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+            legacy_hasher.update(chunk)
+    return hasher.hexdigest(), legacy_hasher.hexdigest()
+
+def process_file(task):
+    source_key, path, member, file_type = task
+    result = {'source_key': source_key, 'file_type': file_type, 'file_size': 0, 'file_hash': None,
+              'filename': os.path.basename(member or path)}
+    tmp_path = None
+    try:
+        if member:
+            tmp_path = _materialize(path, member, file_type)
+        file_path = tmp_path or path
+        result['file_size'] = os.path.getsize(file_path)
+        file_hash, legacy_hash = _hash_file(file_path)
+        result['file_hash'] = file_hash
+        if app.find_document_by_hash(file_hash, legacy_hash) is not None:
+            return dict(result, status='duplicate')
+        content, features = app.extract_document(file_path, file_type, file_hash)
+        if features is None:
+            return dict(result, status='failed', error=content)
+        return dict(result, status='extracted', content=content, features=features,
+                    signature=minhash_index.compute_minhash(features['tokens'], app.LSH_NUM_PERM))
+    except Exception as e:
+        return dict(result, status='failed', error=str(e))
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
+
+# --- Writer Side ---
+
+def write_batch(results, seen_hashes):
+    """Inserts extracted documents and records every file's outcome in one transaction.
+
+    Features, LSH buckets and ingested_files rows go in as batched statements.
+    """
+    counts = {'ingested': 0, 'duplicate': 0, 'failed': 0}
+    new_results = []
+    for r in results:
+        if r['status'] == 'extracted':
+            if r['file_hash'] in seen_hashes:
+                r['status'] = 'duplicate'
+            else:
+                new_results.append(r)
+        if r['file_hash']:
+            seen_hashes.add(r['file_hash'])
+    with database.transaction(app.DATABASE) as cursor:
+        doc_ids = app.insert_documents(cursor, new_results)
+        for r, doc_id in zip(new_results, doc_ids):
+            r['document_id'] = doc_id
+            r['status'] = 'ingested' if doc_id is not None else 'duplicate'
+        for r in results:
+            counts[r['status']] += 1
+        database.executemany_batched(cursor, '''
+            INSERT OR REPLACE INTO ingested_files (source_key, file_hash, document_id, status, error)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ((r['source_key'], r['file_hash'], r.get('document_id'), r['status'], r.get('error'))
+              for r in results))
+    return counts
+
+def ingest(sources, workers=None, batch_size=200, out=sys.stdout):
+    app.init_db()
+    with database.transaction(app.DATABASE) as cursor:
+        create_tables(cursor)
+        # Failed files are retried on the next run; everything else is done
+        cursor.execute("SELECT source_key FROM ingested_files WHERE status != 'failed'")
+        done = {row[0] for row in cursor.fetchall()}
+    workers = workers or os.cpu_count() or 1
+    totals = {'ingested': 0, 'duplicate': 0, 'failed': 0, 'skipped': 0}
+    total_bytes = 0
+    seen_hashes = set()
+    pending_results = []
+    started = time.time()
+
+    def tasks():
+        for source in sources:
+            for task in iter_tasks(source):
+                if task[0] in done:
+                    totals['skipped'] += 1
+                    continue
+                yield task
+
+    def flush():
+        for key, count in write_batch(pending_results, seen_hashes).items():
+            totals[key] += count
+        pending_results.clear()
+        processed = totals['ingested'] + totals['duplicate'] + totals['failed']
+        print(f"  {processed} files processed ({totals['ingested']} new, {totals['duplicate']} duplicate, "
+              f"{totals['failed']} failed)", file=out)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        task_iter = tasks()
+        exhausted = False
+        while in_flight or not exhausted:
+            # Bound the number of outstanding files so extracted text does not pile up in memory
+            while not exhausted and len(in_flight) < workers * 4:
+                task = next(task_iter, None)
+                if task is None:
+                    exhausted = True
+                    break
+                in_flight.add(pool.submit(process_file, task))
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                total_bytes += result['file_size']
+                pending_results.append(result)
+            if len(pending_results) >= batch_size:
+                flush()
+    if pending_results:
+        flush()
+
+    elapsed = max(time.time() - started, 1e-9)
+    processed = totals['ingested'] + totals['duplicate'] + totals['failed']
+    totals.update({
+        'processed': processed,
+        'bytes': total_bytes,
+        'seconds': round(elapsed, 2),
+        'files_per_second': round(processed / elapsed, 2),
+        'mb_per_second': round(total_bytes / elapsed / (1024 * 1024), 2)
+    })
+    print(f"Ingested {totals['ingested']} new documents from {processed} files "
+          f"({totals['duplicate']} duplicates, {totals['failed']} failed, {totals['skipped']} already done) "
+          f"in {totals['seconds']}s: {totals['files_per_second']} files/s, {totals['mb_per_second']} MB/s",
+          file=out)
+    return totals
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-ingest a directory tree or ZIP archive into the corpus.')
+    parser.add_argument('paths', nargs='+', help='Directories or .zip archives of past submissions')
+    parser.add_argument('--workers', type=int, default=None, help='Extraction processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=200, help='Documents per write transaction')
+    args = parser.parse_args(argv)
+    for path in args.paths:
+        if not os.path.exists(path):
+            parser.error(f"{path} does not exist")
+    totals = ingest(args.paths, workers=args.workers, batch_size=args.batch_size)
+    return 1 if totals['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
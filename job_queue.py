@@ -0,0 +1,352 @@
+import os
+import json
+import time
+import uuid
+import signal
+import sqlite3
+import threading
+import traceback
+import multiprocessing
+
+import database
+import metrics
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+TERMINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+DEFAULT_TIMEOUT = 600
+DEFAULT_MAX_ATTEMPTS = 3
+POLL_INTERVAL = 0.5
+# Running jobs whose worker has not checked in for this long are assumed lost and re-queued
+STALE_AFTER = 60
+RETRY_BACKOFF = 5
+
+EXIT_OK, EXIT_RETRY, EXIT_FATAL, EXIT_CANCELLED = 0, 1, 2, 3
+
+JOBS_FINISHED = metrics.REGISTRY.counter('jobs_finished_total', 'Background jobs finished, by type and outcome.')
+JOB_SECONDS = metrics.REGISTRY.histogram('job_duration_seconds', 'Wall-clock time of a job attempt, by type.')
+
+# Set in a job process to the id of the job it runs
+_current_job_id = None
+
+def current_job_id():
+    """Id of the job this process runs, or None outside a job process."""
+    return _current_job_id
+
+class JobError(Exception):
+    """Raised by a handler for failures that retrying will not fix."""
+
+class JobCancelled(Exception):
+    pass
+
+def _transaction(db_path, immediate=False):
+    return database.transaction(db_path, row_factory=sqlite3.Row, immediate=immediate)
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            job_type TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL,
+            stage TEXT,
+            progress REAL DEFAULT 0,
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            timeout INTEGER NOT NULL,
+            cancel_requested INTEGER DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            run_after REAL DEFAULT 0,
+            heartbeat_at REAL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            finished_at REAL,
+            metrics TEXT
+        )
+    ''')
+    cursor.execute('PRAGMA table_info(jobs)')
+    if 'metrics' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute('ALTER TABLE jobs ADD COLUMN metrics TEXT')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, run_after, created_at)')
+    # Events a job publishes while it runs (e.g. partial results), read by /jobs/<id>/events
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            event TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, id)')
+
+class JobContext:
+    """Handed to a job handler inside its process for progress reporting and cancellation checks."""
+
+    def __init__(self, db_path, job_id, attempt, max_attempts):
+        self.db_path = db_path
+        self.job_id = job_id
+        self.attempt = attempt
+        self.max_attempts = max_attempts
+
+    @property
+    def is_last_attempt(self):
+        return self.attempt >= self.max_attempts
+
+    def set_progress(self, stage, progress=0.0):
+        with _transaction(self.db_path) as cursor:
+            cursor.execute('UPDATE jobs SET stage = ?, progress = ?, updated_at = ? WHERE id = ?',
+                           (stage, progress, time.time(), self.job_id))
+        self.check_cancelled()
+
+    def publish(self, event, data):
+        """Records an event for subscribers of the job's event stream."""
+        with _transaction(self.db_path) as cursor:
+            cursor.execute('INSERT INTO job_events (job_id, event, data, created_at) VALUES (?, ?, ?, ?)',
+                           (self.job_id, event, json.dumps(data), time.time()))
+
+    def check_cancelled(self):
+        with _transaction(self.db_path) as cursor:
+            row = cursor.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (self.job_id,)).fetchone()
+        if row and row['cancel_requested']:
+            raise JobCancelled()
+
+def _run_job(db_path, handler, job_id, payload, attempt, max_attempts):
+    """Entry point of the job process; records the result or error and exits with a status code."""
+    global _current_job_id
+    _current_job_id = job_id
+    # Processes the job starts join its group, so the supervisor can stop them with it
+    os.setpgrp()
+    context = JobContext(db_path, job_id, attempt, max_attempts)
+    try:
+        result = handler(payload, context)
+    except JobCancelled:
+        os._exit(EXIT_CANCELLED)
+    except Exception as e:
+        # Metrics recorded in this process are handed to the supervising process through the row
+        with _transaction(db_path) as cursor:
+            cursor.execute('UPDATE jobs SET error = ?, metrics = ?, updated_at = ? WHERE id = ?',
+                           (f"{e}\n{traceback.format_exc()}", json.dumps(metrics.REGISTRY.drain()),
+                            time.time(), job_id))
+        os._exit(EXIT_FATAL if isinstance(e, JobError) else EXIT_RETRY)
+    now = time.time()
+    with _transaction(db_path) as cursor:
+        cursor.execute('''
+            UPDATE jobs SET state = ?, stage = 'done', progress = 1, result = ?, error = NULL, metrics = ?,
+                updated_at = ?, finished_at = ?
+            WHERE id = ?
+        ''', (SUCCEEDED, json.dumps(result), json.dumps(metrics.REGISTRY.drain()), now, now, job_id))
+    os._exit(EXIT_OK)
+
+def _kill_process_group(pgid):
+    """Stops processes a finished job left behind, such as comparison pool workers."""
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+class JobQueue:
+    """Durable job queue stored in SQLite.
+
+    Each job runs in its own spawned process so per-job timeouts and cancellation
+    can terminate it; worker threads in the hosting process only supervise. A job
+    process leads its own process group, and whatever it started is killed when it ends.
+    With max_running set, no more than that many jobs run at once, counted in the
+    database so the limit holds across processes.
+    """
+
+    def __init__(self, db_path, handlers=None, max_running=None):
+        self.db_path = db_path
+        self.handlers = dict(handlers or {})
+        # Caps job processes across every queue sharing the database, e.g. one per web worker
+        self.max_running = max_running
+        self._threads = []
+        self._stop = threading.Event()
+        self._context = multiprocessing.get_context('spawn')
+        with _transaction(db_path) as cursor:
+            create_tables(cursor)
+
+    def register(self, job_type, handler):
+        self.handlers[job_type] = handler
+
+    def enqueue(self, job_type, payload, max_attempts=DEFAULT_MAX_ATTEMPTS, timeout=DEFAULT_TIMEOUT):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with _transaction(self.db_path) as cursor:
+            cursor.execute('''
+                INSERT INTO jobs (id, job_type, payload, state, stage, max_attempts, timeout,
+                                  created_at, updated_at)
+                VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)
+            ''', (job_id, job_type, json.dumps(payload), QUEUED, max_attempts, timeout, now, now))
+        return job_id
+
+    def get(self, job_id):
+        with _transaction(self.db_path) as cursor:
+            row = cursor.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if not row:
+            return None
+        return {
+            'id': row['id'],
+            'type': row['job_type'],
+            'state': row['state'],
+            'stage': row['stage'],
+            'progress': row['progress'],
+            'attempts': row['attempts'],
+            'max_attempts': row['max_attempts'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'].split('\n', 1)[0] if row['error'] else None,
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'finished_at': row['finished_at']
+        }
+
+    def events(self, job_id, after=0):
+        """Returns [(event_id, event, data)] published by the job's current attempt after event_id `after`."""
+        with _transaction(self.db_path) as cursor:
+            rows = cursor.execute('SELECT id, event, data FROM job_events WHERE job_id = ? AND id > ? ORDER BY id',
+                                  (job_id, after)).fetchall()
+        return [(row['id'], row['event'], json.loads(row['data'])) for row in rows]
+
+    def cancel(self, job_id):
+        """Cancels a queued job at once; running jobs are terminated by their supervising worker."""
+        now = time.time()
+        with _transaction(self.db_path) as cursor:
+            cursor.execute('''
+                UPDATE jobs SET state = ?, finished_at = ?, updated_at = ?
+                WHERE id = ? AND state = ?
+            ''', (CANCELLED, now, now, job_id, QUEUED))
+            cursor.execute('UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND state = ?',
+                           (now, job_id, RUNNING))
+        return self.get(job_id)
+
+    def recover(self):
+        """Re-queues running jobs whose worker stopped sending heartbeats."""
+        with _transaction(self.db_path) as cursor:
+            cursor.execute('UPDATE jobs SET state = ?, updated_at = ? WHERE state = ? AND heartbeat_at < ?',
+                           (QUEUED, time.time(), RUNNING, time.time() - STALE_AFTER))
+
+    def claim(self):
+        with _transaction(self.db_path, immediate=True) as cursor:
+            if self.max_running is not None:
+                # Jobs whose worker stopped sending heartbeats are left for recover()
+                running = cursor.execute('SELECT COUNT(*) FROM jobs WHERE state = ? AND heartbeat_at >= ?',
+                                         (RUNNING, time.time() - STALE_AFTER)).fetchone()[0]
+                if running >= self.max_running:
+                    return None
+            row = cursor.execute('''
+                SELECT * FROM jobs WHERE state = ? AND run_after <= ?
+                ORDER BY created_at LIMIT 1
+            ''', (QUEUED, time.time())).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            cursor.execute('''
+                UPDATE jobs SET state = ?, attempts = attempts + 1, heartbeat_at = ?, updated_at = ?
+                WHERE id = ?
+            ''', (RUNNING, now, now, row['id']))
+            # A retried attempt publishes its events afresh
+            cursor.execute('DELETE FROM job_events WHERE job_id = ?', (row['id'],))
+            return dict(row, attempts=row['attempts'] + 1)
+
+    def _finish(self, job_id, state, error=None, retry=False, attempts=0):
+        now = time.time()
+        with _transaction(self.db_path) as cursor:
+            if retry:
+                cursor.execute('''
+                    UPDATE jobs SET state = ?, stage = 'retrying', run_after = ?, updated_at = ?,
+                        error = COALESCE(?, error)
+                    WHERE id = ?
+                ''', (QUEUED, now + RETRY_BACKOFF * attempts, now, error, job_id))
+            else:
+                cursor.execute('''
+                    UPDATE jobs SET state = ?, updated_at = ?, finished_at = ?, error = COALESCE(?, error)
+                    WHERE id = ?
+                ''', (state, now, now, error, job_id))
+
+    def _heartbeat(self, job_id):
+        with _transaction(self.db_path) as cursor:
+            cursor.execute('UPDATE jobs SET heartbeat_at = ? WHERE id = ?', (time.time(), job_id))
+            row = cursor.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            return bool(row and row['cancel_requested'])
+
+    def run_one(self, job):
+        handler = self.handlers.get(job['job_type'])
+        if handler is None:
+            self._finish(job['id'], FAILED, error=f"No handler for job type {job['job_type']}")
+            return
+        process = self._context.Process(target=_run_job, args=(
+            self.db_path, handler, job['id'], json.loads(job['payload']), job['attempts'], job['max_attempts']
+        ))
+        process.start()
+        started = time.time()
+        deadline = started + job['timeout']
+        cancelled = timed_out = False
+        while True:
+            process.join(POLL_INTERVAL)
+            if not process.is_alive():
+                break
+            if self._heartbeat(job['id']):
+                cancelled = True
+            elif time.time() > deadline:
+                timed_out = True
+            if cancelled or timed_out:
+                process.terminate()
+                process.join()
+                break
+        _kill_process_group(process.pid)
+        JOB_SECONDS.observe(time.time() - started, job_type=job['job_type'])
+        self._collect_metrics(job['id'])
+        can_retry = job['attempts'] < job['max_attempts']
+        outcome = {EXIT_OK: SUCCEEDED, EXIT_CANCELLED: CANCELLED}.get(process.exitcode, FAILED)
+        JOBS_FINISHED.inc(job_type=job['job_type'],
+                          outcome=CANCELLED if cancelled else 'timed_out' if timed_out else outcome)
+        if cancelled or process.exitcode == EXIT_CANCELLED:
+            self._finish(job['id'], CANCELLED)
+        elif timed_out:
+            self._finish(job['id'], FAILED, error=f"Timed out after {job['timeout']}s",
+                         retry=can_retry, attempts=job['attempts'])
+        elif process.exitcode == EXIT_FATAL:
+            self._finish(job['id'], FAILED)
+        elif process.exitcode == EXIT_RETRY:
+            # The job process already recorded its traceback
+            self._finish(job['id'], FAILED, retry=can_retry, attempts=job['attempts'])
+        elif process.exitcode != EXIT_OK:
+            self._finish(job['id'], FAILED, error=f"Job process exited with code {process.exitcode}",
+                         retry=can_retry, attempts=job['attempts'])
+
+    def _collect_metrics(self, job_id):
+        with _transaction(self.db_path) as cursor:
+            row = cursor.execute('SELECT metrics FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row and row['metrics']:
+                cursor.execute('UPDATE jobs SET metrics = NULL WHERE id = ?', (job_id,))
+        if row and row['metrics']:
+            metrics.REGISTRY.merge(json.loads(row['metrics']))
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            job = self.claim()
+            if job is None:
+                self._stop.wait(POLL_INTERVAL)
+                continue
+            try:
+                self.run_one(job)
+            except Exception as e:
+                print(f"Job worker error: {e}")
+                self._finish(job['id'], FAILED, error=str(e))
+
+    def start(self, num_workers):
+        if self._threads:
+            return
+        self.recover()
+        self._stop.clear()
+        for i in range(num_workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
@@ -0,0 +1,400 @@
+"""Lightweight counters, histograms and stage timers rendered in the Prometheus text format.
+
+Work done in job and comparison pool processes is recorded in that process's registry,
+then handed back to the serving process with drain() and merge(). Serving processes
+(gunicorn workers and the master) flush their registries into a SharedStore, a SQLite
+file that /metrics renders, so every request sees the totals of all processes.
+"""
+import os
+import math
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+import database
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = 'plagiarism_'
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(key):
+    if not key:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in key) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with REGISTRY.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self.values.items()]
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (non-cumulative, +Inf last), sum, count]
+        self.values = {}
+
+    def _entry(self, key):
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        return entry
+
+    def observe(self, value, **labels):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with REGISTRY.lock:
+            entry = self._entry(_label_key(labels))
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        samples = []
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append((self.name + '_bucket', key + (('le', _format_value(bound)),), cumulative))
+            samples.append((self.name + '_sum', key, total))
+            samples.append((self.name + '_count', key, count))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.metrics = {}
+        self.collectors = []
+        self.process_collectors = []
+
+    def _get(self, cls, name, documentation, **kwargs):
+        name = PREFIX + name
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, **kwargs)
+            return metric
+
+    def counter(self, name, documentation):
+        return self._get(Counter, name, documentation)
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, documentation, buckets=buckets)
+
+    def register_collector(self, collector, per_process=False):
+        """collector() returns [(name, documentation, kind, [(labels_dict, value)])], read at render time.
+
+        A per_process collector reports values held by this process only, such as an in-memory
+        cache's hit count; a SharedStore adds them up across processes.
+        """
+        (self.process_collectors if per_process else self.collectors).append(collector)
+
+    def collect(self, per_process=True):
+        collectors = self.collectors + (self.process_collectors if per_process else [])
+        return [family for collector in collectors for family in collector()]
+
+    def render(self, families=None):
+        """Renders the recorded metrics followed by collector families (by default, every collector's)."""
+        if families is None:
+            families = self.collect()
+        lines = []
+        with self.lock:
+            for name in sorted(self.metrics):
+                metric = self.metrics[name]
+                lines.append(f"# HELP {name} {metric.documentation}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+                lines.extend(f"{sample}{_format_labels(key)} {_format_value(value)}"
+                             for sample, key, value in metric.samples())
+        for name, documentation, kind, samples in families:
+            lines.append(f"# HELP {PREFIX}{name} {documentation}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            lines.extend(f"{PREFIX}{name}{_format_labels(_label_key(labels))} {_format_value(value)}"
+                         for labels, value in samples if value is not None)
+        return '\n'.join(lines) + '\n'
+
+    def drain(self):
+        """Returns everything recorded since the last drain as JSON-ready data and resets it."""
+        delta = {}
+        with self.lock:
+            for name, metric in self.metrics.items():
+                if metric.values:
+                    delta[name] = {
+                        'kind': metric.kind,
+                        'documentation': metric.documentation,
+                        'buckets': list(getattr(metric, 'buckets', ())),
+                        'values': [[list(map(list, key)), value] for key, value in metric.values.items()]
+                    }
+                    metric.values = {}
+        return delta
+
+    def merge(self, delta):
+        """Adds a drained delta from another process into this registry."""
+        with self.lock:
+            for name, data in (delta or {}).items():
+                short_name = name[len(PREFIX):] if name.startswith(PREFIX) else name
+                if data['kind'] == 'counter':
+                    metric = self.counter(short_name, data['documentation'])
+                    for key, value in data['values']:
+                        key = tuple(map(tuple, key))
+                        metric.values[key] = metric.values.get(key, 0) + value
+                else:
+                    metric = self.histogram(short_name, data['documentation'], data['buckets'])
+                    for key, (counts, total, count) in data['values']:
+                        entry = metric._entry(tuple(map(tuple, key)))
+                        entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                        entry[1] += total
+                        entry[2] += count
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram('stage_duration_seconds', 'Time spent in each analysis stage.')
+
+def discard_inherited():
+    """Pool initializer: drops values copied from the parent at fork so they are not reported twice."""
+    REGISTRY.drain()
+
+# --- Cross-Process Totals ---
+
+DEFAULT_FLUSH_INTERVAL = 5.0
+# Per-process gauges not refreshed for this long belong to a process that is gone
+GAUGE_STALE_AFTER = 60.0
+
+def _combine(kind, total, value):
+    if kind == 'counter':
+        return total + value
+    counts, value_sum, count = value
+    return [[a + b for a, b in zip(total[0], counts)], total[1] + value_sum, total[2] + count]
+
+class SharedStore:
+    """Totals of every process's registry, kept in a SQLite file so any worker can render them.
+
+    flush() drains a registry and adds its counters and histograms to the stored totals.
+    Per-process collectors are read at the same time: their counters are added as the change
+    since this process last flushed, and their gauges are stored per process id and summed
+    over the processes that flushed within GAUGE_STALE_AFTER seconds.
+    """
+
+    def __init__(self, db_path, gauge_stale_after=GAUGE_STALE_AFTER):
+        self.db_path = db_path
+        self.gauge_stale_after = gauge_stale_after
+        self._lock = threading.Lock()
+        # (name, labels) -> cumulative value of a per-process counter at the last flush
+        self._flushed = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _create_tables(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS metric_totals (
+                name TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                documentation TEXT NOT NULL,
+                buckets TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (name, labels)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS metric_gauges (
+                pid INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                documentation TEXT NOT NULL,
+                value REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (pid, name, labels)
+            )
+        ''')
+
+    def _add(self, cursor, name, kind, documentation, buckets, labels, value):
+        row = cursor.execute('SELECT value FROM metric_totals WHERE name = ? AND labels = ?',
+                             (name, labels)).fetchone()
+        if row:
+            value = _combine(kind, json.loads(row[0]), value)
+        cursor.execute('''
+            INSERT OR REPLACE INTO metric_totals (name, labels, kind, documentation, buckets, value)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (name, labels, kind, documentation, json.dumps(buckets), json.dumps(value)))
+
+    def _process_samples(self, registry):
+        """Splits per-process collector samples into counter increments and gauge values."""
+        increments, gauges, flushed = [], [], {}
+        families = [family for collector in registry.process_collectors for family in collector()]
+        for name, documentation, kind, samples in families:
+            for labels, value in samples:
+                if value is None:
+                    continue
+                labels = json.dumps(list(map(list, _label_key(labels))))
+                if kind == 'counter':
+                    last = self._flushed.get((name, labels), 0)
+                    # A smaller value means the source was reset; all of it is new
+                    increment = value - last if value >= last else value
+                    flushed[(name, labels)] = value
+                    if increment:
+                        increments.append((PREFIX + name, documentation, labels, increment))
+                else:
+                    gauges.append((name, labels, documentation, value))
+        return increments, gauges, flushed
+
+    def flush(self, registry):
+        """Moves everything the registry recorded since its last flush into the store."""
+        with self._lock:
+            delta = registry.drain()
+            increments, gauges, flushed = self._process_samples(registry)
+            try:
+                with database.transaction(self.db_path, immediate=True) as cursor:
+                    self._create_tables(cursor)
+                    for name, data in delta.items():
+                        for key, value in data['values']:
+                            self._add(cursor, name, data['kind'], data['documentation'], data['buckets'],
+                                      json.dumps(key), value)
+                    for name, documentation, labels, increment in increments:
+                        self._add(cursor, name, 'counter', documentation, [], labels, increment)
+                    pid, now = os.getpid(), time.time()
+                    cursor.execute('DELETE FROM metric_gauges WHERE pid = ?', (pid,))
+                    database.executemany_batched(cursor, '''
+                        INSERT INTO metric_gauges (pid, name, labels, documentation, value, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', [(pid, name, labels, documentation, value, now)
+                         for name, labels, documentation, value in gauges])
+            except BaseException:
+                # Keep the values for the next flush rather than losing them
+                registry.merge(delta)
+                raise
+            self._flushed.update(flushed)
+
+    def render(self, registry):
+        """Flushes this process, then renders the totals of all processes and the shared collectors."""
+        self.flush(registry)
+        with database.cursor(self.db_path) as cursor:
+            cursor.execute('SELECT name, labels, kind, documentation, buckets, value FROM metric_totals')
+            totals = cursor.fetchall()
+            cursor.execute('''
+                SELECT name, labels, documentation, SUM(value) FROM metric_gauges
+                WHERE updated_at >= ? GROUP BY name, labels ORDER BY name
+            ''', (time.time() - self.gauge_stale_after,))
+            gauge_rows = cursor.fetchall()
+        delta = {}
+        for name, labels, kind, documentation, buckets, value in totals:
+            entry = delta.setdefault(name, {'kind': kind, 'documentation': documentation,
+                                            'buckets': json.loads(buckets), 'values': []})
+            entry['values'].append([json.loads(labels), json.loads(value)])
+        combined = Registry()
+        combined.merge(delta)
+        gauges = {}
+        for name, labels, documentation, value in gauge_rows:
+            family = gauges.setdefault(name, (name, documentation, 'gauge', []))
+            family[3].append((dict(json.loads(labels)), value))
+        return combined.render(registry.collect(per_process=False) + list(gauges.values()))
+
+    def close(self, registry):
+        """Final flush of a process that is exiting; its gauges stop counting."""
+        self._stop.set()
+        self.flush(registry)
+        with database.transaction(self.db_path) as cursor:
+            cursor.execute('DELETE FROM metric_gauges WHERE pid = ?', (os.getpid(),))
+
+    def start_flusher(self, registry, interval=DEFAULT_FLUSH_INTERVAL):
+        if self._thread is not None or interval <= 0:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.flush(registry)
+                except Exception as e:
+                    print(f"Metrics flush failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name='metrics-flush', daemon=True)
+        self._thread.start()
+
+    def after_fork(self, registry):
+        """Runs in a forked child: the parent flushes what it had recorded, and its thread did not survive."""
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        registry.drain()
+        # Per-process counters start from the values copied from the parent, which flushes those itself
+        _, _, self._flushed = self._process_samples(registry)
+
+# --- Stage Timings ---
+
+_timings = contextvars.ContextVar('timings', default=None)
+
+@contextmanager
+def collect_timings():
+    """Collects {stage: {'seconds', 'count'}} for every stage timed inside the block."""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        try:
+            _timings.reset(token)
+        except ValueError:
+            # A streamed response may finish the block in a different context
+            _timings.set(None)
+
+def add_timings(timings):
+    """Folds timings gathered elsewhere (e.g. in a pool worker) into the active collection."""
+    active = _timings.get()
+    if active is None:
+        return
+    for stage, entry in timings.items():
+        current = active.setdefault(stage, {'seconds': 0.0, 'count': 0})
+        current['seconds'] += entry['seconds']
+        current['count'] += entry['count']
+
+def observe_stage(stage, seconds, **labels):
+    STAGE_SECONDS.observe(seconds, stage=stage, **labels)
+    active = _timings.get()
+    if active is not None:
+        entry = active.setdefault(stage, {'seconds': 0.0, 'count': 0})
+        entry['seconds'] += seconds
+        entry['count'] += 1
+
+@contextmanager
+def timed(stage, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started, **labels)
+
+def timings_report(timings):
+    """Rounds collected timings for inclusion in a report."""
+    return {
+        'stages': {stage: {'seconds': round(entry['seconds'], 4), 'count': entry['count']}
+                   for stage, entry in sorted(timings.items(), key=lambda item: -item[1]['seconds'])},
+        'note': 'Stage seconds are summed across worker processes and can exceed wall-clock time.'
+    }
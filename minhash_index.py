@@ -0,0 +1,234 @@
+import hashlib
+import random
+from array import array
+
+import database
+
+# MinHash signatures use universal hashing modulo a Mersenne prime
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+DEFAULT_NUM_PERM = 128
+DEFAULT_SEED = 1
+REBUILD_BATCH_SIZE = 500
+
+_permutation_cache = {}
+
+def _permutations(num_perm, seed=DEFAULT_SEED):
+    key = (num_perm, seed)
+    if key not in _permutation_cache:
+        rng = random.Random(seed)
+        _permutation_cache[key] = [
+            (rng.randint(1, MERSENNE_PRIME - 1), rng.randint(0, MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+    return _permutation_cache[key]
+
+def _hash_shingle(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little')
+
+def get_shingles(tokens, shingle_size=1):
+    """Returns the set of word shingles; size 1 is the vocabulary used by cosine scoring."""
+    if shingle_size <= 1:
+        return set(tokens)
+    return {' '.join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)}
+
+def compute_minhash(tokens, num_perm=DEFAULT_NUM_PERM, shingle_size=1):
+    hashes = [_hash_shingle(s) for s in get_shingles(tokens, shingle_size)]
+    if not hashes:
+        return [MAX_HASH] * num_perm
+    signature = []
+    for a, b in _permutations(num_perm):
+        signature.append(min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes))
+    return signature
+
+def estimate_jaccard(signature1, signature2):
+    if not signature1 or len(signature1) != len(signature2):
+        return 0.0
+    return sum(1 for a, b in zip(signature1, signature2) if a == b) / len(signature1)
+
+def signature_to_blob(signature):
+    return array('Q', signature).tobytes()
+
+def signature_from_blob(blob):
+    signature = array('Q')
+    signature.frombytes(blob)
+    return signature.tolist()
+
+# --- LSH Banding ---
+
+def _integrate(f, a, b, steps=100):
+    width = (b - a) / steps
+    area = (f(a) + f(b)) / 2.0
+    for i in range(1, steps):
+        area += f(a + i * width)
+    return area * width
+
+def optimal_lsh_params(threshold, num_perm=DEFAULT_NUM_PERM, recall_weight=0.5):
+    """Picks (bands, rows) for a Jaccard threshold.
+
+    recall_weight is the recall-vs-speed knob: values close to 1 penalize missed
+    matches more (more bands, more candidates), values close to 0 penalize false
+    candidates more (fewer candidates, faster checks).
+    """
+    best, best_error = (1, num_perm), float('inf')
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        if rows < 1:
+            break
+        false_positive = _integrate(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+        false_negative = _integrate(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+        error = false_positive * (1 - recall_weight) + false_negative * recall_weight
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+def band_buckets(signature, bands, rows):
+    buckets = []
+    for band in range(bands):
+        chunk = array('Q', signature[band * rows:(band + 1) * rows]).tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, 'little', signed=True)))
+    return buckets
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_minhash (
+            document_id INTEGER PRIMARY KEY,
+            num_perm INTEGER NOT NULL,
+            signature BLOB NOT NULL,
+            FOREIGN KEY (document_id) REFERENCES documents (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lsh_buckets (
+            num_bands INTEGER NOT NULL,
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            document_id INTEGER NOT NULL,
+            FOREIGN KEY (document_id) REFERENCES documents (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lsh_buckets_lookup
+        ON lsh_buckets (num_bands, band, bucket)
+    ''')
+    # Documents stored without a signature, such as ones saved before the index existed
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lsh_pending (
+            document_id INTEGER PRIMARY KEY,
+            FOREIGN KEY (document_id) REFERENCES documents (id)
+        )
+    ''')
+    # The signature size and banding the stored signatures and buckets were built with
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lsh_params (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            num_perm INTEGER NOT NULL,
+            num_bands INTEGER NOT NULL,
+            num_rows INTEGER NOT NULL
+        )
+    ''')
+
+def index_document(cursor, doc_id, signature, bands, rows):
+    index_documents(cursor, [(doc_id, signature)], bands, rows)
+
+def index_documents(cursor, signed, bands, rows):
+    """Stores [(doc_id, signature)] and their buckets with one batched statement per table."""
+    signed = list(signed)
+    doc_ids = [(doc_id,) for doc_id, _ in signed]
+    cursor.executemany('''
+        INSERT OR REPLACE INTO document_minhash (document_id, num_perm, signature)
+        VALUES (?, ?, ?)
+    ''', [(doc_id, len(signature), signature_to_blob(signature)) for doc_id, signature in signed])
+    cursor.executemany('DELETE FROM lsh_buckets WHERE document_id = ? AND num_bands = ?',
+                       [(doc_id, bands) for doc_id, _ in signed])
+    database.executemany_batched(cursor, '''
+        INSERT INTO lsh_buckets (num_bands, band, bucket, document_id) VALUES (?, ?, ?, ?)
+    ''', ((bands, band, bucket, doc_id) for doc_id, signature in signed
+          for band, bucket in band_buckets(signature, bands, rows)))
+    cursor.executemany('DELETE FROM lsh_pending WHERE document_id = ?', doc_ids)
+
+def rebuild_buckets(cursor, bands, rows, batch_size=REBUILD_BATCH_SIZE):
+    """Re-bands every stored signature, e.g. after the threshold or recall knob changed."""
+    cursor.execute('DELETE FROM lsh_buckets WHERE num_bands = ?', (bands,))
+    last_id = 0
+    while True:
+        cursor.execute('''
+            SELECT document_id, signature FROM document_minhash
+            WHERE document_id > ? ORDER BY document_id LIMIT ?
+        ''', (last_id, batch_size))
+        batch = cursor.fetchall()
+        if not batch:
+            return
+        cursor.executemany('''
+            INSERT INTO lsh_buckets (num_bands, band, bucket, document_id) VALUES (?, ?, ?, ?)
+        ''', [(bands, band, bucket, doc_id) for doc_id, blob in batch
+              for band, bucket in band_buckets(signature_from_blob(blob), bands, rows)])
+        last_id = batch[-1][0]
+
+def sync_params(cursor, num_perm, bands, rows):
+    """Brings the stored index in line with the current parameters; returns True if it changed.
+
+    Signatures of another size are dropped, to be recomputed by the caller, and the
+    buckets are rebuilt from the remaining signatures under the new banding.
+    """
+    cursor.execute('SELECT num_perm, num_bands, num_rows FROM lsh_params WHERE id = 1')
+    stored = cursor.fetchone()
+    if stored is not None and tuple(stored) == (num_perm, bands, rows):
+        return False
+    cursor.execute('DELETE FROM document_minhash WHERE num_perm != ?', (num_perm,))
+    cursor.execute('DELETE FROM lsh_buckets')
+    rebuild_buckets(cursor, bands, rows)
+    cursor.execute('''
+        INSERT OR REPLACE INTO lsh_params (id, num_perm, num_bands, num_rows) VALUES (1, ?, ?, ?)
+    ''', (num_perm, bands, rows))
+    return True
+
+def queue_unindexed(cursor, num_perm):
+    """Adds stored documents without a signature of num_perm to lsh_pending; returns how many.
+
+    Scans the documents table, so it runs at startup rather than on every query.
+    """
+    cursor.execute('''
+        INSERT OR IGNORE INTO lsh_pending (document_id)
+        SELECT d.id FROM documents d
+        LEFT JOIN document_minhash m ON m.document_id = d.id AND m.num_perm = ?
+        WHERE m.document_id IS NULL
+    ''', (num_perm,))
+    return cursor.rowcount
+
+def pending_documents(cursor, exclude_id=None, limit=None):
+    """Ids of documents waiting for a signature, read from lsh_pending rather than the documents table."""
+    cursor.execute('''
+        SELECT document_id FROM lsh_pending WHERE document_id != ? ORDER BY document_id LIMIT ?
+    ''', (-1 if exclude_id is None else exclude_id, -1 if limit is None else limit))
+    return [row[0] for row in cursor.fetchall()]
+
+def drop_pending(cursor, doc_ids):
+    cursor.executemany('DELETE FROM lsh_pending WHERE document_id = ?', [(doc_id,) for doc_id in doc_ids])
+
+def query_candidates(cursor, signature, bands, rows, threshold, exclude_id=None):
+    """Returns [(doc_id, estimated_jaccard)] for documents sharing a band and above the threshold."""
+    candidate_ids = set()
+    for band, bucket in band_buckets(signature, bands, rows):
+        cursor.execute('''
+            SELECT document_id FROM lsh_buckets
+            WHERE num_bands = ? AND band = ? AND bucket = ?
+        ''', (bands, band, bucket))
+        candidate_ids.update(row[0] for row in cursor.fetchall())
+    candidate_ids.discard(exclude_id)
+    candidate_ids = list(candidate_ids)
+    candidates = []
+    # Fetch signatures in batches to stay under SQLite's bound-parameter limit
+    for start in range(0, len(candidate_ids), 500):
+        batch = candidate_ids[start:start + 500]
+        cursor.execute(f'''
+            SELECT document_id, signature FROM document_minhash
+            WHERE document_id IN ({','.join('?' * len(batch))})
+        ''', batch)
+        for doc_id, blob in cursor.fetchall():
+            jaccard = estimate_jaccard(signature, signature_from_blob(blob))
+            if jaccard >= threshold:
+                candidates.append((doc_id, jaccard))
+    candidates.sort(key=lambda item: item[1], reverse=True)
+    return candidates
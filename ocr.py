@@ -0,0 +1,143 @@
+"""Bounded, parallel OCR for image frames and scanned PDF pages.
+
+Every frame of a multi-page image and every PDF page without a text layer becomes one
+OCR task. Each task is converted to grayscale, downsampled to OCR_TARGET_DPI and sent
+to its own Tesseract process with a per-page timeout. At most OCR_WORKERS Tesseract
+processes run at once, and only a small window of pages is decoded ahead of them, so
+memory stays flat on long scans. Results come back in page order.
+"""
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import metrics
+
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', str(min(4, os.cpu_count() or 1))))
+OCR_PAGE_TIMEOUT = float(os.getenv('OCR_PAGE_TIMEOUT', '60'))
+OCR_TARGET_DPI = int(os.getenv('OCR_TARGET_DPI', '300'))
+# Used when an image carries no DPI: about an A4 page at 300 DPI
+OCR_MAX_PIXELS = int(os.getenv('OCR_MAX_PIXELS', str(2480 * 3508)))
+OCR_LANGUAGE = os.getenv('OCR_LANGUAGE', 'eng')
+
+OCR_PAGES = metrics.REGISTRY.counter('ocr_pages_total', 'Pages and frames sent to OCR, by result.')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Threads only wait on Tesseract processes, so the thread count bounds the processes."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Tesseract's own OpenMP threads would oversubscribe the CPUs when pages run in parallel
+            os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+            _executor = ThreadPoolExecutor(max_workers=max(1, OCR_WORKERS), thread_name_prefix='ocr')
+        return _executor
+
+def prepare(image, page_width_inches=None, target_dpi=OCR_TARGET_DPI, max_pixels=OCR_MAX_PIXELS):
+    """Returns (grayscale copy of image, scale factor down to target_dpi).
+
+    The resolution comes from the image's DPI metadata or, for images embedded in a
+    PDF page, from the page width; without either the image is capped at max_pixels.
+    Resizing is left to the pool thread, where it overlaps with other pages' OCR.
+    """
+    dpi = None
+    if page_width_inches:
+        dpi = image.width / page_width_inches
+    elif image.info.get('dpi'):
+        dpi = float(image.info['dpi'][0]) or None
+    if dpi:
+        scale = target_dpi / dpi
+    else:
+        scale = (max_pixels / max(1, image.width * image.height)) ** 0.5
+    frame = image.convert('L') if image.mode not in ('L', '1') else image.copy()
+    return frame, min(scale, 1.0)
+
+def downsample(frame, scale):
+    from PIL import Image
+    if scale >= 1:
+        return frame
+    if frame.mode == '1':
+        frame = frame.convert('L')
+    size = (max(1, round(frame.width * scale)), max(1, round(frame.height * scale)))
+    return frame.resize(size, Image.LANCZOS)
+
+def image_frames(image):
+    """Yields every frame of a multi-page TIFF or animated GIF (one for plain images)."""
+    from PIL import ImageSequence
+    for frame in ImageSequence.Iterator(image):
+        yield frame
+
+def _recognize(frames):
+    """Runs in a pool thread; returns (text, seconds, result)."""
+    import pytesseract
+    started = time.perf_counter()
+    texts = []
+    try:
+        for frame, scale in frames:
+            texts.append(pytesseract.image_to_string(downsample(frame, scale), lang=OCR_LANGUAGE,
+                                                     timeout=OCR_PAGE_TIMEOUT))
+        result = 'ok'
+    except RuntimeError as e:
+        # pytesseract kills the Tesseract process and raises RuntimeError on timeout
+        if 'timeout' not in str(e).lower():
+            raise
+        result = 'timeout'
+    return '\n'.join(texts), time.perf_counter() - started, result
+
+def _done(text):
+    future = Future()
+    future.set_result((text, 0.0, None))
+    return future
+
+def recognize_pages(pages, window=None):
+    """Yields text for each item of pages in order.
+
+    An item is either text that needs no OCR or a list of prepare() results making up
+    one page. pages should be a generator: it is advanced only while fewer than `window`
+    pages are queued, so no more than that are decoded and held at a time. A page that
+    times out yields the text of the frames finished before the timeout.
+    """
+    executor = get_executor()
+    window = window or max(1, OCR_WORKERS) * 2
+    pending = deque()
+
+    def submit(item):
+        if isinstance(item, str):
+            return _done(item)
+        return executor.submit(_recognize, item)
+
+    def collect(future):
+        text, seconds, result = future.result()
+        if result is not None:
+            OCR_PAGES.inc(result=result)
+            metrics.observe_stage('ocr', seconds)
+        return text
+
+    try:
+        for item in pages:
+            pending.append(submit(item))
+            while len(pending) >= window or (pending and pending[0].done()):
+                yield collect(pending.popleft())
+        while pending:
+            yield collect(pending.popleft())
+    finally:
+        for future in pending:
+            future.cancel()
+
+def pdf_page_images(page):
+    """Frames of the images embedded in a PDF page (a scanned page is usually one image)."""
+    from io import BytesIO
+    from PIL import Image
+    width_inches = float(page.mediabox.width) / 72 if page.mediabox else None
+    embedded_images = page.images
+    # With several images on a page, each covers only part of its width
+    if len(embedded_images) != 1:
+        width_inches = None
+    frames = []
+    for embedded in embedded_images:
+        with Image.open(BytesIO(embedded.data)) as image:
+            frames.append(prepare(image, width_inches))
+    return frames
@@ -0,0 +1,267 @@
+import json
+import zlib
+
+# Payload format marker; rows written before compression hold plain JSON text
+FORMAT_V1 = b'R1'
+COMPRESSION_LEVEL = 6
+MIGRATION_BATCH_SIZE = 200
+
+# Preset dictionary of strings that recur in every report, so even small payloads compress well.
+# Never edit in place: add a new format marker with a new dictionary instead.
+_ZDICT_V1 = json.dumps([
+    'Content appears to be original.', 'Continue with good writing practices.',
+    'Always cite sources when using external material.',
+    'Low similarity detected. This is generally acceptable.',
+    'Review highlighted similar sections if needed.', 'Ensure proper citation practices.',
+    'Moderate similarity detected. Review similar sections.', 'Consider paraphrasing similar content.',
+    'Add proper citations where needed.',
+    'This content shows very high similarity. Consider complete rewriting.',
+    'Review and cite sources properly if this is research work.',
+    'Ensure proper attribution for any quoted material.',
+    'Original Content', 'Low Plagiarism Risk', 'Moderate Plagiarism Risk', 'High Plagiarism Risk',
+    'Sentence should start with capital letter', 'Double space detected', 'Possible misspelling',
+    'CAPITALIZATION', 'DOUBLE_SPACE', 'MISSPELLING', 'LOW', 'MEDIUM', 'HIGH', 'CRITICAL',
+    'success', 'info', 'warning', 'danger',
+    'filename', 'doc_id', 'similarity_percentage', 'similarity_score', 'status', 'color',
+    'cosine_similarity', 'sequence_similarity', 'analysis', 'word_count_1', 'word_count_2',
+    'char_count_1', 'char_count_2', 'common_words', 'unique_words_1', 'unique_words_2',
+    'similar_sentences', 'sentence1', 'sentence2', 'similarity', 'span1', 'span2', 'risk_level',
+    'recommendations', 'grammar_issues', 'message', 'context', 'offset', 'length', 'rule_id',
+    'replacements', 'total_issues', 'readability_scores', 'flesch_reading_ease',
+    'flesch_kincaid_grade', 'gunning_fog', 'smog_index', 'automated_readability_index',
+    'text_stats', 'word_count', 'sentence_count', 'syllable_count', 'character_count',
+    'report_name', 'generated_at', 'document_analyzed', 'char_count', 'file_type',
+    'overall_summary', 'total_documents_compared', 'highest_similarity', 'average_similarity',
+    'overall_risk_level', 'high_risk_matches', 'medium_risk_matches', 'low_risk_matches',
+    'overall_writing_score', 'plagiarism_results', 'grammar_analysis', 'similar_sentence',
+    'source_file', 'comprehensive_analysis', 'grammar_score', 'plagiarism_score', 'overall_score'
+]).encode('utf-8')
+
+COMPARISON_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        report_name TEXT NOT NULL,
+        doc1_name TEXT NOT NULL,
+        doc2_name TEXT NOT NULL,
+        similarity_percentage REAL NOT NULL,
+        report_data TEXT NOT NULL,
+        created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Summary columns split out of the payload so listings never decode it
+SUMMARY_COLUMNS = {
+    'single_file_reports': (
+        ('filename', 'TEXT'),
+        ('highest_similarity', 'REAL'),
+        ('risk_level', 'TEXT'),
+        ('documents_compared', 'INTEGER')
+    ),
+    'reports': (
+        ('doc1_id', 'INTEGER'),
+        ('doc2_id', 'INTEGER'),
+        ('risk_level', 'TEXT')
+    ),
+    'batch_reports': (
+        ('highest_similarity', 'REAL'),
+        ('risk_level', 'TEXT'),
+        ('match_count', 'INTEGER')
+    )
+}
+
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_single_file_reports_created ON single_file_reports (created_date, id)',
+    'CREATE INDEX IF NOT EXISTS idx_single_file_reports_document ON single_file_reports (document_id)',
+    'CREATE INDEX IF NOT EXISTS idx_single_file_reports_similarity ON single_file_reports (highest_similarity)',
+    'CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_date, id)',
+    'CREATE INDEX IF NOT EXISTS idx_batch_reports_created ON batch_reports (created_date, id)'
+)
+
+def encode_report(report):
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=_ZDICT_V1)
+    data = json.dumps(report, separators=(',', ':')).encode('utf-8')
+    return FORMAT_V1 + compressor.compress(data) + compressor.flush()
+
+def decode_report(payload):
+    if isinstance(payload, bytes) and payload.startswith(FORMAT_V1):
+        decompressor = zlib.decompressobj(zdict=_ZDICT_V1)
+        data = decompressor.decompress(payload[len(FORMAT_V1):]) + decompressor.flush()
+        return json.loads(data)
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    return json.loads(payload)
+
+def single_file_summary(report):
+    summary = report.get('overall_summary', {})
+    return {
+        'filename': report.get('document_analyzed', {}).get('filename'),
+        'highest_similarity': summary.get('highest_similarity', 0),
+        'risk_level': summary.get('overall_risk_level', 'LOW'),
+        'documents_compared': summary.get('total_documents_compared', 0)
+    }
+
+def batch_summary(report):
+    if 'batch_summary' in report:
+        # Batch reports from before the job queue carry their own summary
+        summary = report['batch_summary']
+        return {
+            'highest_similarity': summary.get('highest_similarity', 0),
+            'risk_level': summary.get('overall_risk_level', 'LOW'),
+            'match_count': len(report.get('comparison_results', []))
+        }
+    if 'clusters' in report:
+        matches = [m for c in report['clusters'] for m in c['members'] if m['doc_id'] != c['representative_id']]
+        count = len(report['clusters'])
+    else:
+        matches = report.get('matches', [])
+        count = len(matches)
+    # Every match carries the risk level its report was generated with
+    top = max(matches, key=lambda m: m['similarity_percentage'], default=None)
+    return {
+        'highest_similarity': top['similarity_percentage'] if top else 0,
+        'risk_level': top['risk_level'] if top else 'LOW',
+        'match_count': count
+    }
+
+def comparison_summary(report):
+    documents = report.get('documents', {})
+    return {
+        'doc1_id': documents.get('document1', {}).get('doc_id'),
+        'doc2_id': documents.get('document2', {}).get('doc_id'),
+        'risk_level': report.get('summary', {}).get('risk_level')
+    }
+
+SUMMARIZERS = {
+    'single_file_reports': single_file_summary,
+    'reports': comparison_summary,
+    'batch_reports': batch_summary
+}
+
+def rebuild_legacy_comparisons(cursor):
+    """Rebuilds a reports table from the first schema, which had document ids and a 0-1 score.
+
+    File names come from the documents table; returns True if the table was rebuilt.
+    """
+    cursor.execute('PRAGMA table_info(reports)')
+    existing = {row[1] for row in cursor.fetchall()}
+    if 'similarity_percentage' in existing or 'similarity_score' not in existing:
+        return False
+    cursor.execute(COMPARISON_TABLE.format(table='reports_rebuilt'))
+    _add_columns(cursor, 'reports_rebuilt', SUMMARY_COLUMNS['reports'])
+    # A summary column added to the old table by an earlier start is carried over
+    risk_level = 'r.risk_level' if 'risk_level' in existing else 'NULL'
+    cursor.execute(f'''
+        INSERT INTO reports_rebuilt (id, report_name, doc1_name, doc2_name, similarity_percentage,
+                                     report_data, created_date, doc1_id, doc2_id, risk_level)
+        SELECT r.id, r.report_name, COALESCE(d1.filename, ''), COALESCE(d2.filename, ''),
+            ROUND(CASE WHEN r.similarity_score <= 1 THEN r.similarity_score * 100 ELSE r.similarity_score END, 2),
+            r.report_data, r.created_date, r.document1_id, r.document2_id, {risk_level}
+        FROM reports r
+        LEFT JOIN documents d1 ON d1.id = r.document1_id
+        LEFT JOIN documents d2 ON d2.id = r.document2_id
+    ''')
+    cursor.execute('DROP TABLE reports')
+    cursor.execute('ALTER TABLE reports_rebuilt RENAME TO reports')
+    return True
+
+def _add_columns(cursor, table, columns):
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, column_type in columns:
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+
+def ensure_schema(cursor):
+    """Adds the summary columns and listing indexes to report tables created before they existed."""
+    rebuild_legacy_comparisons(cursor)
+    for table, columns in SUMMARY_COLUMNS.items():
+        _add_columns(cursor, table, columns)
+    for statement in INDEXES:
+        cursor.execute(statement)
+
+def migrate_payloads(cursor, table):
+    """Compresses legacy JSON payloads and backfills their summary columns; returns rows migrated."""
+    summarize = SUMMARIZERS[table]
+    columns = [name for name, _ in SUMMARY_COLUMNS[table]]
+    migrated, last_id = 0, 0
+    while True:
+        cursor.execute(f'''
+            SELECT id, report_data FROM {table}
+            WHERE id > ? AND typeof(report_data) = 'text' ORDER BY id LIMIT ?
+        ''', (last_id, MIGRATION_BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            return migrated
+        updates = []
+        for report_id, payload in rows:
+            last_id = report_id
+            try:
+                report = decode_report(payload)
+            except ValueError:
+                continue
+            summary = summarize(report)
+            updates.append([encode_report(report)] + [summary[c] for c in columns] + [report_id])
+        # Values the payload does not carry keep what the row already holds
+        assignments = ', '.join(f'{c} = COALESCE(?, {c})' for c in columns)
+        cursor.executemany(f'UPDATE {table} SET report_data = ?, {assignments} WHERE id = ?', updates)
+        migrated += len(updates)
+
+def insert_single_file_report(cursor, doc_id, report):
+    summary = single_file_summary(report)
+    cursor.execute('''
+        INSERT INTO single_file_reports
+            (report_name, document_id, report_data, filename, highest_similarity, risk_level, documents_compared)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (report['report_name'], doc_id, encode_report(report), summary['filename'],
+          summary['highest_similarity'], summary['risk_level'], summary['documents_compared']))
+    return cursor.lastrowid
+
+def insert_batch_report(cursor, report):
+    summary = batch_summary(report)
+    cursor.execute('''
+        INSERT INTO batch_reports (report_name, report_data, highest_similarity, risk_level, match_count)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (report['report_name'], encode_report(report), summary['highest_similarity'],
+          summary['risk_level'], summary['match_count']))
+    return cursor.lastrowid
+
+def parse_cursor(token):
+    """Splits a 'created_date|id' keyset token; returns None for the first page."""
+    if not token or '|' not in token:
+        return None
+    created_date, _, report_id = token.rpartition('|')
+    try:
+        return created_date, int(report_id)
+    except ValueError:
+        return None
+
+def make_cursor(created_date, report_id):
+    return f"{created_date}|{report_id}"
+
+def list_page(cursor, table, columns, before=None, limit=20):
+    """Keyset-paginated listing of summary columns, newest first.
+
+    columns must include id and created_date. Returns (rows, next_token); report_data is never read.
+    """
+    select = ', '.join(columns)
+    position = parse_cursor(before)
+    if position:
+        cursor.execute(f'''
+            SELECT {select} FROM {table}
+            WHERE (created_date, id) < (?, ?)
+            ORDER BY created_date DESC, id DESC LIMIT ?
+        ''', position + (limit + 1,))
+    else:
+        cursor.execute(f'SELECT {select} FROM {table} ORDER BY created_date DESC, id DESC LIMIT ?',
+                       (limit + 1,))
+    rows = cursor.fetchall()
+    next_token = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_token = make_cursor(last[columns.index('created_date')], last[columns.index('id')])
+    return rows[:limit], next_token
+
+def load_report(cursor, table, report_id):
+    cursor.execute(f'SELECT report_data FROM {table} WHERE id = ?', (report_id,))
+    row = cursor.fetchone()
+    return decode_report(row[0]) if row else None
@@ -0,0 +1,150 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import report_store
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+def content_key(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+class ScoreCache:
+    """In-process LRU of pairwise results, bounded by the approximate JSON size of its entries."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text1, text2, version):
+        return content_key(text1), content_key(text2), version
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'size_bytes': self._size
+            }
+
+# --- Persistent Pair Scores ---
+
+# Fields of a comparison result that name a side; reading a pair in reverse swaps them
+_SWAPPED_FIELDS = (('word_count_1', 'word_count_2'), ('char_count_1', 'char_count_2'),
+                   ('unique_words_1', 'unique_words_2'))
+_SWAPPED_MATCH_FIELDS = (('sentence1', 'sentence2'), ('span1', 'span2'))
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_pairs (
+            doc_id_a INTEGER NOT NULL,
+            doc_id_b INTEGER NOT NULL,
+            version TEXT NOT NULL,
+            similarity REAL NOT NULL,
+            result BLOB NOT NULL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (doc_id_a, doc_id_b, version),
+            FOREIGN KEY (doc_id_a) REFERENCES documents (id),
+            FOREIGN KEY (doc_id_b) REFERENCES documents (id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_document_pairs_b ON document_pairs (doc_id_b, version)')
+
+def prune_versions(cursor, version):
+    """Drops scores computed by other algorithm versions; returns the number removed."""
+    cursor.execute('DELETE FROM document_pairs WHERE version != ?', (version,))
+    return cursor.rowcount
+
+def swap_sides(result):
+    """Returns a comparison result as seen from the other document."""
+    result = dict(result)
+    analysis = result['analysis'] = dict(result['analysis'])
+    for first, second in _SWAPPED_FIELDS:
+        analysis[first], analysis[second] = analysis[second], analysis[first]
+    swapped_matches = []
+    for match in analysis['similar_sentences']:
+        match = dict(match)
+        for first, second in _SWAPPED_MATCH_FIELDS:
+            match[first], match[second] = match[second], match[first]
+        swapped_matches.append(match)
+    analysis['similar_sentences'] = swapped_matches
+    return result
+
+def fetch_scores(cursor, doc_id, other_ids, version):
+    """Returns {other_id: result} for the stored pairs of doc_id, oriented with doc_id first."""
+    found = {}
+    other_ids = list(other_ids)
+    for start in range(0, len(other_ids), 500):
+        batch = other_ids[start:start + 500]
+        placeholders = ','.join('?' * len(batch))
+        cursor.execute(f'''
+            SELECT doc_id_a, doc_id_b, result FROM document_pairs
+            WHERE version = ? AND (
+                (doc_id_a = ? AND doc_id_b IN ({placeholders})) OR
+                (doc_id_b = ? AND doc_id_a IN ({placeholders})))
+        ''', [version, doc_id] + batch + [doc_id] + batch)
+        for doc_id_a, doc_id_b, blob in cursor.fetchall():
+            result = report_store.decode_report(blob)
+            if doc_id_a == doc_id:
+                found[doc_id_b] = result
+            else:
+                found[doc_id_a] = swap_sides(result)
+    return found
+
+def store_scores(cursor, doc_id, results, version):
+    """Persists {other_id: result} computed with doc_id as the first document."""
+    rows = []
+    for other_id, result in results.items():
+        if other_id == doc_id:
+            continue
+        if doc_id < other_id:
+            rows.append((doc_id, other_id, version, result['similarity'], report_store.encode_report(result)))
+        else:
+            rows.append((other_id, doc_id, version, result['similarity'],
+                         report_store.encode_report(swap_sides(result))))
+    cursor.executemany('''
+        INSERT OR REPLACE INTO document_pairs (doc_id_a, doc_id_b, version, similarity, result)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    return len(rows)
@@ -0,0 +1,79 @@
+import difflib
+from text_features import compute_text_features
+
+# Below this size (characters, both texts) 'auto' keeps the exact difflib ratio
+DIFFLIB_MAX_CHARS = 5000
+# Shortest run of identical tokens counted as a tile
+MIN_TILE_LENGTH = 3
+# Token n-grams occurring more often than this in one document are skipped as boilerplate
+MAX_GRAM_OCCURRENCES = 50
+
+def difflib_similarity(text1, text2, features1=None, features2=None):
+    return difflib.SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
+
+def _intern_tokens(tokens1, tokens2):
+    ids = {}
+    seq1 = [ids.setdefault(token, len(ids)) for token in tokens1]
+    seq2 = [ids.setdefault(token, len(ids)) for token in tokens2]
+    return seq1, seq2
+
+def greedy_string_tiling(seq1, seq2, min_tile=MIN_TILE_LENGTH):
+    """Returns non-overlapping tiles (start1, start2, length), longest first.
+
+    Maximal matches are seeded from hashed token n-grams and extended along their
+    diagonal, so the work is roughly linear in the input for ordinary prose.
+    """
+    if len(seq1) < min_tile or len(seq2) < min_tile:
+        return []
+    index = {}
+    for j in range(len(seq2) - min_tile + 1):
+        index.setdefault(tuple(seq2[j:j + min_tile]), []).append(j)
+    matches = []
+    for i in range(len(seq1) - min_tile + 1):
+        positions = index.get(tuple(seq1[i:i + min_tile]))
+        if not positions or len(positions) > MAX_GRAM_OCCURRENCES:
+            continue
+        for j in positions:
+            # Only extend from the start of a diagonal run
+            if i > 0 and j > 0 and seq1[i - 1] == seq2[j - 1]:
+                continue
+            length = min_tile
+            while i + length < len(seq1) and j + length < len(seq2) and seq1[i + length] == seq2[j + length]:
+                length += 1
+            matches.append((length, i, j))
+    matches.sort(reverse=True)
+    marked1 = bytearray(len(seq1))
+    marked2 = bytearray(len(seq2))
+    tiles = []
+    for length, i, j in matches:
+        if any(marked1[i:i + length]) or any(marked2[j:j + length]):
+            continue
+        marked1[i:i + length] = b'\x01' * length
+        marked2[j:j + length] = b'\x01' * length
+        tiles.append((i, j, length))
+    return tiles
+
+def tiling_similarity(text1, text2, features1=None, features2=None):
+    """Greedy string tiling coverage on the same 2*M/T scale as SequenceMatcher.ratio()."""
+    tokens1 = (features1 or compute_text_features(text1))['tokens']
+    tokens2 = (features2 or compute_text_features(text2))['tokens']
+    total = len(tokens1) + len(tokens2)
+    if total == 0:
+        return 1.0
+    seq1, seq2 = _intern_tokens(tokens1, tokens2)
+    tiled = sum(length for _, _, length in greedy_string_tiling(seq1, seq2))
+    return 2.0 * tiled / total
+
+SEQUENCE_ENGINES = {
+    'difflib': difflib_similarity,
+    'tiling': tiling_similarity
+}
+
+def register_sequence_engine(name, engine):
+    """Adds an engine taking (text1, text2, features1, features2) and returning a 0-1 score."""
+    SEQUENCE_ENGINES[name] = engine
+
+def sequence_similarity(text1, text2, features1=None, features2=None, engine='auto'):
+    if engine == 'auto':
+        engine = 'difflib' if max(len(text1), len(text2)) <= DIFFLIB_MAX_CHARS else 'tiling'
+    return SEQUENCE_ENGINES[engine](text1, text2, features1, features2)
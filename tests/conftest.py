@@ -0,0 +1,33 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+SHIPPED_DB = os.path.join(REPO_ROOT, 'plagiarism_detector.db')
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test inside tmp_path, where app.py keeps its database, caches and uploads."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def app_module(workdir, monkeypatch):
+    """The app module with its per-process state reset; nothing is shared between tests."""
+    import app
+    for name in ('corpus_index', 'job_queue', 'grammar_tools'):
+        monkeypatch.setattr(app, name, None)
+    yield app
+    if app.job_queue is not None:
+        app.job_queue.stop()
+
+@pytest.fixture
+def shipped_db(workdir):
+    """A copy of the repository's plagiarism_detector.db, with its pre-migration schema and rows."""
+    shutil.copy(SHIPPED_DB, workdir / 'plagiarism_detector.db')
+    return workdir / 'plagiarism_detector.db'
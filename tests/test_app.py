@@ -0,0 +1,325 @@
+import os
+import json
+
+import pytest
+
+import database
+import metrics
+import minhash_index
+from job_queue import JobQueue
+
+def document_ids(app):
+    with database.cursor(app.DATABASE) as cursor:
+        cursor.execute('SELECT id FROM documents ORDER BY id')
+        return [row[0] for row in cursor.fetchall()]
+
+def test_lsh_search_covers_documents_stored_before_the_index(app_module, shipped_db, monkeypatch):
+    app = app_module
+    monkeypatch.setattr(app, 'CANDIDATE_SEARCH', 'lsh')
+    # Tables and the pending list only, as if the signature backfill had not run yet
+    with database.transaction(app.DATABASE) as cursor:
+        app._create_tables(cursor)
+        minhash_index.queue_unindexed(cursor, app.LSH_NUM_PERM)
+    (doc_id, _, content), = app.load_documents([2])
+    features = app.compute_text_features(content)
+    others = [other_id for other_id in document_ids(app) if other_id != doc_id]
+    assert sorted(app.find_candidate_documents(features, exclude_id=doc_id)) == others
+
+    app.init_db()
+    with database.cursor(app.DATABASE) as cursor:
+        assert minhash_index.pending_documents(cursor) == []
+    # Document 3 holds the same text as document 2
+    assert 3 in app.find_candidate_documents(features, exclude_id=doc_id)
+
+def test_changed_lsh_params_rebuild_buckets_on_init(app_module, shipped_db, monkeypatch):
+    app = app_module
+    app.init_db()
+    bands, rows = minhash_index.optimal_lsh_params(0.5, app.LSH_NUM_PERM, 0.5)
+    monkeypatch.setattr(app, 'LSH_BANDS', bands)
+    monkeypatch.setattr(app, 'LSH_ROWS', rows)
+    app.init_db()
+    with database.cursor(app.DATABASE) as cursor:
+        cursor.execute('SELECT num_bands, COUNT(DISTINCT document_id) FROM lsh_buckets GROUP BY num_bands')
+        assert cursor.fetchall() == [(bands, len(document_ids(app)))]
+
+def test_batch_comparison_job_saves_a_report(app_module, shipped_db):
+    import report_store
+    app = app_module
+    app.init_db()
+    context = type('Context', (), {'set_progress': lambda self, stage, progress=0.0: None})()
+    report_id = app.run_comparison_job({'threshold': 0.6}, context)['report_id']
+    with database.cursor(app.DATABASE) as cursor:
+        report = report_store.load_report(cursor, 'batch_reports', report_id)
+    # Documents 2 and 3 hold the same text, extracted from a .docx and a .pdf
+    assert [(match['doc1_id'], match['doc2_id']) for match in report['matches']] == [(2, 3)]
+    assert 'compare_corpus' in app.get_job_queue().handlers
+
+def test_upload_is_analyzed_by_a_job(app_module, shipped_db):
+    import io
+    import time
+    app = app_module
+    # create_app() runs the migrations, so the job process finds every table
+    client = app.create_app({'TESTING': True}).test_client()
+    (_, _, content), = app.load_documents([2])
+    response = client.post('/upload_single_file', content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(content.encode('utf-8')), 'essay.txt')})
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+    deadline = time.time() + 60
+    while True:
+        job = client.get(status_url).get_json()
+        if job['state'] in ('succeeded', 'failed', 'cancelled') or time.time() > deadline:
+            break
+        time.sleep(0.2)
+    assert job['state'] == 'succeeded', job['error']
+    assert job['result']['highest_similarity'] > 90
+    assert client.get(f"/comprehensive_report/{job['result']['report_id']}").status_code == 200
+    stream = client.get(response.get_json()['events_url']).get_data(as_text=True)
+    events = [block.split('\n') for block in stream.strip().split('\n\n')]
+    partials = [json.loads(data[len('data: '):]) for name, data in events if name == 'event: partial']
+    assert partials and partials[-1]['completed'] == partials[-1]['total']
+    assert max(match['similarity_percentage'] for partial in partials for match in partial['matches']) > 90
+    # The final state comes after every partial result
+    assert events[-1][0] == 'event: job' and json.loads(events[-1][1][len('data: '):])['state'] == 'succeeded'
+
+class RecordingQueue:
+    def __init__(self):
+        self.payloads = []
+
+    def enqueue(self, handler, payload, **options):
+        self.payloads.append(payload)
+        return len(self.payloads)
+
+class InlineContext:
+    is_last_attempt = True
+
+    def set_progress(self, stage, progress=0.0):
+        pass
+
+    def publish(self, event, data=None):
+        pass
+
+def test_upload_is_hashed_while_streamed(app_module, workdir, monkeypatch):
+    import io
+    import hashlib
+    from werkzeug.datastructures import FileStorage
+    app = app_module
+    monkeypatch.setattr(app, 'HASH_CHUNK_SIZE', 7)
+    data = os.urandom(100)
+    file_hash, legacy_hash, file_size = app.save_upload(FileStorage(io.BytesIO(data), 'upload.bin'), 'upload.bin')
+    assert (workdir / 'upload.bin').read_bytes() == data
+    assert file_hash == hashlib.blake2b(data, digest_size=32).hexdigest() == app.get_file_hash('upload.bin')
+    assert (legacy_hash, file_size) == (hashlib.md5(data).hexdigest(), 100)
+
+def test_known_upload_skips_extraction(app_module, shipped_db, monkeypatch):
+    import io
+    import hashlib
+    app = app_module
+    queue = RecordingQueue()
+    monkeypatch.setattr(app, 'get_job_queue', lambda: queue)
+    monkeypatch.setattr(app, 'COMPARE_WORKERS', 1)
+    client = app.create_app({'TESTING': True}).test_client()
+    data = b'An essay about rivers, lakes and the water cycle that nobody has submitted before.'
+
+    def upload():
+        response = client.post('/upload_single_file', content_type='multipart/form-data',
+                               data={'file': (io.BytesIO(data), 'essay.txt')})
+        assert response.status_code == 202
+        return response.get_json()['duplicate_of'], queue.payloads[-1]
+
+    duplicate_of, payload = upload()
+    assert duplicate_of is None and os.path.exists(payload['file_path'])
+    doc_id = app.run_analysis_job(payload, InlineContext())['doc_id']
+
+    def fail_extraction(*args, **kwargs):
+        raise AssertionError('a known upload was extracted again')
+
+    monkeypatch.setattr(app, 'extract_document', fail_extraction)
+    assert upload() == (doc_id, {'doc_id': doc_id, 'file_type': 'txt'})
+    assert app.run_analysis_job(queue.payloads[-1], InlineContext())['doc_id'] == doc_id
+    # Documents stored before the switch to BLAKE2b are found by their MD5 hash
+    with database.transaction(app.DATABASE) as cursor:
+        cursor.execute('UPDATE documents SET file_hash = ? WHERE id = ?', (hashlib.md5(data).hexdigest(), doc_id))
+    assert upload()[0] == doc_id
+    assert os.listdir('uploads') == []
+
+def test_parallel_comparison_matches_serial(app_module, shipped_db, monkeypatch):
+    app = app_module
+    app.init_db()
+    monkeypatch.setattr(app, 'CANDIDATE_SEARCH', 'full')
+    monkeypatch.setattr(app, 'COMPARE_CHUNK_SIZE', 1)
+    (doc_id, filename, content), = app.load_documents([2])
+
+    def comparisons():
+        chunks = list(app.iter_corpus_comparisons(None, content, filename=filename))
+        return len(chunks), sorted((r['doc_id'], r['similarity_percentage']) for _, _, rs in chunks for r in rs)
+
+    monkeypatch.setattr(app, 'COMPARE_WORKERS', 1)
+    serial = comparisons()
+    monkeypatch.setattr(app, 'COMPARE_WORKERS', 2)
+    with metrics.collect_timings() as timings:
+        assert comparisons() == serial == (4, serial[1])
+    # Stage timings recorded in the pool workers are folded into the caller's
+    assert timings['cosine']['count'] == 4
+
+LEGACY_COMPARISON = {
+    'report_name': 'Comparison_Document_1_vs_Document_2',
+    'summary': {'overall_similarity': 69.9, 'risk_level': 'HIGH', 'status': 'High Plagiarism Risk'},
+    'documents': {'document1': {'name': 'Document_1.docx', 'word_count': 320, 'char_count': 2380},
+                  'document2': {'name': 'Document_2_Same.pdf', 'word_count': 308, 'char_count': 2223}},
+    'similarity_breakdown': {'cosine_similarity': 80.1, 'sequence_similarity': 59.7},
+    'detailed_analysis': {'common_words': ['intelligence'], 'similar_sentences': []},
+    'recommendations': ['Add proper citations where needed.']
+}
+
+def test_shipped_database_is_migrated(app_module, shipped_db):
+    import json
+    import sqlite3
+    app = app_module
+    # The shipped reports table is empty, so add a row in its schema: document ids and a 0-1 score
+    conn = sqlite3.connect(shipped_db)
+    conn.execute('INSERT INTO reports (report_name, document1_id, document2_id, similarity_score, report_data) '
+                 'VALUES (?, 2, 3, 0.699, ?)', (LEGACY_COMPARISON['report_name'], json.dumps(LEGACY_COMPARISON)))
+    conn.commit()
+    conn.close()
+
+    client = app.create_app({'TESTING': True}).test_client()
+    # A second start finds the table already rebuilt
+    app.init_db()
+    with database.cursor(app.DATABASE) as cursor:
+        cursor.execute('SELECT doc1_name, doc2_name, similarity_percentage, doc1_id, doc2_id, risk_level FROM reports')
+        assert cursor.fetchall() == [('Document_1.docx', 'Document_2_Same.pdf', 69.9, 2, 3, 'HIGH')]
+        # Batch reports from before the job queue are summarized from their own batch_summary
+        cursor.execute('SELECT highest_similarity, risk_level, match_count FROM batch_reports WHERE id = 2')
+        assert cursor.fetchone() == (100.0, 'CRITICAL', 1)
+    response = client.get('/reports')
+    assert response.status_code == 200
+    assert b'Document_2_Same.pdf' in response.data
+    assert client.get('/report/1').status_code == 200
+
+def test_feature_rows_are_stored_compressed(app_module, shipped_db):
+    import sqlite3
+    import text_features
+    app = app_module
+    app.init_db()
+    (_, _, content), = app.load_documents([4])
+    # Rows in the layout written before compression are rewritten on the next start
+    plain = tuple(text_features.decode_column(value)
+                  for value in text_features.features_to_row(app.compute_text_features(content))[1:])
+    conn = sqlite3.connect(shipped_db)
+    conn.execute('UPDATE document_features SET tokens = ?, vocabulary = ?, term_freq = ? WHERE document_id = 4',
+                 plain)
+    conn.commit()
+    conn.close()
+    app.init_db()
+    with database.cursor(app.DATABASE) as cursor:
+        cursor.execute("SELECT COUNT(*) FROM document_features WHERE typeof(tokens) != 'blob' "
+                       "OR typeof(vocabulary) != 'blob' OR typeof(term_freq) != 'blob'")
+        assert cursor.fetchone() == (0,)
+        cursor.execute('SELECT length(tokens) + length(vocabulary) + length(term_freq) FROM document_features '
+                       'WHERE document_id = 4')
+        assert cursor.fetchone()[0] < sum(map(len, plain)) / 2
+    assert app.get_document_features(4) == app.compute_text_features(content)
+
+def test_large_texts_go_to_compressed_blobs(tmp_path):
+    import content_store
+    store = content_store.ContentStore(str(tmp_path), blob_min_bytes=1024)
+    text = "Größe und Maß – " * 50000
+    value = store.encode(text)
+    assert value.startswith(content_store.FORMAT_COMPRESSED_BLOB)
+    (blob,) = [os.path.join(root, name) for root, _, files in os.walk(tmp_path) for name in files]
+    assert os.path.getsize(blob) < len(text) / 10
+    assert store.decode(value) == text
+
+def test_insert_documents_batches_features_and_signatures(app_module, workdir):
+    app = app_module
+    app.init_db()
+    texts = ["first essay about rivers and lakes", "second essay about mountains", "third essay on deserts"]
+    documents = [{'filename': f"essay{i}.txt", 'file_hash': f"hash{i % 2}", 'file_type': 'txt', 'content': text,
+                  'file_size': len(text), 'features': app.compute_text_features(text)}
+                 for i, text in enumerate(texts)]
+    with database.transaction(app.DATABASE) as cursor:
+        doc_ids = app.insert_documents(cursor, documents)
+    # The third document repeats the first one's file hash
+    assert doc_ids[2] is None and None not in doc_ids[:2]
+    with database.cursor(app.DATABASE) as cursor:
+        cursor.execute('SELECT COUNT(*) FROM document_features')
+        assert cursor.fetchone() == (2,)
+        cursor.execute('SELECT COUNT(DISTINCT document_id) FROM lsh_buckets')
+        assert cursor.fetchone() == (2,)
+    assert app.get_document_features(doc_ids[1]) == app.compute_text_features(texts[1])
+
+class FakeMatch:
+    message, context, offset, length, ruleId, replacements = 'Fake issue', 'teh cat', 0, 3, 'FAKE_RULE', []
+
+class FakeTool:
+    def check(self, text):
+        return [FakeMatch()]
+
+    def close(self):
+        pass
+
+def checks_grammar_in_job(payload, context):
+    import subprocess
+    import app
+    import grammar_pool
+
+    def language_tool(pool, url):
+        if not url:
+            # Stands in for the LanguageTool server JVM a local instance would start
+            server = subprocess.Popen(['sleep', '60'])
+            with open(payload['pid_file'], 'a') as f:
+                f.write(f"{server.pid}\n")
+        return FakeTool()
+
+    grammar_pool.LanguageToolPool._language_tool = language_tool
+    app.ENABLE_GRAMMAR_TOOL = True
+    return [issue['rule_id'] for issue in app.check_grammar('teh cat sat.')['grammar_issues']]
+
+def run_grammar_job(pid_file):
+    queue = JobQueue('jobs.db', {'grammar': checks_grammar_in_job})
+    job_id = queue.enqueue('grammar', {'pid_file': str(pid_file)}, max_attempts=1)
+    job = queue.claim()
+    queue.run_one(job)
+    return queue.get(job_id)
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+def test_job_process_leaves_no_language_tool_server_behind(app_module, workdir, monkeypatch):
+    app = app_module
+    monkeypatch.delenv(app.GRAMMAR_SERVER_URLS, raising=False)
+    job = run_grammar_job(workdir / 'servers.pid')
+    # Without server URLs the job falls back to the built-in rules instead of starting servers
+    assert (job['state'], job['result']) == ('succeeded', ['MISSPELLING'])
+    pids = [int(line) for line in (workdir / 'servers.pid').read_text().split()] \
+        if (workdir / 'servers.pid').exists() else []
+    assert not [pid for pid in pids if process_alive(pid)]
+
+def test_job_process_uses_shared_language_tool_servers(app_module, workdir, monkeypatch):
+    app = app_module
+    monkeypatch.setenv(app.GRAMMAR_SERVER_URLS, 'http://127.0.0.1:8081/')
+    job = run_grammar_job(workdir / 'servers.pid')
+    assert (job['state'], job['result']) == ('succeeded', ['FAKE_RULE'])
+    assert not (workdir / 'servers.pid').exists()
+
+def test_master_warm_up_saves_the_snapshot_jobs_map(app_module, shipped_db, monkeypatch):
+    import gc
+    pytest.importorskip('scipy')
+    import tfidf_index
+    app = app_module
+    app.init_db()
+    monkeypatch.setattr(app, 'CANDIDATE_SEARCH', 'tfidf')
+    try:
+        app.warm_shared_state()
+    finally:
+        gc.unfreeze()
+    # The master keeps no matrix of its own; job processes map the snapshot it saved
+    assert app.corpus_index is None
+    snapshot = tfidf_index.CorpusIndex.load(app.TFIDF_INDEX_DIR, app.FEATURES_VERSION)
+    assert (snapshot.last_doc_id, len(snapshot)) == (4, 4)
+    assert len(app.get_corpus_index()) == 4 and app.corpus_index.unsaved_rows == 0
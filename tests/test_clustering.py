@@ -0,0 +1,75 @@
+import database
+import report_store
+from clustering import UnionFind, jaccard, summarize_clusters
+
+def test_union_find_groups_and_restores_sets():
+    union_find = UnionFind()
+    for doc_id in range(1, 7):
+        union_find.add(doc_id)
+    union_find.union(1, 2)
+    union_find.union(3, 4)
+    union_find.union(2, 4)
+    assert union_find.find(1) == union_find.find(3)
+    assert sorted(sorted(members) for members in union_find.groups().values()) == [[1, 2, 3, 4], [5], [6]]
+    # A run resumes from the saved {doc_id: root} map
+    restored = UnionFind({doc_id: union_find.find(doc_id) for doc_id in range(1, 7)})
+    restored.union(5, 6)
+    assert sorted(sorted(members) for members in restored.groups().values()) == [[1, 2, 3, 4], [5, 6]]
+    # Union by size keeps the larger set's root
+    assert restored.union(5, 1) == union_find.find(1)
+
+def test_representative_has_the_highest_edge_weight():
+    vocabularies = {1: {'a', 'b', 'c', 'd'}, 2: {'a', 'b', 'c', 'e'}, 3: {'a', 'b', 'c', 'd', 'e'},
+                    4: {'x'}, 5: {'x', 'y'}}
+    union_find = UnionFind()
+    edges = [(1, 3, 0.8), (2, 3, 0.8), (1, 2, 0.6), (4, 5, 0.5)]
+    for doc_id_a, doc_id_b, _ in edges:
+        union_find.add(doc_id_a)
+        union_find.add(doc_id_b)
+        union_find.union(doc_id_a, doc_id_b)
+    union_find.add(6)
+
+    def load(ids):
+        return {doc_id: vocabularies[doc_id] for doc_id in ids}
+
+    assert summarize_clusters(union_find, edges, load) == [
+        {'representative_id': 3, 'size': 3, 'members': [(3, 1.0), (1, 0.8), (2, 0.8)]},
+        # Equal weights: the lowest id represents the cluster
+        {'representative_id': 4, 'size': 2, 'members': [(4, 1.0), (5, 0.5)]}
+    ]
+    assert jaccard(set(), {'x'}) == 0.0
+
+ESSAY = ("Glaciers carve deep valleys as they advance and retreat over thousands of years, leaving moraines, "
+         "erratic boulders and polished bedrock behind them across the northern landscape")
+OTHER = ("Coral reefs host a quarter of marine species while covering a tiny fraction of the ocean floor, "
+         "and rising water temperatures bleach them faster than they can recover")
+
+def store(app, texts):
+    documents = [{'filename': name, 'file_hash': name, 'file_type': 'txt', 'content': text,
+                  'file_size': len(text), 'features': app.compute_text_features(text)}
+                 for name, text in texts]
+    with database.transaction(app.DATABASE) as cursor:
+        return app.insert_documents(cursor, documents)
+
+def cluster_report(app, report_id):
+    with database.cursor(app.DATABASE) as cursor:
+        report = report_store.load_report(cursor, 'batch_reports', report_id)
+    return report, [sorted(member['filename'] for member in cluster['members']) for cluster in report['clusters']]
+
+def test_clustering_runs_incrementally(app_module, workdir):
+    app = app_module
+    app.init_db()
+    store(app, [('glaciers.txt', ESSAY), ('glaciers_copy.txt', ESSAY + ' today'), ('reefs.txt', OTHER)])
+    report, clusters = cluster_report(app, app.run_cluster_batch())
+    assert (report['new_documents'], report['clustered_documents']) == (3, 2)
+    assert clusters == [['glaciers.txt', 'glaciers_copy.txt']]
+
+    store(app, [('reefs_copy.txt', 'Sadly ' + OTHER), ('glaciers_again.txt', ESSAY + ' again')])
+    report, clusters = cluster_report(app, app.run_cluster_batch())
+    # Only the two new documents were linked; the earlier cluster was restored and extended
+    assert (report['new_documents'], report['total_documents'], report['clustered_documents']) == (2, 5, 5)
+    assert clusters == [['glaciers.txt', 'glaciers_again.txt', 'glaciers_copy.txt'], ['reefs.txt', 'reefs_copy.txt']]
+    members = {member['filename']: member['similarity_percentage']
+               for cluster in report['clusters'] for member in cluster['members']}
+    assert members[report['clusters'][0]['representative_name']] == 100.0
+    assert all(70 <= score <= 100 for score in members.values())
@@ -0,0 +1,65 @@
+import os
+
+import database
+import content_store
+import text_features
+from content_store import ContentStore
+
+TEXT = "Plagiarism détection – naïve façade. " * 40
+
+def files_under(root):
+    return sorted(os.path.join(base, name) for base, _, names in os.walk(root) for name in names)
+
+def test_small_texts_are_compressed_inline(tmp_path):
+    store = ContentStore(str(tmp_path / 'blobs'))
+    value = store.encode(TEXT)
+    assert value.startswith(content_store.FORMAT_COMPRESSED) and len(value) < len(TEXT.encode('utf-8'))
+    assert store.decode(value) == TEXT
+    assert files_under(tmp_path) == []
+
+def test_legacy_values_still_decode(tmp_path):
+    store = ContentStore(str(tmp_path))
+    # Plain TEXT rows come back from SQLite as str; bytes without a marker are plain UTF-8
+    assert store.decode(TEXT) == TEXT
+    assert store.decode(TEXT.encode('utf-8')) == TEXT
+    # B1 rows point at uncompressed blob files
+    digest = 'ab' * 32
+    os.makedirs(tmp_path / 'ab')
+    (tmp_path / 'ab' / digest).write_bytes(TEXT.encode('utf-8'))
+    assert store.decode(content_store.FORMAT_BLOB + digest.encode('ascii')) == TEXT
+
+def test_blobs_are_shared_and_read_in_chunks(tmp_path, monkeypatch):
+    # A chunk boundary falls inside multi-byte characters
+    monkeypatch.setattr(content_store, 'READ_CHUNK_SIZE', 7)
+    store = ContentStore(str(tmp_path), blob_min_bytes=100)
+    value = store.encode(TEXT)
+    assert value.startswith(content_store.FORMAT_COMPRESSED_BLOB)
+    assert store.encode(TEXT) == value
+    (blob,) = files_under(tmp_path)
+    assert blob.endswith('.z')
+    assert store.decode(value) == TEXT
+
+def test_legacy_contents_are_migrated_in_batches(tmp_path):
+    db_path = str(tmp_path / 'documents.db')
+    store = ContentStore(str(tmp_path / 'blobs'), blob_min_bytes=len(TEXT))
+    with database.transaction(db_path) as cursor:
+        cursor.execute('CREATE TABLE documents (id INTEGER PRIMARY KEY, content TEXT)')
+        cursor.executemany('INSERT INTO documents (content) VALUES (?)',
+                           [('short essay',), (TEXT,), ('another short one',)])
+        assert content_store.migrate_contents(cursor, store, batch_size=2) == 2
+        assert content_store.migrate_contents(cursor, store, batch_size=2) == 1
+        assert content_store.migrate_contents(cursor, store, batch_size=2) == 0
+        cursor.execute('SELECT content FROM documents ORDER BY id')
+        values = [row[0] for row in cursor.fetchall()]
+    assert [value[:2] for value in values] == [b'C1', b'B2', b'C1']
+    assert [store.decode(value) for value in values] == ['short essay', TEXT, 'another short one']
+
+def test_feature_rows_round_trip_compressed_or_legacy():
+    features = text_features.compute_text_features(TEXT)
+    row = text_features.features_to_row(features)
+    assert all(value.startswith(text_features.FORMAT_COMPRESSED) for value in row[1:])
+    assert text_features.features_from_row(row) == features
+    legacy = (row[0],) + tuple(text_features.decode_column(value) for value in row[1:])
+    assert all(isinstance(value, str) for value in legacy[1:])
+    assert text_features.features_from_row(legacy) == features
+    assert text_features.features_from_row(('stale',) + row[1:]) is None
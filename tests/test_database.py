@@ -0,0 +1,35 @@
+import threading
+
+import database
+
+def test_executemany_batched_writes_every_row(tmp_path):
+    db_path = str(tmp_path / 'batched.db')
+    with database.transaction(db_path) as cursor:
+        cursor.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+        rows = ((i, f"item{i}") for i in range(1234))
+        assert database.executemany_batched(cursor, 'INSERT INTO items VALUES (?, ?)', rows, batch_size=100) == 1234
+    with database.cursor(db_path) as cursor:
+        assert cursor.execute('SELECT COUNT(*), MAX(id) FROM items').fetchone() == (1234, 1233)
+
+def test_transaction_rolls_back_every_batch_on_error(tmp_path):
+    db_path = str(tmp_path / 'batched.db')
+    with database.transaction(db_path) as cursor:
+        cursor.execute('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+    try:
+        with database.transaction(db_path) as cursor:
+            database.executemany_batched(cursor, 'INSERT INTO items VALUES (?)', [(1,), (2,), (2,)], batch_size=1)
+    except Exception:
+        pass
+    with database.cursor(db_path) as cursor:
+        assert cursor.execute('SELECT COUNT(*) FROM items').fetchone() == (0,)
+
+def test_connections_are_per_thread_and_in_wal_mode(tmp_path):
+    db_path = str(tmp_path / 'pooled.db')
+    main = database.get_connection(db_path)
+    assert database.get_connection(db_path) is main
+    assert main.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    other = []
+    thread = threading.Thread(target=lambda: other.append(database.get_connection(db_path)))
+    thread.start()
+    thread.join()
+    assert other[0] is not main
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+import extraction_cache
+from extraction_cache import ExtractionCache
+
+def entry_bytes(cache_dir):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(cache_dir) for name in files if name.endswith('.z'))
+
+def test_new_instance_reads_the_recorded_size(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    cache = ExtractionCache(cache_dir)
+    for i in range(5):
+        cache.put(ExtractionCache.make_key(i), f"document {i} " * 50)
+    assert cache.stats()['size_bytes'] == entry_bytes(cache_dir)
+
+    # As in a freshly spawned job process: the size comes from the shared record, not a walk
+    other = ExtractionCache(cache_dir)
+    monkeypatch.setattr(ExtractionCache, '_entries', lambda self: pytest.fail('walked the cache directory'))
+    other.put(ExtractionCache.make_key('new'), "another document " * 50)
+    assert other.stats()['size_bytes'] == entry_bytes(cache_dir)
+    # Rewriting an entry only counts the difference
+    other.put(ExtractionCache.make_key('new'), "another document " * 50)
+    assert other.stats()['size_bytes'] == entry_bytes(cache_dir)
+
+def test_puts_from_several_instances_trigger_eviction(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    text = ' '.join(f"word{i}" for i in range(2000))
+    first = ExtractionCache(cache_dir)
+    first.put(ExtractionCache.make_key('sized'), text)
+    limit = entry_bytes(cache_dir) * 3
+    first.max_bytes = limit
+    second = ExtractionCache(cache_dir, max_bytes=limit)
+    for i in range(4):
+        (first, second)[i % 2].put(ExtractionCache.make_key(i), text + str(i))
+    # Entries written through either instance count against the one recorded total
+    assert 0 < entry_bytes(cache_dir) <= limit
+    assert first.evictions + second.evictions >= 1
+
+def test_eviction_frees_down_to_the_low_water_mark(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    texts = [' '.join(f"word{i}_{j}" for j in range(2000)) for i in range(22)]
+    cache = ExtractionCache(cache_dir)
+    cache.put(ExtractionCache.make_key('sized'), texts[0])
+    cache.max_bytes = int(entry_bytes(cache_dir) * 10.5)
+    for i, text in enumerate(texts[1:-1]):
+        cache.put(ExtractionCache.make_key(i), text)
+    assert cache.evictions > 0
+    assert entry_bytes(cache_dir) <= cache.max_bytes * extraction_cache.EVICT_LOW_WATER
+    # Room was left, so the next entry fits without walking the directory again
+    monkeypatch.setattr(ExtractionCache, '_entries', lambda self: pytest.fail('walked the cache directory'))
+    cache.put(ExtractionCache.make_key('after'), texts[-1])
+
+def test_stats_report_the_shared_size(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    reader, writer = ExtractionCache(cache_dir), ExtractionCache(cache_dir)
+    assert reader.stats()['size_bytes'] is None
+    writer.put(ExtractionCache.make_key('a'), "some extracted text " * 100)
+    writer.put(ExtractionCache.make_key('b'), "more extracted text " * 100)
+    # The web process reports puts made by job processes
+    assert reader.stats()['size_bytes'] == entry_bytes(cache_dir)
@@ -0,0 +1,54 @@
+import extractors
+from text_features import compute_text_features
+
+def test_txt_chunks_never_split_words(workdir, monkeypatch):
+    monkeypatch.setattr(extractors, 'TEXT_READ_SIZE', 16)
+    text = 'streaming extractors yield text in blocks\nwithout cutting any word in half ' * 20
+    (workdir / 'doc.txt').write_text(text, encoding='utf-8')
+    chunks = list(extractors.iter_txt('doc.txt'))
+    assert len(chunks) > 1
+    assert ''.join(chunks) == text
+    assert all(chunk[-1] in ' \n' for chunk in chunks[:-1])
+
+def test_docx_yields_one_chunk_per_paragraph(workdir):
+    from docx import Document
+    document = Document()
+    document.add_paragraph('First paragraph.')
+    document.add_paragraph('Second paragraph.')
+    document.save('doc.docx')
+    assert list(extractors.iter_text_chunks('doc.docx', 'docx')) == ['First paragraph.\n', 'Second paragraph.\n']
+
+def test_xlsx_yields_one_line_per_row_of_every_sheet(workdir):
+    import openpyxl
+    workbook = openpyxl.Workbook()
+    workbook.active.append(['name', 'score'])
+    workbook.active.append(['alice', 3])
+    workbook.create_sheet('other').append(['total', None, '=1+2'])
+    workbook.save('doc.xlsx')
+    # data_only reads cached values, and a file never opened in Excel has none for formulas
+    assert list(extractors.iter_text_chunks('doc.xlsx', 'xlsx')) == ['name score\n', 'alice 3\n', 'total\n']
+
+def test_bounded_stops_and_closes_the_parser():
+    closed = []
+
+    def chunks():
+        try:
+            for number in range(100):
+                yield f'chunk {number} '
+        finally:
+            closed.append(True)
+
+    assert ''.join(extractors.bounded(chunks(), max_chars=20)) == 'chunk 0 chunk 1 chun'
+    assert closed == [True]
+
+def test_extract_document_builds_features_from_the_stream(app_module, workdir, monkeypatch):
+    monkeypatch.setattr(extractors, 'TEXT_READ_SIZE', 32)
+    text = 'The detector streams every chunk of this document exactly once. ' * 10
+    (workdir / 'doc.txt').write_text(text, encoding='utf-8')
+    content, features = app_module.extract_document('doc.txt', 'txt')
+    assert content == text
+    assert features == compute_text_features(text)
+
+def test_unsupported_type_is_reported(app_module, workdir):
+    (workdir / 'doc.odt').write_bytes(b'')
+    assert app_module.extract_document('doc.odt', 'odt') == ("Error: Unsupported file type", None)
@@ -0,0 +1,10 @@
+import os
+
+from benchmarks import import_time
+
+def test_app_import_stays_lazy_and_within_budget():
+    # check() imports app in a fresh interpreter, so modules this test process loaded do not count
+    budget_ms = float(os.getenv('IMPORT_BUDGET_MS', import_time.DEFAULT_BUDGET_MS))
+    result, problems = import_time.check('app', budget_ms)
+    assert problems == []
+    assert not {'numpy', 'scipy'} & result['loaded']
@@ -0,0 +1,61 @@
+import io
+import zipfile
+
+import database
+import ingest
+
+ESSAYS = {
+    'rivers.txt': 'Rivers carry water from the mountains down to the sea.',
+    'deserts/sahara.txt': 'The Sahara is the largest hot desert on the planet.',
+    # Same bytes as rivers.txt under another name
+    'copies/rivers_copy.txt': 'Rivers carry water from the mountains down to the sea.',
+    'notes.odt': 'Not a supported type.'
+}
+
+def write_tree(root, files):
+    for name, text in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(text if isinstance(text, bytes) else text.encode('utf-8'))
+
+def stored_documents(app):
+    with database.cursor(app.DATABASE) as cursor:
+        cursor.execute('SELECT filename FROM documents ORDER BY filename')
+        return [row[0] for row in cursor.fetchall()]
+
+def test_directory_is_ingested_once_and_resumed(app_module, workdir):
+    app = app_module
+    write_tree(workdir / 'corpus', dict(ESSAYS, **{'broken.txt': b'\xff\xfe not utf-8'}))
+    out = io.StringIO()
+    totals = ingest.ingest([str(workdir / 'corpus')], workers=2, batch_size=2, out=out)
+    assert {key: totals[key] for key in ('ingested', 'duplicate', 'failed', 'skipped', 'processed')} == \
+        {'ingested': 2, 'duplicate': 1, 'failed': 1, 'skipped': 0, 'processed': 4}
+    assert out.getvalue().splitlines()[-1].startswith('Ingested 2 new documents from 4 files')
+    # Whichever copy of rivers.txt finished first is kept
+    documents = stored_documents(app)
+    assert len(documents) == 2 and 'sahara.txt' in documents
+    doc_id = app.find_document_by_hash(app.get_file_hash('corpus/deserts/sahara.txt'))
+    assert app.get_document_features(doc_id) == app.compute_text_features(ESSAYS['deserts/sahara.txt'])
+
+    # A second run skips finished files and retries only the failed one, now fixed
+    (workdir / 'corpus' / 'broken.txt').write_text('Glaciers shape the valleys they move through.')
+    totals = ingest.ingest([str(workdir / 'corpus')], workers=1, out=io.StringIO())
+    assert (totals['ingested'], totals['skipped'], totals['processed']) == (1, 3, 1)
+    assert len(stored_documents(app)) == 3
+
+def test_zip_members_are_ingested_and_deduplicated_against_the_corpus(app_module, workdir):
+    app = app_module
+    write_tree(workdir / 'corpus', {'rivers.txt': ESSAYS['rivers.txt']})
+    ingest.ingest([str(workdir / 'corpus')], workers=1, out=io.StringIO())
+    with zipfile.ZipFile(workdir / 'archive.zip', 'w') as archive:
+        for name, text in ESSAYS.items():
+            archive.writestr(f"submissions/{name}", text)
+    totals = ingest.ingest([str(workdir / 'archive.zip')], workers=2, out=io.StringIO())
+    # Both copies of rivers.txt are already in the corpus
+    assert (totals['ingested'], totals['duplicate'], totals['failed']) == (1, 2, 0)
+    assert stored_documents(app) == ['rivers.txt', 'sahara.txt']
+    with database.cursor(app.DATABASE) as cursor:
+        cursor.execute("SELECT source_key FROM ingested_files WHERE status = 'ingested'")
+        keys = sorted(row[0] for row in cursor.fetchall())
+    assert keys == [str(workdir / 'archive.zip') + '!submissions/deserts/sahara.txt',
+                    str(workdir / 'corpus' / 'rivers.txt')]
@@ -0,0 +1,119 @@
+import time
+import threading
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, JobError
+
+# Handlers are pickled by reference into the spawned job process, so they live at module level
+
+def fails_first_attempt(payload, context):
+    if context.attempt == 1:
+        raise RuntimeError('transient failure')
+    return {'attempt': context.attempt}
+
+def fails_for_good(payload, context):
+    raise JobError('bad input')
+
+def waits_for_cancel(payload, context):
+    context.set_progress('waiting')
+    while True:
+        context.check_cancelled()
+        time.sleep(0.05)
+
+def sleeps(payload, context):
+    time.sleep(30)
+
+def leaves_a_child(payload, context):
+    import subprocess
+    child = subprocess.Popen(['sleep', '60'])
+    context.publish('child', {'pid': child.pid})
+    return {'pid': child.pid}
+
+@pytest.fixture
+def queue(workdir, monkeypatch):
+    monkeypatch.setattr(job_queue, 'RETRY_BACKOFF', 0)
+    return JobQueue('jobs.db', {
+        'flaky': fails_first_attempt,
+        'broken': fails_for_good,
+        'waits': waits_for_cancel,
+        'sleeps': sleeps,
+        'orphans': leaves_a_child
+    })
+
+def run_next(queue):
+    job = queue.claim()
+    assert job is not None
+    queue.run_one(job)
+    return queue.get(job['id'])
+
+def test_failed_attempt_is_retried(queue):
+    job_id = queue.enqueue('flaky', {}, max_attempts=2)
+    job = run_next(queue)
+    assert (job['state'], job['stage'], job['attempts']) == ('queued', 'retrying', 1)
+    assert job['error'].startswith('transient failure')
+    job = run_next(queue)
+    assert (job['state'], job['attempts'], job['result']) == ('succeeded', 2, {'attempt': 2})
+    assert queue.get(job_id)['error'] is None
+
+def test_last_failed_attempt_is_not_retried(queue):
+    queue.enqueue('flaky', {}, max_attempts=1)
+    assert run_next(queue)['state'] == 'failed'
+    assert queue.claim() is None
+
+def test_job_error_fails_without_retry(queue):
+    queue.enqueue('broken', {}, max_attempts=3)
+    job = run_next(queue)
+    assert (job['state'], job['attempts'], job['error']) == ('failed', 1, 'bad input')
+
+def test_timed_out_job_is_terminated(queue):
+    queue.enqueue('sleeps', {}, max_attempts=1, timeout=1)
+    started = time.time()
+    job = run_next(queue)
+    assert time.time() - started < 10
+    assert (job['state'], job['error']) == ('failed', 'Timed out after 1s')
+
+def test_cancel_queued_job(queue):
+    job_id = queue.enqueue('waits', {})
+    assert queue.cancel(job_id)['state'] == 'cancelled'
+    assert queue.claim() is None
+
+def test_cancel_running_job(queue):
+    job_id = queue.enqueue('waits', {})
+    job = queue.claim()
+    runner = threading.Thread(target=queue.run_one, args=(job,))
+    runner.start()
+    deadline = time.time() + 30
+    while queue.get(job_id)['stage'] != 'waiting' and time.time() < deadline:
+        time.sleep(0.05)
+    assert queue.cancel(job_id)['state'] == 'running'
+    runner.join(30)
+    assert not runner.is_alive()
+    assert queue.get(job_id)['state'] == 'cancelled'
+
+def test_max_running_counts_jobs_of_other_queues(queue):
+    capped = JobQueue('jobs.db', queue.handlers, max_running=1)
+    queue.enqueue('flaky', {})
+    queue.enqueue('flaky', {})
+    assert queue.claim() is not None
+    # The job claimed through the other queue is running, as seen in the shared database
+    assert capped.claim() is None
+    assert queue.claim() is not None
+
+def test_processes_left_by_a_job_are_stopped(queue):
+    import os
+    job_id = queue.enqueue('orphans', {})
+    job = run_next(queue)
+    assert job['state'] == 'succeeded'
+    [(_, event, data)] = queue.events(job_id)
+    assert (event, data) == ('child', {'pid': job['result']['pid']})
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            os.kill(data['pid'], 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        raise AssertionError('the job left a process running')
@@ -0,0 +1,77 @@
+import metrics
+from metrics import Registry, SharedStore
+
+def worker_registry():
+    """A registry standing in for one gunicorn worker's."""
+    registry = Registry()
+    registry.counter('requests_total', 'Requests.')
+    registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+    return registry
+
+def sample_lines(text, name):
+    return sorted(line for line in text.splitlines() if line.startswith(metrics.PREFIX + name))
+
+def test_totals_are_summed_across_processes(workdir):
+    store = SharedStore('metrics.db')
+    first, second = worker_registry(), worker_registry()
+    first.counter('requests_total', 'Requests.').inc(2, endpoint='/')
+    first.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0)).observe(0.05)
+    second.counter('requests_total', 'Requests.').inc(3, endpoint='/')
+    second.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0)).observe(0.5)
+    store.flush(first)
+    text = store.render(second)
+    assert sample_lines(text, 'requests_total') == ['plagiarism_requests_total{endpoint="/"} 5']
+    assert sample_lines(text, 'latency_seconds_bucket') == [
+        'plagiarism_latency_seconds_bucket{le="+Inf"} 2',
+        'plagiarism_latency_seconds_bucket{le="0.1"} 1',
+        'plagiarism_latency_seconds_bucket{le="1.0"} 2'
+    ]
+    # Flushed values were moved out of the registries, so rendering again counts nothing twice
+    assert sample_lines(store.render(first), 'requests_total') == ['plagiarism_requests_total{endpoint="/"} 5']
+
+def test_per_process_collectors_add_changes_and_sum_gauges(workdir, monkeypatch):
+    store = SharedStore('metrics.db')
+    registry = Registry()
+    state = {'hits': 4, 'size': 100}
+    registry.register_collector(lambda: [
+        ('cache_hits_total', 'Hits.', 'counter', [({}, state['hits'])]),
+        ('cache_size_bytes', 'Size.', 'gauge', [({}, state['size'])])
+    ], per_process=True)
+    store.flush(registry)
+    state['hits'] = 6
+    store.flush(registry)
+    # Another process with its own cache
+    monkeypatch.setattr(metrics.os, 'getpid', lambda: -1)
+    other = SharedStore('metrics.db')
+    state.update(hits=1, size=50)
+    text = other.render(registry)
+    assert sample_lines(text, 'cache_hits_total') == ['plagiarism_cache_hits_total 7']
+    assert sample_lines(text, 'cache_size_bytes') == ['plagiarism_cache_size_bytes 150.0']
+    other.close(registry)
+    assert sample_lines(store.render(Registry()), 'cache_size_bytes') == ['plagiarism_cache_size_bytes 100.0']
+
+def test_failed_flush_keeps_values_for_the_next_one(workdir):
+    registry = worker_registry()
+    registry.counter('requests_total', 'Requests.').inc(endpoint='/')
+    (workdir / 'missing').mkdir()
+    broken = SharedStore(str(workdir / 'missing'))
+    try:
+        broken.flush(registry)
+    except Exception:
+        pass
+    else:
+        raise AssertionError('flushing into a directory should fail')
+    text = SharedStore('metrics.db').render(registry)
+    assert sample_lines(text, 'requests_total') == ['plagiarism_requests_total{endpoint="/"} 1']
+
+def test_metrics_endpoint_reports_other_workers(app_module, workdir):
+    app = app_module
+    other_worker = Registry()
+    other_worker.counter('http_requests_total', app.HTTP_REQUESTS.documentation).inc(
+        endpoint='/metrics', method='GET', status=200)
+    app.metrics_store.flush(other_worker)
+    client = app.create_app({'TESTING': True}).test_client()
+    client.get('/metrics')
+    body = client.get('/metrics').get_data(as_text=True)
+    # The first request of this process (the second is counted after it renders) and the other worker's
+    assert 'plagiarism_http_requests_total{endpoint="/metrics",method="GET",status="200"} 2' in body
@@ -0,0 +1,91 @@
+import random
+import sqlite3
+
+import pytest
+
+import minhash_index
+
+THRESHOLD = 0.2
+
+def make_corpus(seed=7, size=60):
+    """Random documents plus edited copies of the first one, at decreasing overlap."""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(2000)]
+    base = rng.sample(words, 200)
+    docs = [rng.sample(words, 200) for _ in range(size)]
+    for keep in (1.0, 0.9, 0.7, 0.5, 0.35):
+        kept = base[:int(len(base) * keep)]
+        docs.append(kept + rng.sample(words, len(base) - len(kept)))
+    return base, docs
+
+def jaccard(a, b):
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b)
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+    cur.execute('CREATE TABLE documents (id INTEGER PRIMARY KEY)')
+    minhash_index.create_tables(cur)
+    yield cur
+    conn.close()
+
+def index_corpus(cursor, docs, bands, rows, num_perm=minhash_index.DEFAULT_NUM_PERM):
+    for doc_id, tokens in enumerate(docs, 1):
+        cursor.execute('INSERT INTO documents (id) VALUES (?)', (doc_id,))
+        minhash_index.index_document(cursor, doc_id, minhash_index.compute_minhash(tokens, num_perm), bands, rows)
+
+def test_lsh_candidates_cover_full_scan_matches(cursor):
+    bands, rows = minhash_index.optimal_lsh_params(THRESHOLD, recall_weight=0.7)
+    base, docs = make_corpus()
+    index_corpus(cursor, docs, bands, rows)
+
+    signature = minhash_index.compute_minhash(base)
+    candidates = {doc_id for doc_id, _ in minhash_index.query_candidates(cursor, signature, bands, rows, THRESHOLD)}
+    # Exact Jaccard over every stored document, as the full scan would compute it
+    expected = {doc_id for doc_id, tokens in enumerate(docs, 1) if jaccard(base, tokens) >= THRESHOLD + 0.1}
+    assert expected
+    assert expected <= candidates
+    # Unrelated documents (Jaccard near 0.05) are pruned rather than all returned
+    assert len(candidates) < len(docs) / 2
+
+def test_sync_params_rebands_stored_signatures(cursor):
+    bands, rows = minhash_index.optimal_lsh_params(THRESHOLD, recall_weight=0.7)
+    base, docs = make_corpus()
+    assert minhash_index.sync_params(cursor, minhash_index.DEFAULT_NUM_PERM, bands, rows)
+    index_corpus(cursor, docs, bands, rows)
+    assert not minhash_index.sync_params(cursor, minhash_index.DEFAULT_NUM_PERM, bands, rows)
+
+    new_bands, new_rows = minhash_index.optimal_lsh_params(0.5, recall_weight=0.5)
+    assert (new_bands, new_rows) != (bands, rows)
+    assert minhash_index.sync_params(cursor, minhash_index.DEFAULT_NUM_PERM, new_bands, new_rows)
+    cursor.execute('SELECT DISTINCT num_bands FROM lsh_buckets')
+    assert cursor.fetchall() == [(new_bands,)]
+    signature = minhash_index.compute_minhash(base)
+    candidates = minhash_index.query_candidates(cursor, signature, new_bands, new_rows, 0.5)
+    assert len(docs) - 4 in {doc_id for doc_id, _ in candidates}
+
+def test_sync_params_drops_signatures_of_another_size(cursor):
+    bands, rows = minhash_index.optimal_lsh_params(THRESHOLD, num_perm=64)
+    _, docs = make_corpus(size=5)
+    minhash_index.sync_params(cursor, 64, bands, rows)
+    index_corpus(cursor, docs, bands, rows, num_perm=64)
+    assert minhash_index.queue_unindexed(cursor, 64) == 0
+    assert minhash_index.pending_documents(cursor) == []
+
+    new_bands, new_rows = minhash_index.optimal_lsh_params(THRESHOLD)
+    minhash_index.sync_params(cursor, minhash_index.DEFAULT_NUM_PERM, new_bands, new_rows)
+    assert minhash_index.queue_unindexed(cursor, minhash_index.DEFAULT_NUM_PERM) == len(docs)
+    assert minhash_index.pending_documents(cursor) == list(range(1, len(docs) + 1))
+    assert minhash_index.pending_documents(cursor, exclude_id=1, limit=2) == [2, 3]
+
+def test_indexing_clears_the_pending_entry(cursor):
+    bands, rows = minhash_index.optimal_lsh_params(THRESHOLD)
+    cursor.executemany('INSERT INTO documents (id) VALUES (?)', [(1,), (2,)])
+    minhash_index.queue_unindexed(cursor, minhash_index.DEFAULT_NUM_PERM)
+    minhash_index.index_document(cursor, 1, minhash_index.compute_minhash(['a', 'b']), bands, rows)
+    assert minhash_index.pending_documents(cursor) == [2]
+    # Queries read the pending list only; the documents table is not scanned again
+    cursor.execute('INSERT INTO documents (id) VALUES (3)')
+    assert minhash_index.pending_documents(cursor) == [2]
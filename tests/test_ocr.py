@@ -0,0 +1,91 @@
+import time
+
+import pytest
+from PIL import Image
+
+import ocr
+import extractors
+
+pytesseract = pytest.importorskip('pytesseract')
+
+@pytest.fixture
+def recognized(monkeypatch):
+    """Replaces Tesseract: each frame reads as its mode and size; a frame 13 px wide times out."""
+    calls = []
+
+    def image_to_string(image, lang=None, timeout=None):
+        calls.append((image.mode, image.size, timeout))
+        if image.width == 13:
+            raise RuntimeError('Tesseract process timeout')
+        if image.width == 17:
+            raise RuntimeError('Tesseract failed')
+        # Later pages finish first, so results arrive out of order
+        time.sleep(0.01 * (5 - min(image.height, 5)))
+        return f"{image.mode} {image.width}x{image.height}"
+
+    monkeypatch.setattr(pytesseract, 'image_to_string', image_to_string)
+    monkeypatch.setattr(ocr.OCR_PAGES, 'values', {})
+    return calls
+
+def test_prepare_scales_to_the_target_dpi():
+    image = Image.new('RGB', (1200, 600))
+    image.info['dpi'] = (600, 600)
+    frame, scale = ocr.prepare(image, target_dpi=300)
+    assert (frame.mode, frame.size, scale) == ('L', (1200, 600), 0.5)
+    assert ocr.downsample(frame, scale).size == (600, 300)
+    # An image embedded in a 4 inch wide PDF page is 300 DPI already
+    assert ocr.prepare(image, page_width_inches=4, target_dpi=300)[1] == 1.0
+    # Low resolution images are never enlarged
+    image.info['dpi'] = (150, 150)
+    assert ocr.prepare(image, target_dpi=300)[1] == 1.0
+
+def test_prepare_caps_pixels_without_resolution():
+    frame, scale = ocr.prepare(Image.new('1', (400, 100)), max_pixels=10000)
+    assert (frame.mode, scale) == ('1', 0.5)
+    assert ocr.downsample(frame, scale).size == (200, 50) and ocr.downsample(frame, scale).mode == 'L'
+
+def pages_of(sizes):
+    return [[(Image.new('L', size), 1.0)] for size in sizes]
+
+def test_pages_come_back_in_order(recognized):
+    pages = pages_of([(10, 1), (10, 2), (10, 3)])
+    texts = list(ocr.recognize_pages(iter(pages[:2] + ['text layer\n'] + pages[2:])))
+    assert texts == ['L 10x1', 'L 10x2', 'text layer\n', 'L 10x3']
+    assert [timeout for _, _, timeout in recognized] == [ocr.OCR_PAGE_TIMEOUT] * 3
+    assert ocr.OCR_PAGES.values == {(('result', 'ok'),): 3}
+
+def test_only_a_window_of_pages_is_decoded_ahead(recognized):
+    pulled = []
+
+    def pages():
+        for number in range(20):
+            pulled.append(number)
+            yield [(Image.new('L', (10, 5)), 1.0)]
+
+    results = ocr.recognize_pages(pages(), window=3)
+    for number, _ in enumerate(results):
+        # At most the window is pulled ahead of the page being returned
+        assert len(pulled) <= number + 3
+    assert len(pulled) == 20
+
+def test_timed_out_page_keeps_its_finished_frames(recognized):
+    page = [(Image.new('L', (10, 4)), 1.0), (Image.new('L', (13, 4)), 1.0), (Image.new('L', (10, 3)), 1.0)]
+    assert list(ocr.recognize_pages(iter([page]))) == ['L 10x4']
+    assert ocr.OCR_PAGES.values == {(('result', 'timeout'),): 1}
+    with pytest.raises(RuntimeError, match='failed'):
+        list(ocr.recognize_pages(iter([[(Image.new('L', (17, 4)), 1.0)]])))
+
+def test_every_frame_of_an_image_is_read(recognized, workdir):
+    frames = [Image.new('RGB', (10, height)) for height in (1, 2, 3)]
+    frames[0].save('scan.tiff', save_all=True, append_images=frames[1:])
+    assert list(extractors.iter_text_chunks('scan.tiff', 'tiff')) == ['L 10x1\n', 'L 10x2\n', 'L 10x3\n']
+
+def test_scanned_pdf_pages_fall_back_to_ocr(recognized, workdir, monkeypatch):
+    monkeypatch.setattr(extractors, '_tesseract_version', '5.3.0')
+    monkeypatch.setattr(extractors, 'OCR_PDF_FALLBACK', True)
+    # Two image-only pages, 1 and 2 inches wide, scanned at 600 DPI
+    pages = [Image.new('RGB', (600, 8)), Image.new('RGB', (1200, 8))]
+    pages[0].save('scan.pdf', save_all=True, append_images=pages[1:], resolution=600)
+    assert list(extractors.iter_text_chunks('scan.pdf', 'pdf')) == ['L 300x4\n', 'L 600x4\n']
+    monkeypatch.setattr(extractors, 'OCR_PDF_FALLBACK', False)
+    assert list(extractors.iter_text_chunks('scan.pdf', 'pdf')) == ['\n', '\n']
@@ -0,0 +1,70 @@
+import json
+
+import database
+import report_store
+
+SINGLE_FILE_REPORT = {
+    'report_name': 'Single_File_essay.txt',
+    'document_analyzed': {'filename': 'essay.txt', 'word_count': 120},
+    'overall_summary': {'highest_similarity': 82.5, 'overall_risk_level': 'HIGH', 'total_documents_compared': 3},
+    'plagiarism_results': [{'filename': 'other.txt', 'similarity_percentage': 82.5, 'risk_level': 'HIGH',
+                            'similar_sentence': 'Große Ähnlichkeit'}],
+    'recommendations': ['Add proper citations where needed.']
+}
+
+def test_reports_round_trip_compressed():
+    payload = report_store.encode_report(SINGLE_FILE_REPORT)
+    assert payload.startswith(report_store.FORMAT_V1)
+    assert len(payload) < len(json.dumps(SINGLE_FILE_REPORT)) / 2
+    assert report_store.decode_report(payload) == SINGLE_FILE_REPORT
+
+def test_legacy_json_payloads_still_load():
+    text = json.dumps(SINGLE_FILE_REPORT)
+    assert report_store.decode_report(text) == SINGLE_FILE_REPORT
+    assert report_store.decode_report(text.encode('utf-8')) == SINGLE_FILE_REPORT
+
+def single_file_db(tmp_path):
+    db_path = str(tmp_path / 'reports.db')
+    with database.transaction(db_path) as cursor:
+        # The table as first created, plus the summary columns ensure_schema() adds to it
+        cursor.execute('''
+            CREATE TABLE single_file_reports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                report_name TEXT NOT NULL,
+                document_id INTEGER,
+                report_data TEXT NOT NULL,
+                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        report_store._add_columns(cursor, 'single_file_reports', report_store.SUMMARY_COLUMNS['single_file_reports'])
+    return db_path
+
+def test_legacy_rows_are_compressed_and_summarized(tmp_path):
+    db_path = single_file_db(tmp_path)
+    with database.transaction(db_path) as cursor:
+        cursor.executemany('INSERT INTO single_file_reports (report_name, document_id, report_data) VALUES (?, 1, ?)',
+                           [('legacy', json.dumps(SINGLE_FILE_REPORT)), ('broken', '{not json')])
+        assert report_store.migrate_payloads(cursor, 'single_file_reports') == 1
+        # A second pass finds nothing left to migrate but the row it cannot parse
+        assert report_store.migrate_payloads(cursor, 'single_file_reports') == 0
+        cursor.execute('SELECT typeof(report_data), filename, highest_similarity, risk_level, documents_compared '
+                       'FROM single_file_reports ORDER BY id')
+        assert cursor.fetchall() == [('blob', 'essay.txt', 82.5, 'HIGH', 3), ('text', None, None, None, None)]
+        assert report_store.load_report(cursor, 'single_file_reports', 1) == SINGLE_FILE_REPORT
+
+def test_listing_pages_by_keyset(tmp_path):
+    db_path = single_file_db(tmp_path)
+    with database.transaction(db_path) as cursor:
+        for number in range(5):
+            report_store.insert_single_file_report(cursor, 1, dict(SINGLE_FILE_REPORT, report_name=f"r{number}"))
+    columns = ['id', 'created_date', 'report_name']
+    pages, token = [], None
+    with database.cursor(db_path) as cursor:
+        while True:
+            rows, token = report_store.list_page(cursor, 'single_file_reports', columns, before=token, limit=2)
+            pages.append([row[2] for row in rows])
+            if token is None:
+                break
+    # Rows inserted in the same second are ordered by id, newest first
+    assert pages == [['r4', 'r3'], ['r2', 'r1'], ['r0']]
+    assert report_store.parse_cursor('garbage') is None
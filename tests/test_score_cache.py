@@ -0,0 +1,104 @@
+import database
+import score_cache
+from score_cache import ScoreCache
+
+def entry(size):
+    """A value whose JSON form is exactly size bytes."""
+    return 'x' * (size - 2)
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    cache = ScoreCache(max_bytes=30)
+    cache.put('a', entry(10))
+    cache.put('b', entry(10))
+    cache.put('c', entry(10))
+    assert cache.get('a') == entry(10)
+    cache.put('d', entry(10))
+    # 'b' was used least recently once 'a' was read
+    assert cache.get('b') is None
+    assert [cache.get(key) is not None for key in ('a', 'c', 'd')] == [True, True, True]
+    cache.put('huge', entry(31))
+    assert cache.get('huge') is None
+    assert cache.stats() == {'hits': 4, 'misses': 2, 'evictions': 1, 'hit_rate': 0.6667,
+                             'entries': 3, 'size_bytes': 30}
+
+def test_replacing_an_entry_updates_its_size():
+    cache = ScoreCache(max_bytes=30)
+    cache.put('a', entry(10))
+    cache.put('a', entry(25))
+    cache.put('b', entry(5))
+    assert cache.stats()['size_bytes'] == 30 and cache.stats()['evictions'] == 0
+
+def test_keys_depend_on_both_texts_in_order_and_the_version():
+    key = ScoreCache.make_key('first text', 'second text', 'v1')
+    assert key == ScoreCache.make_key('first text', 'second text', 'v1')
+    assert key != ScoreCache.make_key('second text', 'first text', 'v1')
+    assert key != ScoreCache.make_key('first text', 'second text', 'v2')
+
+def comparison(similarity, words_first, words_second):
+    return {
+        'similarity': similarity,
+        'analysis': {
+            'word_count_1': words_first, 'word_count_2': words_second,
+            'char_count_1': words_first * 5, 'char_count_2': words_second * 5,
+            'unique_words_1': words_first - 1, 'unique_words_2': words_second - 1,
+            'similar_sentences': [{'sentence1': f"from {words_first}", 'sentence2': f"from {words_second}",
+                                   'span1': [0, words_first], 'span2': [0, words_second], 'similarity': 1.0}]
+        }
+    }
+
+def pairs_db(tmp_path, doc_ids):
+    db_path = str(tmp_path / 'pairs.db')
+    with database.transaction(db_path) as cursor:
+        # Pairs reference documents, and the pooled connections enforce foreign keys
+        cursor.execute('CREATE TABLE documents (id INTEGER PRIMARY KEY)')
+        cursor.executemany('INSERT INTO documents (id) VALUES (?)', [(doc_id,) for doc_id in doc_ids])
+        score_cache.create_tables(cursor)
+    return db_path
+
+def test_pairs_are_stored_once_and_read_from_either_side(tmp_path):
+    db_path = pairs_db(tmp_path, [2, 5, 9])
+    with database.transaction(db_path) as cursor:
+        assert score_cache.store_scores(cursor, 5, {2: comparison(0.4, 50, 20), 9: comparison(0.7, 50, 90),
+                                                    5: comparison(1.0, 50, 50)}, 'v1') == 2
+    with database.cursor(db_path) as cursor:
+        cursor.execute('SELECT doc_id_a, doc_id_b, similarity FROM document_pairs ORDER BY doc_id_a')
+        assert cursor.fetchall() == [(2, 5, 0.4), (5, 9, 0.7)]
+        assert score_cache.fetch_scores(cursor, 5, [2, 9, 11], 'v1') == {
+            2: comparison(0.4, 50, 20), 9: comparison(0.7, 50, 90)}
+        # The pair stored for document 5 reads back the other way round for document 2
+        assert score_cache.fetch_scores(cursor, 2, [5], 'v1') == {5: comparison(0.4, 20, 50)}
+        assert score_cache.fetch_scores(cursor, 5, [2], 'v2') == {}
+    assert score_cache.swap_sides(score_cache.swap_sides(comparison(0.4, 50, 20))) == comparison(0.4, 50, 20)
+
+def test_other_versions_are_pruned(tmp_path):
+    db_path = pairs_db(tmp_path, [1, 2])
+    with database.transaction(db_path) as cursor:
+        score_cache.store_scores(cursor, 1, {2: comparison(0.4, 10, 20)}, 'v1')
+        score_cache.store_scores(cursor, 1, {2: comparison(0.5, 10, 20)}, 'v2')
+        assert score_cache.prune_versions(cursor, 'v2') == 1
+        cursor.execute('SELECT version, similarity FROM document_pairs')
+        assert cursor.fetchall() == [('v2', 0.5)]
+
+def test_stored_documents_are_compared_once(app_module, shipped_db, monkeypatch):
+    app = app_module
+    app.init_db()
+    (doc_id, filename, content), = app.load_documents([2])
+    features = app.get_document_features(doc_id, content)
+    first = app.compare_documents_chunk(content, features, filename, [1, 3, 4], doc_id)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('a stored pair was compared again')
+
+    monkeypatch.setattr(app, 'detect_plagiarism', fail)
+    again = app.compare_documents_chunk(content, features, filename, [1, 3, 4], doc_id)
+    assert sorted(again, key=lambda result: result['doc_id']) == sorted(first, key=lambda result: result['doc_id'])
+
+def test_api_check_serves_repeated_pairs_from_the_cache(app_module, workdir, monkeypatch):
+    app = app_module
+    monkeypatch.setattr(app, 'pair_score_cache', ScoreCache())
+    client = app.create_app({'TESTING': True}).test_client()
+    texts = {'text1': 'The cat sat on the mat all afternoon.', 'text2': 'A cat sat on a mat in the afternoon.'}
+    first = client.post('/api/check', json=texts).get_json()
+    monkeypatch.setattr(app, 'detect_plagiarism', None)
+    assert client.post('/api/check', json=texts).get_json() == first
+    assert app.pair_score_cache.stats()['hits'] == 1
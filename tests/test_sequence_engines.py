@@ -0,0 +1,54 @@
+import difflib
+
+import pytest
+
+import sequence_engines
+from sequence_engines import greedy_string_tiling, tiling_similarity, sequence_similarity
+
+def test_tiling_finds_longest_tiles_first():
+    seq1 = list('abcdefxyzqrs')
+    seq2 = list('qrsxyzabcdef')
+    assert greedy_string_tiling(seq1, seq2) == [(0, 6, 6), (9, 0, 3), (6, 3, 3)]
+
+def test_tiles_do_not_overlap_or_use_short_runs():
+    # "abc" matches twice in seq2 but each token is tiled once; "xy" is shorter than a tile
+    seq1 = list('abcabcxy')
+    seq2 = list('abcxy')
+    tiles = greedy_string_tiling(seq1, seq2)
+    assert tiles == [(3, 0, 5)]
+    assert greedy_string_tiling(list('xy'), list('xy')) == []
+
+def test_tiling_similarity_counts_reordered_passages():
+    first = "the cat sat on the mat. a dog barked at the moon."
+    second = "a dog barked at the moon. the cat sat on the mat."
+    assert tiling_similarity(first, second) == 1.0
+    assert tiling_similarity(first, "completely unrelated words appear here instead") == 0.0
+    assert tiling_similarity('', '') == 1.0
+    # difflib only matches one of the swapped sentences
+    assert difflib.SequenceMatcher(None, first, second).ratio() < 0.6
+
+def test_tiling_similarity_is_on_the_ratio_scale():
+    first = "one two three four five six"
+    second = "one two three seven eight nine"
+    # Three of six tokens tiled in each text: 2 * 3 / 12
+    assert tiling_similarity(first, second) == pytest.approx(0.5)
+
+def test_auto_switches_to_tiling_for_long_texts(monkeypatch):
+    calls = []
+    for name in ('difflib', 'tiling'):
+        monkeypatch.setitem(sequence_engines.SEQUENCE_ENGINES, name,
+                            lambda *args, name=name: calls.append(name) or 0.0)
+    monkeypatch.setattr(sequence_engines, 'DIFFLIB_MAX_CHARS', 10)
+    sequence_similarity('short', 'text')
+    sequence_similarity('a longer text', 'short')
+    sequence_similarity('a longer text', 'short', engine='difflib')
+    assert calls == ['difflib', 'tiling', 'difflib']
+
+def test_registered_engine_receives_features():
+    seen = []
+    sequence_engines.register_sequence_engine('test', lambda *args: seen.append(args) or 0.25)
+    try:
+        assert sequence_similarity('a', 'b', {'tokens': ['a']}, None, engine='test') == 0.25
+    finally:
+        del sequence_engines.SEQUENCE_ENGINES['test']
+    assert seen == [('a', 'b', {'tokens': ['a']}, None)]
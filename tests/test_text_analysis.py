@@ -0,0 +1,35 @@
+import pytest
+
+import text_analysis
+
+SAMPLE = ("The detector compares every uploaded document against the corpus. Near-duplicate candidates are "
+          "found with MinHash signatures, e.g. shingles of five words, and then scored precisely. "
+          "Reports are stored compressed; older uncompressed rows still load. It's fast. "
+          "Administrators can review the extraordinary similarities that were identified automatically!")
+ABBREVIATED = "Dr. Smith arrived at 3.5 p.m. on Tuesday. She didn't stay long. Why? Nobody knows what happened next."
+
+# Reference scores returned by textstat 0.7.2 for the same texts
+@pytest.mark.parametrize('text, expected', [
+    (SAMPLE, {'flesch_reading_ease': 28.3, 'flesch_kincaid_grade': 11.6, 'gunning_fog': 14.98,
+              'smog_index': 12.3, 'automated_readability_index': 14.7}),
+    (ABBREVIATED, {'flesch_reading_ease': 90.77, 'flesch_kincaid_grade': 2.1, 'gunning_fog': 2.4,
+                   'smog_index': 3.1, 'automated_readability_index': 3.6})
+])
+def test_readability_scores_match_textstat(text, expected):
+    pytest.importorskip('textstat')
+    import app
+    stats = text_analysis.profile(text, app.dictionary_syllables)
+    assert text_analysis.readability_scores(stats, app.dictionary_difficult_word) == expected
+
+def test_readability_sentences_skip_short_fragments():
+    stats = text_analysis.profile(ABBREVIATED)
+    # "Dr", "3", "5 p", "m" and "Why?" are too short to count, as in textstat
+    assert stats.readability_sentences == 3
+    assert stats.word_count == 18
+    # Grammar context spans end at tokens ending in . ! or ?, so the decimal does not split them
+    assert stats.sentence_count == 6
+
+def test_words_follow_textstat_punctuation_rules():
+    stats = text_analysis.profile("Well-known — don't 'quote' it's")
+    assert stats.word_count == 4
+    assert stats.distinct_words == {'well', 'known', "don't", "'quote'", "it's"}
@@ -0,0 +1,68 @@
+from collections import Counter
+
+import pytest
+
+pytest.importorskip('scipy')
+
+import database
+import tfidf_index
+from tfidf_index import CorpusIndex
+
+DOCUMENTS = {
+    1: Counter(plagiarism=3, detector=1, report=2),
+    2: Counter(detector=2, corpus=1),
+    5: Counter(plagiarism=1, essay=4)
+}
+
+def build(documents=DOCUMENTS):
+    index = CorpusIndex()
+    for doc_id, term_freq in documents.items():
+        index.add_document(doc_id, term_freq)
+    return index
+
+def test_loaded_snapshot_scores_like_the_saved_index(tmp_path):
+    index = build()
+    index.save(str(tmp_path), version=1)
+    loaded = CorpusIndex.load(str(tmp_path), version=1)
+    assert (loaded.doc_ids, loaded.last_doc_id, loaded.unsaved_rows) == ([1, 2, 5], 5, 0)
+    # The matrix is mapped from disk, not copied
+    assert not loaded._segments()[0].data.flags.writeable
+    query = Counter(plagiarism=1, detector=1, novel=1)
+    assert loaded.score(query) == index.score(query)
+    # Rows added on top of the snapshot score as if the index had been built in one go
+    for target in (index, loaded):
+        target.add_document(7, Counter(essay=1, novel=2))
+    assert loaded.unsaved_rows == 1
+    assert loaded.score(query, exclude_id=2) == index.score(query, exclude_id=2)
+    assert list(loaded.iter_similar_pairs(0.1)) == list(index.iter_similar_pairs(0.1))
+
+def test_load_picks_the_newest_snapshot_of_its_version(tmp_path):
+    assert CorpusIndex.load(str(tmp_path / 'missing')) is None
+    index = build({1: DOCUMENTS[1]})
+    index.save(str(tmp_path), version=1)
+    for doc_id in (2, 5):
+        index.add_document(doc_id, DOCUMENTS[doc_id])
+        index.save(str(tmp_path), version=1)
+    assert CorpusIndex.load(str(tmp_path), version=2) is None
+    assert CorpusIndex.load(str(tmp_path), version=1).last_doc_id == 5
+    assert len(tfidf_index._snapshots(str(tmp_path), 1)) == tfidf_index.KEEP_SNAPSHOTS
+
+def test_jobs_read_only_documents_newer_than_the_snapshot(app_module, shipped_db, monkeypatch):
+    app = app_module
+    app.init_db()
+    monkeypatch.setattr(app, 'TFIDF_SNAPSHOT_MIN_ROWS', 1)
+    assert len(app.get_corpus_index()) == 4
+    assert CorpusIndex.load(app.TFIDF_INDEX_DIR, app.FEATURES_VERSION).last_doc_id == 4
+
+    # A later process maps that snapshot and adds only the document stored since
+    monkeypatch.setattr(app, 'corpus_index', None)
+    monkeypatch.setattr(app, 'TFIDF_SNAPSHOT_MIN_ROWS', 2)
+    (_, _, content), = app.load_documents([2])
+    with database.transaction(app.DATABASE) as cursor:
+        doc_id = app.insert_document(cursor, 'copy.txt', 'copy-hash', 'txt', content, len(content),
+                                     app.compute_text_features(content))
+    index = app.get_corpus_index()
+    assert (len(index), index.saved_rows, index.unsaved_rows) == (5, 4, 1)
+    assert index._segments()[0].shape[0] == 4
+    top = index.score(app.compute_text_features(content)['term_freq'])[:2]
+    assert {doc for doc, _ in top} == {2, doc_id}
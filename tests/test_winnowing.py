@@ -0,0 +1,32 @@
+import winnowing
+
+COPIED = "the quick brown fox jumps over the lazy dog near the river bank"
+
+def test_passages_report_the_matched_spans():
+    text1 = f"Intro text here. {COPIED.capitalize()} today. Other stuff follows."
+    text2 = f"Something else entirely! Notably, {COPIED}; then more."
+    passages = winnowing.find_similar_passages(text1, text2)
+    assert len(passages) == 1
+    passage = passages[0]
+    start1, end1 = passage['span1']
+    start2, end2 = passage['span2']
+    # The copied words only, not the sentences around them
+    assert text1[start1:end1].lower() == COPIED
+    assert text2[start2:end2] == COPIED + ';'
+    assert passage['sentence1'] == text1[start1:end1]
+    assert passage['sentence2'] == text2[start2:end2]
+
+def test_unrelated_texts_have_no_passages():
+    assert winnowing.find_similar_passages("An entirely original sentence about apples and pears.",
+                                           "Nothing here overlaps with the other document at all.") == []
+
+def test_long_passage_is_reported_whole():
+    filler1 = ' '.join(f"alpha{i}" for i in range(200))
+    filler2 = ' '.join(f"beta{i}" for i in range(300))
+    copied = ' '.join(f"copied{i}" for i in range(150))
+    text1 = f"{filler1} {copied} {filler1}"
+    text2 = f"{filler2} {copied} {filler2}"
+    passage = winnowing.find_similar_passages(text1, text2)[0]
+    assert passage['sentence1'] == passage['sentence2'] == copied
+    assert passage['span1'] == [len(filler1) + 1, len(filler1) + 1 + len(copied)]
+    assert passage['similarity'] == 100.0
@@ -0,0 +1,276 @@
+"""Single-pass text statistics and the rule table behind the built-in grammar checks.
+
+profile() tokenizes a text once into words, sentence spans and syllable counts; the
+readability formulas, text statistics and grammar rules all read from that profile.
+Word, syllable and sentence counts follow textstat's rules, so with its syllable
+dictionary the readability scores match what textstat returns for the same text.
+Spelling and spacing rules are compiled into one regex, so a text is scanned once
+however many rules are registered.
+"""
+import re
+import math
+from bisect import bisect_right
+from functools import lru_cache
+
+_TOKEN_RE = re.compile(r'\S+')
+# A sentence ends at a token ending in . ! or ?, optionally followed by closing quotes or brackets
+_SENTENCE_END_RE = re.compile(r'[.!?]+["\')\]’”]*$')
+_VOWELS = 'aeiouy'
+
+# textstat's word rules: punctuation is dropped except apostrophes of English contractions,
+# and the readability sentence count splits at every . ! or ?
+_QUOTE_RE = re.compile(r"'(?![tsd]\b|ve\b|ll\b|re\b)")
+_PUNCTUATION_RE = re.compile(r"[^\w\s']")
+_TERMINATOR_RE = re.compile(r'[.!?]+')
+_DISTINCT_WORD_RE = re.compile(r"[\w='‘’]+")
+# Sentences of two words or fewer are left out of the readability sentence count
+SHORT_SENTENCE_WORDS = 2
+
+class TextProfile:
+    """Counts and sentence spans gathered by profile()."""
+    __slots__ = ('text', 'word_count', 'character_count', 'nonspace_chars', 'syllable_count',
+                 'polysyllable_count', 'sentences', 'readability_sentences', 'distinct_words', '_starts')
+
+    def __init__(self, text):
+        self.text = text
+        self.word_count = 0
+        self.character_count = len(text)
+        self.nonspace_chars = 0
+        self.syllable_count = 0
+        self.polysyllable_count = 0
+        self.sentences = []
+        self.readability_sentences = 0
+        self.distinct_words = set()
+        self._starts = None
+
+    @property
+    def sentence_count(self):
+        return len(self.sentences)
+
+    def sentence_at(self, offset):
+        """Span of the sentence containing offset, or None."""
+        if self._starts is None:
+            self._starts = [start for start, _ in self.sentences]
+        index = bisect_right(self._starts, offset) - 1
+        if index >= 0 and offset < self.sentences[index][1]:
+            return self.sentences[index]
+        return None
+
+@lru_cache(maxsize=65536)
+def estimate_word_syllables(word):
+    """Vowel-group heuristic for a lowercase word; a trailing silent e is dropped."""
+    count = 0
+    prev_was_vowel = False
+    for char in word:
+        if char in _VOWELS:
+            if not prev_was_vowel:
+                count += 1
+            prev_was_vowel = True
+        else:
+            prev_was_vowel = False
+    if word.endswith('e') and count > 1:
+        count -= 1
+    return max(1, count)
+
+def strip_punctuation(token):
+    """A lowercase token as textstat counts it; an empty result is not a word."""
+    return _PUNCTUATION_RE.sub('', _QUOTE_RE.sub('"', token))
+
+def profile(text, syllables=estimate_word_syllables):
+    """Tokenizes text once; syllables(word) is called with lowercase words stripped of punctuation.
+
+    Words, syllables and the readability sentence count follow textstat's rules, so the
+    formulas below reproduce its scores. The sentence spans used for grammar context end
+    only at tokens ending in . ! or ?, so decimals and dotted names do not split them.
+    """
+    result = TextProfile(text)
+    sentence_start = None
+    # Words in the current readability sentence and the number of sentences long enough to count
+    sentence_words = 0
+    counted_sentences = 0
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group()
+        if sentence_start is None:
+            sentence_start = match.start()
+        result.nonspace_chars += len(token)
+        lowered = token.lower()
+        word = strip_punctuation(lowered)
+        if word:
+            count = syllables(word)
+            result.word_count += 1
+            result.syllable_count += count
+            if count >= 3:
+                result.polysyllable_count += 1
+            result.distinct_words.update(_DISTINCT_WORD_RE.findall(lowered))
+        if _TERMINATOR_RE.search(lowered):
+            for index, piece in enumerate(_TERMINATOR_RE.split(lowered)):
+                if index:
+                    if sentence_words > SHORT_SENTENCE_WORDS:
+                        counted_sentences += 1
+                    sentence_words = 0
+                if strip_punctuation(piece):
+                    sentence_words += 1
+        elif word:
+            sentence_words += 1
+        if _SENTENCE_END_RE.search(token):
+            result.sentences.append((sentence_start, match.end()))
+            sentence_start = None
+    if sentence_start is not None:
+        result.sentences.append((sentence_start, len(text.rstrip())))
+    if sentence_words > SHORT_SENTENCE_WORDS:
+        counted_sentences += 1
+    result.readability_sentences = max(1, counted_sentences)
+    return result
+
+def _legacy_round(number, points=0):
+    """Rounds half away from zero, as textstat does."""
+    scale = 10 ** points
+    return math.floor(number * scale + math.copysign(0.5, number)) / scale
+
+def is_polysyllabic(word):
+    return estimate_word_syllables(word) >= 3
+
+def readability_scores(stats, is_difficult_word=is_polysyllabic):
+    """Flesch, Flesch-Kincaid, Gunning fog, SMOG and ARI from one profile, as textstat computes them.
+
+    Averages are rounded before they enter the formulas, like textstat's. Gunning fog counts
+    the distinct words for which is_difficult_word(word) is true; pass textstat's Dale-Chall
+    check with a threshold of three syllables to reproduce its score. SMOG needs at least
+    three sentences.
+    """
+    if not stats.word_count:
+        return {}
+    sentences = stats.readability_sentences
+    words_per_sentence = _legacy_round(stats.word_count / sentences, 1)
+    syllables_per_word = _legacy_round(stats.syllable_count / stats.word_count, 1)
+    difficult_share = sum(1 for word in stats.distinct_words if is_difficult_word(word)) / stats.word_count
+    smog = 1.043 * math.sqrt(30 * (stats.polysyllable_count / sentences)) + 3.1291 if sentences >= 3 else 0.0
+    ari = (4.71 * _legacy_round(stats.nonspace_chars / stats.word_count, 2)
+           + 0.5 * _legacy_round(stats.word_count / sentences, 2) - 21.43)
+    return {
+        'flesch_reading_ease': _legacy_round(206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word, 2),
+        'flesch_kincaid_grade': _legacy_round(0.39 * words_per_sentence + 11.8 * syllables_per_word - 15.59, 1),
+        'gunning_fog': _legacy_round(0.4 * (words_per_sentence + 100 * difficult_share), 2),
+        'smog_index': _legacy_round(smog, 1),
+        'automated_readability_index': _legacy_round(ari, 1)
+    }
+
+def text_stats(stats):
+    return {
+        'word_count': stats.word_count,
+        'sentence_count': stats.sentence_count,
+        'syllable_count': stats.syllable_count,
+        'character_count': stats.character_count
+    }
+
+# --- Grammar Rules ---
+
+MISSPELLINGS = {
+    'teh': 'the',
+    'adn': 'and',
+    'recieve': 'receive',
+    'seperate': 'separate',
+    'occured': 'occurred',
+    'definately': 'definitely',
+    'accomodate': 'accommodate',
+    'begining': 'beginning',
+    'neccessary': 'necessary',
+    'occassion': 'occasion'
+}
+
+def _keep_case(original, replacement):
+    if original.isupper() and len(original) > 1:
+        return replacement.upper()
+    if original[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+def _misspelling_issue(matched):
+    correction = MISSPELLINGS[matched.lower()]
+    return f'Possible misspelling: "{matched}"', [_keep_case(matched, correction)]
+
+# rule_id -> (regex, handler); handler(matched_text) returns (message, replacements).
+# The MISSPELLING pattern is built from MISSPELLINGS when the scanner is compiled.
+PATTERN_RULES = {
+    'DOUBLE_SPACE': (r' {2,}', lambda matched: ('Double space detected', [' '])),
+    'MISSPELLING': (None, _misspelling_issue)
+}
+
+# rule(profile) -> [issue]; run after the pattern rules
+SENTENCE_RULES = []
+
+_scanner = None
+
+def add_misspellings(mapping):
+    """Adds {misspelling: correction} entries; keys are matched case-insensitively on word boundaries."""
+    global _scanner
+    MISSPELLINGS.update({mistake.lower(): correction for mistake, correction in mapping.items()})
+    _scanner = None
+
+def add_pattern_rule(rule_id, pattern, handler):
+    """Registers a regex rule; rule_id must be a valid identifier and pattern must not use named groups."""
+    global _scanner
+    PATTERN_RULES[rule_id] = (pattern, handler)
+    _scanner = None
+
+def sentence_rule(rule):
+    """Decorator registering a rule that inspects the profile's sentences."""
+    SENTENCE_RULES.append(rule)
+    return rule
+
+def _compile_scanner():
+    parts = []
+    for rule_id, (pattern, _) in PATTERN_RULES.items():
+        if rule_id == 'MISSPELLING':
+            if not MISSPELLINGS:
+                continue
+            # Longest first so a misspelling is never cut short by one of its prefixes
+            words = sorted(MISSPELLINGS, key=len, reverse=True)
+            pattern = r'\b(?:' + '|'.join(map(re.escape, words)) + r')\b'
+        parts.append(f'(?P<{rule_id}>{pattern})')
+    return re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+
+CONTEXT_CHARS = 40
+
+def make_issue(stats, rule_id, message, offset, length, replacements):
+    """Builds an issue whose context is the enclosing sentence, or nearby text between sentences."""
+    span = stats.sentence_at(offset)
+    if span is None:
+        span = (max(0, offset - CONTEXT_CHARS), offset + length + CONTEXT_CHARS)
+    context = stats.text[span[0]:span[1]]
+    return {
+        'message': message,
+        'context': context,
+        'offset': offset,
+        'length': length,
+        'rule_id': rule_id,
+        'replacements': replacements
+    }
+
+@sentence_rule
+def capitalization_rule(stats):
+    issues = []
+    # The first sentence is often a title or a fragment cut from a longer text
+    for start, end in stats.sentences[1:]:
+        first = stats.text[start]
+        if first.islower():
+            issues.append(make_issue(stats, 'CAPITALIZATION', 'Sentence should start with capital letter',
+                                     start, 1, [first.upper()]))
+    return issues
+
+def grammar_issues(stats):
+    """Runs every registered rule over a profile; issues are ordered by offset."""
+    global _scanner
+    if _scanner is None:
+        _scanner = _compile_scanner()
+    issues = []
+    if _scanner is not None:
+        for match in _scanner.finditer(stats.text):
+            rule_id = match.lastgroup
+            message, replacements = PATTERN_RULES[rule_id][1](match.group())
+            issues.append(make_issue(stats, rule_id, message, match.start(), match.end() - match.start(),
+                                     replacements))
+    for rule in SENTENCE_RULES:
+        issues.extend(rule(stats))
+    issues.sort(key=lambda issue: issue['offset'])
+    return issues
@@ -0,0 +1,76 @@
+import re
+import json
+import zlib
+from collections import Counter
+
+# Bump whenever preprocess_text or the feature layout changes so stored rows are rebuilt
+FEATURES_VERSION = 1
+# Stored column marker; rows written before compact storage hold plain TEXT
+FORMAT_COMPRESSED = b'F1'
+COMPRESSION_LEVEL = 6
+MIGRATION_BATCH_SIZE = 200
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def preprocess_text(text):
+    text = text.lower()
+    text = _PUNCTUATION_RE.sub(' ', text)
+    text = _WHITESPACE_RE.sub(' ', text)
+    return text.strip()
+
+def compute_text_features(text):
+    """Normalizes the text once and returns the token stream, vocabulary and term frequencies."""
+    return features_from_tokens(preprocess_text(text).split())
+
+def features_from_tokens(tokens):
+    term_freq = Counter(tokens)
+    return {
+        'version': FEATURES_VERSION,
+        'tokens': tokens,
+        'vocabulary': set(term_freq),
+        'term_freq': term_freq
+    }
+
+def encode_column(text):
+    return FORMAT_COMPRESSED + zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL)
+
+def decode_column(value):
+    """Returns the text of a document_features column, compressed or legacy plain TEXT."""
+    if isinstance(value, bytes) and value.startswith(FORMAT_COMPRESSED):
+        return zlib.decompress(value[len(FORMAT_COMPRESSED):]).decode('utf-8')
+    return value
+
+def features_to_row(features):
+    """Serializes features into the column values of the document_features table."""
+    return (
+        features['version'],
+        encode_column(' '.join(features['tokens'])),
+        encode_column(json.dumps(sorted(features['vocabulary']))),
+        encode_column(json.dumps(dict(features['term_freq'])))
+    )
+
+def features_from_row(row):
+    """Rebuilds features from a (version, tokens, vocabulary, term_freq) row, or None if stale."""
+    if not row or row[0] != FEATURES_VERSION:
+        return None
+    version, tokens, vocabulary, term_freq = row
+    return {
+        'version': version,
+        'tokens': decode_column(tokens).split(),
+        'vocabulary': set(json.loads(decode_column(vocabulary))),
+        'term_freq': Counter(json.loads(decode_column(term_freq)))
+    }
+
+def migrate_feature_rows(cursor, batch_size=MIGRATION_BATCH_SIZE):
+    """Compresses one batch of legacy TEXT feature rows; returns the number of rows rewritten."""
+    cursor.execute('''
+        SELECT document_id, tokens, vocabulary, term_freq FROM document_features
+        WHERE typeof(tokens) = 'text' ORDER BY document_id LIMIT ?
+    ''', (batch_size,))
+    rows = cursor.fetchall()
+    cursor.executemany('''
+        UPDATE document_features SET tokens = ?, vocabulary = ?, term_freq = ? WHERE document_id = ?
+    ''', [(encode_column(tokens), encode_column(vocabulary), encode_column(term_freq), doc_id)
+          for doc_id, tokens, vocabulary, term_freq in rows])
+    return len(rows)
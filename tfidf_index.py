@@ -0,0 +1,277 @@
+import os
+import math
+import json
+import time
+import uuid
+import shutil
+import importlib.util
+
+# numpy and scipy are imported when the first index is built; only check that they are installed
+SCIPY_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('numpy', 'scipy'))
+np = sparse = None
+
+# Upper bound on similarity cells held in memory per block of the all-vs-all product
+MAX_BLOCK_CELLS = 8 * 1024 * 1024
+# Snapshots kept on disk; older ones are removed after a save (processes mapping them keep their pages)
+KEEP_SNAPSHOTS = 2
+# Temporary directories older than this are left over from a save that did not finish
+ABANDONED_SAVE_SECONDS = 3600
+SNAPSHOT_ARRAYS = ('data', 'indices', 'indptr', 'doc_freq', 'doc_ids')
+
+def _import_numeric():
+    global np, sparse
+    if sparse is None:
+        import numpy
+        from scipy import sparse as scipy_sparse
+        np, sparse = numpy, scipy_sparse
+
+class CorpusIndex:
+    """Sparse TF-IDF document-term matrix over the stored corpus.
+
+    Documents are appended as they are saved. Only raw term counts are stored: scores
+    apply the IDF weights to the query and divide by cached row norms, so a changing
+    IDF never rewrites the matrix. save() writes the matrix to disk and load() maps it
+    back read-only, so processes loading the same snapshot share its pages through the
+    page cache; documents added after the snapshot go to a small per-process delta.
+    """
+
+    def __init__(self):
+        _import_numeric()
+        self.vocabulary = {}
+        self.doc_ids = []
+        self.last_doc_id = 0
+        self._rows = {}
+        self._pending = []
+        self._frozen = None
+        self._term_counts = None
+        self._doc_freq = np.zeros(0, dtype=np.int64)
+        self._norms = None
+        self._weighted = None
+        # Rows already in the snapshot this index was loaded from or last saved to
+        self.saved_rows = 0
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._rows
+
+    def add_document(self, doc_id, term_freq):
+        if doc_id in self._rows:
+            return
+        columns = [self.vocabulary.setdefault(term, len(self.vocabulary)) for term in term_freq]
+        self._rows[doc_id] = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.last_doc_id = max(self.last_doc_id, doc_id)
+        self._pending.append((columns, list(term_freq.values())))
+        self._norms = None
+        self._weighted = None
+
+    @property
+    def unsaved_rows(self):
+        return len(self.doc_ids) - self.saved_rows
+
+    def save(self, directory, version=None):
+        """Writes every row as a snapshot named after last_doc_id and returns its path.
+
+        The arrays are written to a temporary directory that is renamed into place, so
+        readers only ever see complete snapshots. version tags the snapshot (e.g. the
+        features version) so load() skips ones built from other features.
+        """
+        counts = self._all_counts()
+        if counts is None:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.last_doc_id:012d}-v{version}")
+        if not os.path.isdir(path):
+            temp = os.path.join(directory, f".tmp-{uuid.uuid4().hex}")
+            os.makedirs(temp)
+            # The index dtype scipy would pick, so load() maps the arrays without converting them
+            index_dtype = np.int32 if max(counts.nnz, counts.shape[1]) < 2 ** 31 else np.int64
+            arrays = {
+                'data': counts.data.astype(np.float64, copy=False),
+                'indices': counts.indices.astype(index_dtype, copy=False),
+                'indptr': counts.indptr.astype(index_dtype, copy=False),
+                'doc_freq': self._doc_freq,
+                'doc_ids': np.array(self.doc_ids, dtype=np.int64)
+            }
+            for name, array in arrays.items():
+                np.save(os.path.join(temp, name + '.npy'), array)
+            terms = [None] * len(self.vocabulary)
+            for term, column in self.vocabulary.items():
+                terms[column] = term
+            with open(os.path.join(temp, 'terms.json'), 'w', encoding='utf-8') as f:
+                json.dump(terms, f)
+            with open(os.path.join(temp, 'meta.json'), 'w') as f:
+                json.dump({'last_doc_id': self.last_doc_id, 'shape': list(counts.shape), 'version': version}, f)
+            try:
+                os.rename(temp, path)
+            except OSError:
+                # Another process saved the same snapshot first
+                shutil.rmtree(temp, ignore_errors=True)
+        self.saved_rows = len(self.doc_ids)
+        for stale in _snapshots(directory, version)[KEEP_SNAPSHOTS:]:
+            shutil.rmtree(stale, ignore_errors=True)
+        for name in os.listdir(directory):
+            temp = os.path.join(directory, name)
+            try:
+                abandoned = name.startswith('.tmp-') and time.time() - os.path.getmtime(temp) > ABANDONED_SAVE_SECONDS
+            except OSError:
+                continue
+            if abandoned:
+                shutil.rmtree(temp, ignore_errors=True)
+        return path
+
+    @classmethod
+    def load(cls, directory, version=None):
+        """The newest snapshot saved with version, its matrix memory-mapped read-only; None if there is none."""
+        snapshots = _snapshots(directory, version)
+        if not snapshots:
+            return None
+        path = snapshots[0]
+        index = cls()
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        with open(os.path.join(path, 'terms.json'), encoding='utf-8') as f:
+            index.vocabulary = {term: column for column, term in enumerate(json.load(f))}
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in SNAPSHOT_ARRAYS}
+        index._frozen = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                                          shape=tuple(meta['shape']), copy=False)
+        index._doc_freq = np.array(arrays['doc_freq'])
+        index.doc_ids = arrays['doc_ids'].tolist()
+        index._rows = {doc_id: row for row, doc_id in enumerate(index.doc_ids)}
+        index.last_doc_id = meta['last_doc_id']
+        index.saved_rows = len(index.doc_ids)
+        return index
+
+    def _flush(self):
+        if not self._pending:
+            return
+        width = len(self.vocabulary)
+        indptr, indices, data = [0], [], []
+        for columns, counts in self._pending:
+            indices.extend(columns)
+            data.extend(counts)
+            indptr.append(len(indices))
+        new_rows = sparse.csr_matrix(
+            (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int64), np.array(indptr)),
+            shape=(len(self._pending), width)
+        )
+        if self._term_counts is None:
+            self._term_counts = new_rows
+        else:
+            self._term_counts = sparse.vstack([_widen(self._term_counts, width), new_rows], format='csr')
+        doc_freq = np.zeros(width, dtype=np.int64)
+        doc_freq[:len(self._doc_freq)] = self._doc_freq
+        doc_freq += np.bincount(np.array(indices, dtype=np.int64), minlength=width)
+        self._doc_freq = doc_freq
+        self._pending = []
+
+    def _segments(self):
+        """The mapped snapshot and the delta, in row order; either may be missing."""
+        self._flush()
+        return [matrix for matrix in (self._frozen, self._term_counts) if matrix is not None]
+
+    def _all_counts(self):
+        segments = self._segments()
+        if not segments:
+            return None
+        if len(segments) == 1:
+            return _widen(segments[0], len(self.vocabulary))
+        width = len(self.vocabulary)
+        return sparse.vstack([_widen(matrix, width) for matrix in segments], format='csr')
+
+    def _idf(self):
+        # Smoothed IDF, so terms present in every document still carry some weight
+        return np.log((1.0 + len(self.doc_ids)) / (1.0 + self._doc_freq)) + 1.0
+
+    def _row_norms(self, idf):
+        """L2 norms of the weighted rows, one float per document, cached until the corpus changes."""
+        if self._norms is None:
+            norms = []
+            squared_idf = idf * idf
+            for matrix in self._segments():
+                # Squares only the data array; indices and indptr stay shared with the matrix
+                squared = sparse.csr_matrix((matrix.data * matrix.data, matrix.indices, matrix.indptr),
+                                            shape=matrix.shape)
+                norms.append(np.sqrt(squared.dot(squared_idf[:matrix.shape[1]])))
+            norms = np.concatenate(norms) if norms else np.zeros(0)
+            norms[norms == 0] = 1.0
+            self._norms = norms
+        return self._norms
+
+    def _weighted_matrix(self):
+        """Weighted, L2-normalized copy of the whole matrix, for all-vs-all products only."""
+        if self._weighted is None:
+            counts = self._all_counts()
+            if counts is not None:
+                idf = self._idf()
+                weighted = counts.multiply(idf).tocsr()
+                self._weighted = sparse.diags(1.0 / self._row_norms(idf)).dot(weighted).tocsr()
+        return self._weighted
+
+    def _query_vector(self, term_freq):
+        idf = self._idf()
+        unseen_idf = math.log(1.0 + len(self.doc_ids)) + 1.0
+        columns, weights = [], []
+        norm = 0.0
+        for term, count in term_freq.items():
+            column = self.vocabulary.get(term)
+            weight = count * (idf[column] if column is not None else unseen_idf)
+            norm += weight * weight
+            if column is not None:
+                columns.append(column)
+                weights.append(weight)
+        vector = np.zeros(len(self.vocabulary))
+        if norm:
+            vector[columns] = np.array(weights) / math.sqrt(norm)
+        return vector
+
+    def score(self, term_freq, exclude_id=None):
+        """Scores one document against the whole corpus with one sparse matrix-vector product per segment."""
+        segments = self._segments()
+        if not segments:
+            return []
+        idf = self._idf()
+        query = self._query_vector(term_freq) * idf
+        scores = np.concatenate([matrix.dot(query[:matrix.shape[1]]) for matrix in segments])
+        scores /= self._row_norms(idf)
+        results = [(doc_id, float(s)) for doc_id, s in zip(self.doc_ids, scores) if doc_id != exclude_id]
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results
+
+    def iter_similar_pairs(self, threshold, block_size=None):
+        """Yields (doc_id_a, doc_id_b, score) for every pair above the threshold.
+
+        The all-vs-all product is computed one block of rows at a time, so the dense
+        N x N matrix is never held in memory.
+        """
+        weighted = self._weighted_matrix()
+        if weighted is None:
+            return
+        total = weighted.shape[0]
+        block_size = block_size or max(1, MAX_BLOCK_CELLS // max(total, 1))
+        transposed = weighted.T.tocsc()
+        for start in range(0, total, block_size):
+            stop = min(start + block_size, total)
+            block = weighted[start:stop].dot(transposed).toarray()
+            rows, columns = np.nonzero(block >= threshold)
+            for row, column in zip(rows, columns):
+                i = start + row
+                if column > i:
+                    yield self.doc_ids[i], self.doc_ids[column], float(block[row, column])
+
+def _widen(matrix, width):
+    """The same rows with extra empty columns; shares the matrix's arrays instead of copying them."""
+    if matrix.shape[1] == width:
+        return matrix
+    return sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], width))
+
+def _snapshots(directory, version):
+    """Complete snapshots saved with version, newest first."""
+    suffix = f"-v{version}"
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(suffix) and not name.startswith('.')]
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names, reverse=True)]
@@ -0,0 +1,170 @@
+import re
+import difflib
+from collections import defaultdict, deque
+
+# Matches of at least WINDOW_SIZE + KGRAM_SIZE - 1 normalized characters are always detected
+KGRAM_SIZE = 15
+WINDOW_SIZE = 6
+# Fingerprints occurring more often than this are boilerplate and would blow up the pair count
+MAX_FINGERPRINT_OCCURRENCES = 50
+
+_HASH_BASE = 257
+_HASH_MOD = (1 << 61) - 1
+
+_SENTENCE_RE = re.compile(r'[^.!?\n]+(?:[.!?]+|$)', re.MULTILINE)
+
+def normalize_with_offsets(text):
+    """Lowercases and keeps only word characters, returning the stream and its original offsets."""
+    chars, offsets = [], []
+    for i, ch in enumerate(text):
+        if ch.isalnum():
+            chars.append(ch.lower())
+            offsets.append(i)
+    return ''.join(chars), offsets
+
+def kgram_hashes(normalized, k=KGRAM_SIZE):
+    """Karp-Rabin rolling hashes of every k-gram."""
+    if len(normalized) < k:
+        return []
+    high = pow(_HASH_BASE, k - 1, _HASH_MOD)
+    h = 0
+    for ch in normalized[:k]:
+        h = (h * _HASH_BASE + ord(ch)) % _HASH_MOD
+    hashes = [h]
+    for i in range(k, len(normalized)):
+        h = ((h - ord(normalized[i - k]) * high) * _HASH_BASE + ord(normalized[i])) % _HASH_MOD
+        hashes.append(h)
+    return hashes
+
+def winnow(hashes, w=WINDOW_SIZE):
+    """Selects the rightmost minimal hash of every window of w k-grams as (hash, position)."""
+    if not hashes:
+        return []
+    if len(hashes) <= w:
+        position = min(range(len(hashes)), key=lambda i: (hashes[i], -i))
+        return [(hashes[position], position)]
+    fingerprints = []
+    window = deque()
+    last_selected = -1
+    for i, h in enumerate(hashes):
+        while window and hashes[window[-1]] >= h:
+            window.pop()
+        window.append(i)
+        if window[0] <= i - w:
+            window.popleft()
+        if i >= w - 1 and window[0] != last_selected:
+            last_selected = window[0]
+            fingerprints.append((hashes[last_selected], last_selected))
+    return fingerprints
+
+def fingerprint(text, k=KGRAM_SIZE, w=WINDOW_SIZE):
+    normalized, offsets = normalize_with_offsets(text)
+    return winnow(kgram_hashes(normalized, k), w), offsets
+
+def build_inverted_index(fingerprints):
+    index = defaultdict(list)
+    for h, position in fingerprints:
+        index[h].append(position)
+    return index
+
+def match_spans(text1, text2, k=KGRAM_SIZE, w=WINDOW_SIZE):
+    """Merges shared fingerprints into aligned character spans [(start1, end1, start2, end2)].
+
+    Fingerprints on the same diagonal are joined into one run, and each run is
+    extended character by character while the normalized texts still agree, so a
+    span covers the whole match rather than only its fingerprinted k-grams.
+    """
+    normalized1, offsets1 = normalize_with_offsets(text1)
+    normalized2, offsets2 = normalize_with_offsets(text2)
+    index2 = build_inverted_index(winnow(kgram_hashes(normalized2, k), w))
+    diagonals = defaultdict(list)
+    for h, position1 in winnow(kgram_hashes(normalized1, k), w):
+        positions2 = index2.get(h)
+        if not positions2 or len(positions2) > MAX_FINGERPRINT_OCCURRENCES:
+            continue
+        for position2 in positions2:
+            diagonals[position2 - position1].append(position1)
+    spans = []
+    max_gap = w + k
+    for diagonal, starts in diagonals.items():
+        starts.sort()
+        run_start = run_end = starts[0]
+        for position1 in starts[1:] + [None]:
+            if position1 is not None and position1 - run_end <= max_gap:
+                run_end = position1
+                continue
+            start1, end1 = run_start, run_end + k - 1
+            while start1 > 0 and start1 + diagonal > 0 and \
+                    normalized1[start1 - 1] == normalized2[start1 + diagonal - 1]:
+                start1 -= 1
+            while end1 + 1 < len(normalized1) and end1 + 1 + diagonal < len(normalized2) and \
+                    normalized1[end1 + 1] == normalized2[end1 + 1 + diagonal]:
+                end1 += 1
+            spans.append((
+                offsets1[start1], offsets1[end1] + 1,
+                offsets2[start1 + diagonal], offsets2[end1 + diagonal] + 1
+            ))
+            if position1 is not None:
+                run_start = run_end = position1
+    spans.sort(key=lambda span: span[1] - span[0], reverse=True)
+    return spans
+
+def sentence_spans(text):
+    """Splits on sentence terminators and line breaks, returning stripped (start, end) spans."""
+    spans = []
+    for match in _SENTENCE_RE.finditer(text):
+        start, end = match.start(), match.end()
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            spans.append((start, end))
+    return spans
+
+def _whole_words(text, start, end):
+    """Narrows a span that starts or ends inside a word to the whole words it covers."""
+    if start > 0 and text[start - 1].isalnum():
+        while start < end and text[start].isalnum():
+            start += 1
+    if end < len(text) and text[end].isalnum():
+        while end > start and text[end - 1].isalnum():
+            end -= 1
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def find_similar_passages(text1, text2, min_length=20, min_similarity=0.5, max_results=10):
+    """Returns the matched passages from match_spans, longest first, scored by SequenceMatcher.
+
+    span1 and span2 are the character offsets of the matched passage in each text,
+    trimmed to whole words; only these aligned regions are compared.
+    """
+    passages = []
+    taken = []
+    for start1, end1, start2, end2 in match_spans(text1, text2):
+        start1, end1 = _whole_words(text1, start1, end1)
+        start2, end2 = _whole_words(text2, start2, end2)
+        # Text repeated within a document aligns on several diagonals; keep the longest match only
+        if any(start1 < taken_end and taken_start < end1 for taken_start, taken_end in taken):
+            continue
+        s1, s2 = text1[start1:end1], text2[start2:end2]
+        if len(s1) <= min_length or len(s2) <= min_length:
+            continue
+        # Both passages hold the same words in the same order once normalized, so the word-multiset
+        # bound equals the full ratio here and stays linear on passages thousands of words long
+        similarity = difflib.SequenceMatcher(None, s1.lower().split(), s2.lower().split()).quick_ratio()
+        if similarity > min_similarity:
+            taken.append((start1, end1))
+            passages.append({
+                'sentence1': s1,
+                'sentence2': s2,
+                'similarity': round(similarity * 100, 2),
+                'span1': [start1, end1],
+                'span2': [start2, end2]
+            })
+            if len(passages) >= max_results:
+                break
+    return passages